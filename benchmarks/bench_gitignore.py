@@ -0,0 +1,74 @@
+"""
+Microbenchmark: match synthetic paths against a gitignore file with the
+built-in compiled matcher and with gitignore_parser (if it is installed).
+
+Usage:
+    python benchmarks/bench_gitignore.py [--paths 100000] [--patterns 200]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from summarizeGPT.ignore import IgnoreMatcher  # noqa: E402
+from synthetic import make_patterns  # noqa: E402
+
+
+def make_paths(root, count, rng):
+    """Return ``count`` absolute file paths spread over a synthetic tree."""
+    dirs = ['src', 'src/pkg', 'build', 'docs/api', 'node_modules/dep', 'tests', 'tmp']
+    exts = ['py', 'pyc', 'log', 'txt', 'html', 'md']
+    paths = []
+    for i in range(count):
+        directory = rng.choice(dirs)
+        paths.append(os.path.join(root, directory, f"file{i}.{rng.choice(exts)}"))
+    return paths
+
+
+def bench(name, matcher, paths):
+    start = time.perf_counter()
+    ignored = sum(1 for path in paths if matcher(path))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<20} {elapsed * 1000:9.1f} ms  {len(paths) / elapsed:12,.0f} paths/s  "
+          f"({ignored} ignored)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--patterns', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    root = tempfile.mkdtemp()
+    try:
+        gitignore = os.path.join(root, '.gitignore')
+        with open(gitignore, 'w') as f:
+            f.write('\n'.join(make_patterns(args.patterns, rng)) + '\n')
+        paths = make_paths(root, args.paths, rng)
+
+        print(f"{args.paths} paths, {args.patterns} patterns")
+        matcher = IgnoreMatcher(root)
+        matcher.add_file(gitignore)
+        ours = bench('IgnoreMatcher', matcher, paths)
+
+        try:
+            import gitignore_parser
+        except ImportError:
+            print("gitignore_parser is not installed; skipping comparison")
+            return
+        theirs = bench('gitignore_parser', gitignore_parser.parse_gitignore(gitignore), paths)
+        print(f"speedup: {theirs / ours:.1f}x")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Startup benchmark: how long a fresh interpreter takes to import the
+``SummarizeGPT`` entry point and to summarize a tiny tree.
+
+Import time is read from ``python -X importtime`` (best of ``--repeat``
+runs) and broken down by the modules the entry point imports directly, so
+a new eager import shows up by name. End-to-end runs are timed with and
+without ``--no-tokens``; the difference is the cost of loading the
+tokenizer. Bytecode caching is forced on, since installed packages always
+have their ``.pyc`` files.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENTRY_POINT = 'summarizeGPT.summarizeGPT'
+
+
+def python_env():
+    """Environment for child interpreters: the checkout on the path, bytecode caching on."""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.abspath(ROOT),
+                                                      env.get('PYTHONPATH')]))
+    return env
+
+
+def parse_importtime(stderr, module=ENTRY_POINT):
+    """
+    Return the cumulative import time of ``module`` in microseconds and the
+    cumulative times of its direct imports, from ``-X importtime`` output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    for i in range(len(rows) - 1, -1, -1):
+        if rows[i][2] == module:
+            break
+    else:
+        raise ValueError(f"{module} not found in -X importtime output")
+    total, depth, _ = rows[i]
+    children = []
+    # A module's imports are listed before it, one level deeper
+    for cumulative, child_depth, name in reversed(rows[:i]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((name, cumulative))
+    return total, sorted(children, key=lambda item: item[1], reverse=True)
+
+
+def import_time(repeat):
+    """Return the best ``(total, children)`` of ``repeat`` imports of the entry point."""
+    best = None
+    command = [sys.executable, '-X', 'importtime', '-c', f'import {ENTRY_POINT}']
+    subprocess.run(command, env=python_env(), capture_output=True, check=True)  # write .pyc files
+    for _ in range(repeat):
+        result = subprocess.run(command, env=python_env(), capture_output=True, text=True,
+                                check=True)
+        measured = parse_importtime(result.stderr)
+        if best is None or measured[0] < best[0]:
+            best = measured
+    return best
+
+
+def run_time(args, repeat):
+    """Return the best wall time in seconds of ``python -m <entry point> *args``."""
+    best = None
+    command = [sys.executable, '-m', ENTRY_POINT, *args]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, env=python_env(), capture_output=True, check=False)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='Direct imports to list')
+    args = parser.parse_args()
+
+    total, children = import_time(args.repeat)
+    print(f"import {ENTRY_POINT}: {total / 1000:.1f} ms")
+    for name, cumulative in children[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    root = tempfile.mkdtemp()
+    try:
+        for i in range(3):
+            with open(os.path.join(root, f"module{i}.py"), 'w') as f:
+                f.write(f"def f{i}():\n    return {i}\n")
+        base = [root, '--stdout', '--no-cache']
+        with_tokens = run_time(base, args.repeat)
+        without_tokens = run_time(base + ['--no-tokens'], args.repeat)
+    finally:
+        shutil.rmtree(root)
+    print(f"end to end, 3 files:              {with_tokens * 1000:8.1f} ms")
+    print(f"end to end, 3 files, --no-tokens: {without_tokens * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
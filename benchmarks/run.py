@@ -0,0 +1,209 @@
+"""
+Time the hot paths of SummarizeGPT on synthetic trees and compare the
+results against a stored baseline.
+
+For every profile of ``synthetic.py`` the tree view, the file contents and
+the end-to-end ``main()`` are timed (best of ``--repeat`` runs), then run
+once more under tracemalloc to record peak memory. ``remove_empty_lines``
+and ``print_summary`` are timed on a fixed synthetic text, and importing
+the entry point in a fresh interpreter is timed as ``startup/import`` (see
+``bench_startup.py`` for a breakdown). A result more
+than ``--tolerance`` slower, or using that much more memory, than the
+baseline for the same scale is reported as a regression and makes the
+script exit with status 1.
+
+Usage:
+    python benchmarks/run.py [--scale small] [--profile wide ...]
+    python benchmarks/run.py --update-baseline
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from summarizeGPT import summarizeGPT  # noqa: E402
+from bench_startup import ENTRY_POINT, python_env  # noqa: E402
+from synthetic import PROFILES, SCALES, generate, source_text  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.02
+MIN_PEAK_MIB_DELTA = 1.0
+
+# Extra options per profile, as keyword arguments and as command line flags
+PROFILE_OPTIONS = {
+    'huge': ({'max_lines': 1000}, ['-n', '1000']),
+    'gitignore': ({'gitignore_file': '.gitignore'}, ['-ig']),
+}
+
+
+def profile_benchmarks(root, profile):
+    """Return ``(name, callable)`` pairs for one generated tree."""
+    kwargs, flags = PROFILE_OPTIONS.get(profile, ({}, []))
+    kwargs = dict(kwargs)
+    if 'gitignore_file' in kwargs:
+        kwargs['gitignore_file'] = os.path.join(root, kwargs['gitignore_file'])
+    tree_kwargs = {k: v for k, v in kwargs.items() if k == 'gitignore_file'}
+
+    def tree_view():
+        summarizeGPT.get_tree_view(root, **tree_kwargs)
+
+    def file_contents():
+        summarizeGPT.get_file_contents(root, **kwargs)
+
+    def end_to_end():
+        argv = ['SummarizeGPT', root, '--stdout', '--no-cache', *flags]
+        with open(os.devnull, 'w') as devnull, \
+                patch.object(sys, 'argv', argv), \
+                contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            summarizeGPT.main()
+
+    return [(f"{profile}/get_tree_view", tree_view),
+            (f"{profile}/get_file_contents", file_contents),
+            (f"{profile}/main", end_to_end)]
+
+
+def text_benchmarks():
+    """Return ``(name, callable)`` pairs for the functions working on summary text."""
+    rng = random.Random('text:0')
+    text = source_text(rng, 200000)
+    summary = text[:1024 * 1024]
+
+    def empty_lines():
+        summarizeGPT.remove_empty_lines(text)
+
+    def statistics():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            summarizeGPT.print_summary(summary)
+
+    return [("text/remove_empty_lines", empty_lines),
+            ("text/print_summary", statistics)]
+
+
+def startup_benchmarks():
+    """Return ``(name, callable)`` pairs run in a fresh interpreter."""
+    command = [sys.executable, '-c', f'import {ENTRY_POINT}']
+    env = python_env()
+    subprocess.run(command, env=env, check=True)  # write .pyc files
+
+    def import_entry_point():
+        subprocess.run(command, env=env, check=True)
+
+    return [("startup/import", import_entry_point)]
+
+
+def measure(func, repeat):
+    """Return the best wall time of ``repeat`` runs and the peak traced memory in MiB."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(best, 4), 'peak_mib': round(peak / (1024 * 1024), 2)}
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of regressions of ``result`` relative to ``baseline``."""
+    regressions = []
+    if baseline is None:
+        return regressions
+    seconds, base_seconds = result['seconds'], baseline['seconds']
+    if (seconds > base_seconds * (1 + tolerance)
+            and seconds - base_seconds > MIN_SECONDS_DELTA):
+        regressions.append(f"time {base_seconds:.3f}s -> {seconds:.3f}s")
+    peak, base_peak = result['peak_mib'], baseline['peak_mib']
+    if peak > base_peak * (1 + tolerance) and peak - base_peak > MIN_PEAK_MIB_DELTA:
+        regressions.append(f"memory {base_peak:.1f} MiB -> {peak:.1f} MiB")
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark SummarizeGPT against a stored baseline.')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--profile', action='append', choices=PROFILES,
+                        help='Profile to run (repeatable; default: all)')
+    parser.add_argument('--work-dir',
+                        default=os.path.join(tempfile.gettempdir(), 'summarizegpt-bench'),
+                        help='Where synthetic trees are generated and kept between runs')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown or memory growth as a fraction (default: 0.25)')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Store these results as the baseline for this scale')
+    args = parser.parse_args()
+
+    summarizeGPT.setup_logging(False)
+    baselines = load_baseline(args.baseline)
+    baseline = baselines.get(args.scale, {}).get('results', {})
+
+    benchmarks = []
+    for profile in args.profile or PROFILES:
+        root = generate(profile, os.path.join(args.work_dir, f"{profile}-{args.scale}"), args.scale)
+        benchmarks.extend(profile_benchmarks(root, profile))
+    benchmarks.extend(text_benchmarks())
+    benchmarks.extend(startup_benchmarks())
+
+    results = {}
+    failed = []
+    print(f"{'benchmark':<32} {'seconds':>9} {'baseline':>9} {'peak MiB':>9}")
+    for name, func in benchmarks:
+        result = measure(func, args.repeat)
+        results[name] = result
+        base = baseline.get(name)
+        regressions = compare(result, base, args.tolerance)
+        base_seconds = f"{base['seconds']:.3f}" if base else '-'
+        status = 'REGRESSION: ' + ', '.join(regressions) if regressions else ''
+        print(f"{name:<32} {result['seconds']:>9.3f} {base_seconds:>9} "
+              f"{result['peak_mib']:>9.1f}  {status}")
+        if regressions:
+            failed.append(name)
+
+    if args.update_baseline:
+        baselines[args.scale] = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': {**baseline, **results},
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline for scale '{args.scale}' written to {args.baseline}")
+        return
+
+    if failed:
+        print(f"{len(failed)} regression(s) over {args.tolerance:.0%}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
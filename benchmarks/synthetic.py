@@ -0,0 +1,202 @@
+"""
+Deterministic generator of synthetic directory trees for the benchmarks.
+
+Every profile stresses one hot path: ``wide`` and ``deep`` the walk and tree
+view, ``many_small`` per-file overhead, ``huge`` reading very large files,
+``binary`` binary detection and ``gitignore`` ignore matching. Each profile
+has a ``small`` scale, quick enough to run before every release, and a
+``full`` scale (100k files, multi-GB files) for investigating regressions.
+
+The same profile, scale and seed always produce the same tree. Generated
+trees are reused while their manifest matches, since the large profiles
+take a while to write.
+
+Usage:
+    python benchmarks/synthetic.py <profile> <directory> [--scale full] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+
+MANIFEST = '.synthetic.json'
+GENERATOR_VERSION = 1
+
+WORDS = ('alpha', 'beta', 'gamma', 'delta', 'value', 'result', 'index', 'items',
+         'config', 'buffer', 'return', 'import', 'class', 'def', 'self', 'data')
+
+SCALES = {
+    'small': {
+        'wide': {'dirs': 200, 'files_per_dir': 10},
+        'deep': {'depth': 60, 'files_per_dir': 3},
+        'many_small': {'files': 10000, 'dirs': 100},
+        'huge': {'files': 2, 'size': 64 * 1024 * 1024},
+        'binary': {'files': 40, 'size': 1024 * 1024, 'text_files': 40},
+        'gitignore': {'patterns': 500, 'dirs': 50, 'files_per_dir': 40},
+    },
+    'full': {
+        'wide': {'dirs': 5000, 'files_per_dir': 10},
+        'deep': {'depth': 400, 'files_per_dir': 5},
+        'many_small': {'files': 100000, 'dirs': 1000},
+        'huge': {'files': 3, 'size': 2 * 1024 * 1024 * 1024},
+        'binary': {'files': 100, 'size': 16 * 1024 * 1024, 'text_files': 100},
+        'gitignore': {'patterns': 5000, 'dirs': 500, 'files_per_dir': 40},
+    },
+}
+
+PROFILES = tuple(SCALES['small'])
+
+
+def source_text(rng, lines):
+    """Return ``lines`` lines of plausible source code, with some blank lines."""
+    out = []
+    for i in range(lines):
+        if i % 7 == 6:
+            out.append('\n')
+            continue
+        indent = '    ' * rng.randrange(3)
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 9)))
+        out.append(f"{indent}{words}\n")
+    return ''.join(out)
+
+
+def make_patterns(count, rng):
+    """Return a mix of the pattern shapes found in real .gitignore files."""
+    base = ['*.pyc', '*.log', 'build/', 'dist/', 'node_modules/', '/coverage',
+            '**/tmp', 'docs/**/*.html', '!keep.log', '.env*', '[Bb]in/']
+    patterns = list(base)
+    while len(patterns) < count:
+        word = ''.join(rng.choice('abcdefghij') for _ in range(rng.randint(3, 8)))
+        shape = rng.randrange(4)
+        if shape == 0:
+            patterns.append(f"*.{word[:3]}")
+        elif shape == 1:
+            patterns.append(f"{word}/")
+        elif shape == 2:
+            patterns.append(f"/{word}/*.txt")
+        else:
+            patterns.append(f"**/{word}")
+    return patterns
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def _wide(root, rng, dirs, files_per_dir):
+    for d in range(dirs):
+        for i in range(files_per_dir):
+            _write(os.path.join(root, f"pkg{d:05d}", f"module{i}.py"), source_text(rng, 20))
+
+
+def _deep(root, rng, depth, files_per_dir):
+    path = root
+    for level in range(depth):
+        path = os.path.join(path, f"level{level}")
+        for i in range(files_per_dir):
+            _write(os.path.join(path, f"file{i}.py"), source_text(rng, 10))
+
+
+def _many_small(root, rng, files, dirs):
+    for i in range(files):
+        _write(os.path.join(root, f"dir{i % dirs:04d}", f"f{i:06d}.txt"), source_text(rng, 3))
+
+
+def _huge(root, rng, files, size):
+    block = source_text(rng, 2000).encode('utf-8')
+    for i in range(files):
+        path = os.path.join(root, f"huge{i}.log")
+        with open(path, 'wb') as f:
+            written = 0
+            while written < size:
+                chunk = block[:size - written]
+                f.write(chunk)
+                written += len(chunk)
+    _write(os.path.join(root, 'README.md'), source_text(rng, 20))
+
+
+def _binary(root, rng, files, size, text_files):
+    signatures = [b'\x89PNG\r\n\x1a\n', b'PK\x03\x04', b'\x7fELF', b'']
+    for i in range(files):
+        header = signatures[i % len(signatures)]
+        with open(os.path.join(root, f"blob{i:03d}.bin"), 'wb') as f:
+            length = size - len(header)
+            f.write(header + rng.getrandbits(8 * length).to_bytes(length, 'little'))
+    for i in range(text_files):
+        _write(os.path.join(root, 'src', f"code{i:03d}.py"), source_text(rng, 50))
+
+
+def _gitignore(root, rng, patterns, dirs, files_per_dir):
+    _write(os.path.join(root, '.gitignore'), '\n'.join(make_patterns(patterns, rng)) + '\n')
+    exts = ['py', 'pyc', 'log', 'txt', 'html', 'md']
+    for d in range(dirs):
+        directory = os.path.join(root, f"area{d:03d}")
+        if d % 5 == 0:
+            nested = make_patterns(patterns // 10, rng)
+            _write(os.path.join(directory, '.gitignore'), '\n'.join(nested) + '\n')
+        for i in range(files_per_dir):
+            _write(os.path.join(directory, f"f{i}.{rng.choice(exts)}"), source_text(rng, 3))
+
+
+GENERATORS = {
+    'wide': _wide,
+    'deep': _deep,
+    'many_small': _many_small,
+    'huge': _huge,
+    'binary': _binary,
+    'gitignore': _gitignore,
+}
+
+
+def generate(profile, directory, scale='small', seed=0):
+    """
+    Create (or reuse) the synthetic tree for ``profile`` in ``directory``.
+
+    Args:
+        profile (str): One of ``PROFILES``
+        directory (str): Where to create the tree; it must be empty or hold
+            a tree made by this generator, which is replaced if it differs
+        scale (str): ``small`` or ``full``
+        seed (int): Seed of the random generator
+
+    Returns:
+        str: ``directory``
+    """
+    params = SCALES[scale][profile]
+    manifest = {'profile': profile, 'scale': scale, 'seed': seed,
+                'params': params, 'version': GENERATOR_VERSION}
+    manifest_path = os.path.join(directory, MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == manifest:
+                return directory
+        generated = True
+    except (OSError, ValueError):
+        generated = False
+
+    if generated:
+        shutil.rmtree(directory)
+    elif os.path.isdir(directory) and os.listdir(directory):
+        raise ValueError(f"{directory} is not empty and was not created by this generator")
+    os.makedirs(directory, exist_ok=True)
+    GENERATORS[profile](directory, random.Random(f"{profile}:{seed}"), **params)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic tree for benchmarking.')
+    parser.add_argument('profile', choices=PROFILES)
+    parser.add_argument('directory')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.profile, args.directory, args.scale, args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -26,7 +26,6 @@ setup(
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
     ],
     install_requires=[
-        'gitignore_parser',
         'tiktoken'
     ],
     entry_points={
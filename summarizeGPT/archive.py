@@ -0,0 +1,290 @@
+"""
+Summarize tar and zip archives without extracting them.
+
+:func:`scan_archive` lists an archive's members as :class:`Entry` records in
+the same order :func:`~summarizeGPT.summarizeGPT.scan_directory` lists a
+directory, applying the same depth limit and ignore rules (including
+``.gitignore`` members with ``auto_gitignore``). Members get virtual paths
+below the archive's own path (``dist/app.tar.gz/app/setup.py``), and their
+``dir_entry`` is an :class:`ArchiveMember`, which stands in for
+``os.DirEntry``: ``stat()`` reports the member's size and mtime, and
+``open()`` reads it from the archive. Only the members that are actually
+rendered are read.
+
+Zip members and members of uncompressed tars are read directly. A
+compressed tar can only be read front to back, so :meth:`Archive.prefetch`
+plans the reads: members are fetched in archive order, a window of up to
+``PREFETCH_WINDOW_BYTES`` per pass, and handed out in whatever order the
+summary needs them.
+"""
+import io
+import logging
+import os
+import posixpath
+import stat
+import threading
+import time
+import weakref
+import zlib
+from collections import namedtuple
+
+from .ignore import IgnoreMatcher, IgnoreRules
+
+logger = logging.getLogger('SummarizeGPT')
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ZIP_SUFFIXES = ('.zip', '.whl', '.jar')
+ARCHIVE_SUFFIXES = TAR_SUFFIXES + ZIP_SUFFIXES
+
+# Members prefetched from a compressed tar in one pass, and the largest member
+# that is prefetched at all (larger ones are read on their own)
+PREFETCH_WINDOW_BYTES = 64 * 1024 * 1024
+
+MemberStat = namedtuple('MemberStat', ['st_size', 'st_mtime_ns', 'st_mode'])
+
+
+def is_archive(path):
+    """Return True if ``path`` is a file with a tar or zip suffix."""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and os.path.isfile(path)
+
+
+class ArchiveMember:
+    """
+    A file or directory in an :class:`Archive`, with the ``os.DirEntry``
+    methods the scan uses.
+    """
+
+    __slots__ = ('archive', 'name', 'info', '_stat', '__weakref__')
+
+    def __init__(self, archive, name, info, size, mtime, is_dir):
+        self.archive = archive
+        self.name = name
+        self.info = info
+        mode = stat.S_IFDIR | 0o755 if is_dir else stat.S_IFREG | 0o644
+        self._stat = MemberStat(size, int(mtime * 1_000_000_000), mode)
+
+    def stat(self):
+        return self._stat
+
+    def is_dir(self):
+        return stat.S_ISDIR(self._stat.st_mode)
+
+    def open(self, limit=None):
+        """Return a binary file with the member's contents (at most ``limit`` bytes of them)."""
+        return io.BytesIO(self.archive.read(self, limit))
+
+
+class Archive:
+    """
+    An open tar or zip archive and its members.
+
+    Members are listed once; names are normalised to relative POSIX paths
+    and members that would escape the archive root (``..``), links and
+    special files are left out. Reads are serialised by a lock, so members
+    may be read from ``jobs`` threads.
+
+    Raises:
+        OSError: If the archive cannot be opened or listed
+    """
+
+    def __init__(self, path):
+        import tarfile
+        import zipfile
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._plan = {}
+        self._pending = []
+        # Corrupt or unsupported archives are reported as OSError, like unreadable files
+        self._errors = (tarfile.TarError, zipfile.BadZipFile, zlib.error, EOFError, RuntimeError)
+        try:
+            infos = self._open(tarfile, zipfile)
+        except self._errors as e:
+            raise OSError(f"Cannot read archive {path}: {e}") from e
+        self.members = {}
+        for name, info, size, mtime, is_dir in infos:
+            name = _normalize_name(name)
+            if name is None:
+                continue
+            self.members[name] = ArchiveMember(self, name, info, size, mtime, is_dir)
+
+    def _open(self, tarfile, zipfile):
+        path = self.path
+        if path.lower().endswith(ZIP_SUFFIXES):
+            self._zip = zipfile.ZipFile(path)
+            self._tar = None
+            self.compressed = False
+            infos = [(info.filename, info, info.file_size,
+                      _zip_mtime(info), info.is_dir()) for info in self._zip.infolist()]
+            weakref.finalize(self, self._zip.close)
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, 'r:*')
+            self.compressed = not path.lower().endswith('.tar')
+            infos = [(info.name, info, info.size, info.mtime, info.isdir())
+                     for info in self._tar.getmembers() if info.isfile() or info.isdir()]
+            weakref.finalize(self, self._tar.close)
+        return infos
+
+    def read(self, member, limit=None):
+        """
+        Return the contents of ``member`` (at most ``limit`` bytes). A
+        prefetched member stays cached until it is read without a limit.
+        """
+        take = self._cache.pop if limit is None else self._cache.get
+        with self._lock:
+            data = take(member.name, None)
+            if data is None and member.name in self._plan:
+                self._fetch_window(member)
+                data = take(member.name, None)
+            if data is None:
+                try:
+                    data = self._read_member(member, limit)
+                except self._errors as e:
+                    raise OSError(f"Cannot read {member.name} from {self.path}: {e}") from e
+        return data if limit is None else data[:limit]
+
+    def prefetch(self, members, max_file_bytes=None):
+        """
+        Plan to read ``members`` in the given order, replacing any earlier
+        plan. Only compressed tars need a plan; members over
+        ``max_file_bytes`` are not read at all.
+        """
+        if not self.compressed:
+            return
+        with self._lock:
+            self._cache.clear()
+            self._pending = [m for m in members if m.archive is self and not m.is_dir()
+                             and m.stat().st_size <= PREFETCH_WINDOW_BYTES
+                             and (max_file_bytes is None or m.stat().st_size <= max_file_bytes)]
+            self._plan = {m.name: i for i, m in enumerate(self._pending)}
+
+    def _fetch_window(self, member):
+        # Fetch the planned members from ``member`` on, up to the window size,
+        # in one forward pass over the stream
+        start = self._plan[member.name]
+        window, size = [], 0
+        for planned in self._pending[start:]:
+            if window and size + planned.stat().st_size > PREFETCH_WINDOW_BYTES:
+                break
+            window.append(planned)
+            size += planned.stat().st_size
+        for planned in window:
+            del self._plan[planned.name]
+        for planned in sorted(window, key=lambda m: m.info.offset_data):
+            try:
+                self._cache[planned.name] = self._read_member(planned)
+            except self._errors as e:
+                # Left for the member's own read to report
+                logger.debug(f"Could not prefetch {planned.name} from {self.path}: {e}")
+        logger.debug(f"Prefetched {len(window)} members ({size} bytes) from {self.path}")
+
+    def _read_member(self, member, limit=None):
+        if self._zip is not None:
+            with self._zip.open(member.info) as f:
+                return f.read() if limit is None else f.read(limit)
+        f = self._tar.extractfile(member.info)
+        if f is None:
+            return b''
+        with f:
+            return f.read() if limit is None else f.read(limit)
+
+
+def _zip_mtime(info):
+    try:
+        return time.mktime(info.date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0
+
+
+def _normalize_name(name):
+    name = posixpath.normpath(name.replace('\\', '/').lstrip('/'))
+    if name in ('', '.') or name == '..' or name.startswith('../'):
+        return None
+    return name
+
+
+def scan_archive(archive_path, gitignore_file=None, max_depth=None, auto_gitignore=False,
+                 recorder=None):
+    """
+    List the members of an archive as :func:`scan_directory` lists a
+    directory: top-down, each directory followed by its files and then its
+    subdirectories, sorted by name, with ignored directories recorded but
+    not descended into. Directories that only appear in member paths are
+    listed too.
+
+    Args:
+        archive_path (str): The tar or zip file
+        gitignore_file (str, optional): Path to a gitignore file on disk to
+            apply to the members
+        max_depth (int, optional): Deepest directory level to list (root=1)
+        auto_gitignore (bool): Apply ``.gitignore`` members as their
+            directory is entered
+        recorder (Recorder, optional): Times ignore matching as its own phase
+
+    Returns:
+        list[Entry]: The entries in traversal order
+    """
+    from .summarizeGPT import Entry
+
+    archive = Archive(archive_path)
+    root = archive_path.replace("\\", "/")
+    children = {'': []}
+    for name in archive.members:
+        parent = ''
+        for part in name.split('/')[:-1]:
+            path = f"{parent}/{part}" if parent else part
+            if path not in children:
+                children[path] = []
+                children[parent].append(path)
+            parent = path
+        if archive.members[name].is_dir():
+            if name not in children:
+                children[name] = []
+                children[parent].append(name)
+        else:
+            children[parent].append(name)
+
+    matcher = None
+    if gitignore_file or auto_gitignore:
+        matcher = IgnoreMatcher(root)
+        if gitignore_file:
+            matcher.add_file(gitignore_file, base=root)
+    gitignore = matcher
+    if matcher is not None and recorder is not None:
+        gitignore = recorder.timed('ignore', matcher)
+
+    entries = []
+    stack = [('', os.path.basename(root), 1)]
+    while stack:
+        name, base_name, depth = stack.pop()
+        if max_depth is not None and depth > max_depth:
+            continue
+        path = f"{root}/{name}" if name else root
+        entries.append(Entry(path, base_name, depth, True, False, archive.members.get(name)))
+        names = children[name]
+        if auto_gitignore:
+            gitignore_name = f"{name}/.gitignore" if name else '.gitignore'
+            if gitignore_name in archive.members and gitignore_name not in children:
+                member = archive.members[gitignore_name]
+                text = member.open().read().decode('utf-8', 'surrogateescape')
+                matcher.add_rules(IgnoreRules(text.splitlines(), source=f"{root}/{gitignore_name}"),
+                                  base=path)
+        subdirs = []
+        for child in sorted(names):
+            child_path = f"{root}/{child}"
+            child_name = child.rsplit('/', 1)[-1]
+            if child in children:
+                if gitignore and gitignore(child_path, True):
+                    entries.append(Entry(child_path, child_name, depth + 1, True, True,
+                                         archive.members.get(child)))
+                    continue
+                subdirs.append((child, child_name))
+            else:
+                ignored = bool(gitignore and gitignore(child_path))
+                entries.append(Entry(child_path, child_name, depth, False, ignored,
+                                     archive.members[child]))
+        for child, child_name in reversed(subdirs):
+            stack.append((child, child_name, depth + 1))
+    return entries
@@ -0,0 +1,269 @@
+"""
+Summarize many directories in one run: ``SummarizeGPT batch``.
+
+Roots come from the command line and/or a manifest file (one directory per
+line; blank lines and ``#`` comments are skipped). They are summarized in a
+pool of worker processes, each of which builds its :class:`Summarizer`
+and loads the tokenizer once, then reuses them for every root it is
+given. Each root gets its own output file. A failure in one root (an
+unreadable directory, a full disk, even a crashed worker) is reported for
+that root and the rest of the batch carries on.
+
+Usage:
+    SummarizeGPT batch ROOT... [--manifest FILE] [--workers N]
+                       [--output-dir DIR] [--report PATH] [summary options]
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from .summarizeGPT import (
+    FileIndex, Summarizer, add_summary_arguments, check_summary_arguments, new_summary_stats,
+    is_archive, output_path_for, setup_logging, summarizer_options,
+)
+
+logger = logging.getLogger('SummarizeGPT')
+
+# The worker process's summarizer, created by _init_worker
+_summarizer = None
+
+
+def read_manifest(path):
+    """
+    Return the roots listed in a manifest file. Relative paths are taken
+    relative to the manifest's directory.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    roots = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                roots.append(os.path.join(base, os.path.expanduser(line)))
+    return roots
+
+
+def output_paths(roots, output_dir=None):
+    """
+    Return the output file of each root: ``output_file`` inside the root (next
+    to it for an archive), or ``<root name>.md`` in ``output_dir``, numbered
+    when names repeat.
+    """
+    if output_dir is None:
+        return [output_path_for(root) for root in roots]
+    paths = []
+    used = set()
+    for root in roots:
+        name = os.path.basename(os.path.normpath(os.path.abspath(root))) or 'root'
+        candidate, n = name, 1
+        while candidate in used:
+            n += 1
+            candidate = f"{name}-{n}"
+        used.add(candidate)
+        paths.append(os.path.join(output_dir, f"{candidate}.md"))
+    return paths
+
+
+def _init_worker(options, verbose):
+    """Build the worker's summarizer and load its tokenizer before the first root."""
+    global _summarizer
+    setup_logging(verbose)
+    _summarizer = Summarizer(**options)
+    if _summarizer.count_tokens:
+        try:
+            _summarizer.token_cache.encoding
+        except Exception as e:
+            # Reported per root by iter_with_stats; the summaries are still written
+            logger.debug(f"Tokenizer unavailable in worker {os.getpid()}: {e}")
+
+
+def summarize_root(root, output_path):
+    """
+    Summarize ``root`` into ``output_path`` with the worker's summarizer.
+
+    Returns:
+        dict: ``root``, ``output``, ``seconds``, and either ``stats`` or
+        ``error`` (a message; exceptions are not raised, so one root cannot
+        stop the batch)
+    """
+    start = time.perf_counter()
+    result = {'root': root, 'output': output_path, 'stats': None, 'error': None}
+    summarizer = _summarizer
+    try:
+        if not os.path.isdir(root) and not is_archive(root):
+            raise NotADirectoryError(f"Not a directory or archive: {root}")
+        file_index = None
+        # Sections are keyed by working-tree path, so a revision must not share them
+        if summarizer.cache_dir and summarizer.revision is None and summarizer.diff is None:
+            try:
+                file_index = FileIndex(summarizer.cache_dir, root)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Incremental index disabled for {root}: {str(e)}")
+        stats = new_summary_stats(summarizer.encoding_name)
+        try:
+            sections = summarizer.iter_sections(root, file_index=file_index)
+            with open(output_path, "w", encoding="utf-8") as f:
+                for section in summarizer.with_stats(sections, stats):
+                    f.write(section.text)
+        finally:
+            if file_index is not None:
+                try:
+                    file_index.close()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not update the incremental index for {root}: {e}")
+        stats.pop('file_tokens', None)
+        result['stats'] = stats
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(roots, options, workers=None, output_dir=None, verbose=False):
+    """
+    Summarize ``roots`` in a pool of ``workers`` processes.
+
+    Args:
+        roots (list[str]): Directories to summarize
+        options (dict): :class:`Summarizer` keyword arguments
+        workers (int, optional): Worker processes (default: CPU count, at
+            most one per root)
+        output_dir (str, optional): Write every output file here instead
+            of into its root
+        verbose (bool): Log at INFO level in the workers
+
+    Returns:
+        list[dict]: One :func:`summarize_root` result per root, in order
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if not roots:
+        return []
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    outputs = output_paths(roots, output_dir)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(roots)))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(options, verbose)) as pool:
+        futures = [pool.submit(summarize_root, root, output)
+                   for root, output in zip(roots, outputs)]
+        for root, output, future in zip(roots, outputs, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker died (BrokenProcessPool) or the result could not be pickled
+                result = {'root': root, 'output': output, 'stats': None,
+                          'error': f"{type(e).__name__}: {e}", 'seconds': None}
+            results.append(result)
+            if result['error']:
+                logger.error(f"{root}: {result['error']}")
+            else:
+                logger.info(f"{root}: {result['stats']['tokens']} tokens "
+                            f"in {result['seconds']}s")
+    return results
+
+
+def combined_report(results, seconds, workers):
+    """Return the batch report: per-root results and totals over the roots that succeeded."""
+    totals = {'roots': len(results), 'succeeded': 0, 'failed': 0,
+              'lines': 0, 'chars': 0, 'bytes': 0, 'tokens': None}
+    for result in results:
+        stats = result['stats']
+        if result['error'] or stats is None:
+            totals['failed'] += 1
+            continue
+        totals['succeeded'] += 1
+        for key in ('lines', 'chars', 'bytes'):
+            totals[key] += stats[key]
+        if stats['tokens'] is not None:
+            totals['tokens'] = (totals['tokens'] or 0) + stats['tokens']
+    return {'workers': workers, 'seconds': round(seconds, 3), 'totals': totals,
+            'roots': results}
+
+
+def print_report(report, file=None):
+    print("\nBatch Summary:", file=file)
+    for result in report['roots']:
+        if result['error']:
+            print(f"  FAILED  {result['root']}: {result['error']}", file=file)
+        else:
+            tokens = result['stats']['tokens']
+            tokens = '-' if tokens is None else tokens
+            print(f"  {tokens:>8}  {result['output']}", file=file)
+    totals = report['totals']
+    print(f"Roots: {totals['succeeded']} succeeded, {totals['failed']} failed", file=file)
+    print(f"Workers: {report['workers']}, Time: {report['seconds']}s", file=file)
+    print(f"Total Lines: {totals['lines']}", file=file)
+    print(f"Total Characters: {totals['chars']}", file=file)
+    print(f"Total Bytes: {totals['bytes']}", file=file)
+    if totals['tokens'] is not None:
+        print(f"Approximate Tokens: {totals['tokens']}", file=file)
+    print(file=file)
+
+
+def batch_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='SummarizeGPT batch',
+        description='Summarize many directories in a pool of worker processes.')
+    parser.add_argument('roots', nargs='*', help='Directories to summarize')
+    parser.add_argument('--manifest', type=str, default=None, metavar='FILE',
+                        help='Read further directories from FILE, one per line '
+                             '(# starts a comment)')
+    parser.add_argument('--workers', type=int, default=None, metavar='N',
+                        help='Number of worker processes (default: number of CPUs)')
+    parser.add_argument('--output-dir', type=str, default=None, metavar='DIR',
+                        help='Write each summary to DIR/<root name>.md instead of into its root')
+    parser.add_argument('--report', type=str, default=None, metavar='PATH',
+                        help='Write the per-root results and totals to PATH as JSON')
+    add_summary_arguments(parser)
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+
+    error = check_summary_arguments(args)
+    if error is None and args.workers is not None and args.workers < 1:
+        error = "--workers must be at least 1."
+    if error is not None:
+        logger.error(error)
+        sys.exit(1)
+        return
+
+    roots = list(args.roots)
+    if args.manifest:
+        try:
+            roots.extend(read_manifest(args.manifest))
+        except OSError as e:
+            logger.error(f"Failed to read manifest: {str(e)}")
+            sys.exit(1)
+            return
+    if not roots:
+        parser.error("no roots given (pass directories or --manifest)")
+
+    options = summarizer_options(args)
+    try:
+        Summarizer(**options)  # report bad options once, not from every worker
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+        return
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(roots)))
+    start = time.perf_counter()
+    results = run_batch(roots, options, workers=workers, output_dir=args.output_dir,
+                        verbose=args.verbose)
+    report = combined_report(results, time.perf_counter() - start, workers)
+
+    print_report(report)
+    if args.report:
+        try:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+        except OSError as e:
+            logger.error(f"Failed to write report to {args.report}: {str(e)}")
+    if report['totals']['failed']:
+        sys.exit(1)
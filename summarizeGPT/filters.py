@@ -0,0 +1,259 @@
+"""
+The compiled filter pipeline deciding which listed files get their contents
+in the summary.
+
+A :class:`FileFilter` is built once from the configuration: extension lists
+become frozensets, and the glob and regular expression rules (including
+those of the named :data:`PRESETS`) are compiled into one exclude pattern
+plus one pattern per include rule. Rules that only look at a file's name or
+path run first; the size and mtime rules, which need a stat, run only for
+files that passed them. Every rejection is counted against the rule that
+made it, so the effect of each rule can be seen on large trees.
+
+Globs use gitignore syntax and are matched against the path relative to the
+summarized directory: a glob without a ``/`` matches the file name at any
+depth, ``**`` spans directories, and a trailing ``/`` matches everything
+below a directory. Regular expressions are searched for anywhere in the
+relative path.
+"""
+import datetime
+import posixpath
+import re
+import time
+from collections import Counter
+
+from .ignore import translate_pattern
+
+# Named rule sets; their globs are matched case-insensitively
+PRESETS = {
+    'default': {
+        'description': 'leave out env files, licenses, .gitignore, setup.py, __init__.py '
+                       'and docker files',
+        'exclude': ('*.env', '*license', '*gitignore', '*setup.py', '*__init__.py',
+                    '*docker*'),
+    },
+    'all': {
+        'description': 'no name rules',
+    },
+    'docker-only': {
+        'description': 'only docker files and requirements.txt',
+        'include': ('*docker*', '*requirements.txt*'),
+    },
+    'docs': {
+        'description': 'only documentation (.md, .rst, .txt, .adoc)',
+        'include': ('*.md', '*.rst', '*.txt', '*.adoc'),
+    },
+    'no-tests': {
+        'description': 'leave out test files and test directories',
+        'exclude': ('test_*', '*_test.*', '*_tests.*', '*.test.*', '*.spec.*', 'conftest.py',
+                    '**/tests/**', '**/test/**', '**/__tests__/**'),
+    },
+}
+
+# Units of the durations accepted by parse_time
+_DURATION_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+# Global inline flags, which are only allowed at the start of an expression
+_GLOBAL_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+
+
+def glob_to_regex(glob):
+    """Translate a filter glob into a regular expression for :meth:`re.Pattern.fullmatch`."""
+    if glob.endswith('/'):
+        # Everything below the directory; like gitignore, ``name/`` matches at any depth
+        glob = glob + '**' if '/' in glob[:-1] else f"**/{glob}**"
+    return translate_pattern(glob)
+
+
+def parse_time(value, now=None):
+    """
+    Parse a point in time for the mtime rules.
+
+    Args:
+        value (str): A duration before ``now`` (``90s``, ``30m``, ``12h``,
+            ``7d``, ``2w``) or an ISO 8601 date or date and time (local time
+            unless it has an offset)
+        now (float, optional): The current time (default: ``time.time()``)
+
+    Returns:
+        float: Seconds since the epoch
+
+    Raises:
+        ValueError: If ``value`` is neither
+    """
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdw])', value.strip())
+    if match:
+        now = time.time() if now is None else now
+        return now - float(match.group(1)) * _DURATION_SECONDS[match.group(2)]
+    try:
+        return datetime.datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}: use a duration such as 7d or 12h, "
+                         f"or a date such as 2024-05-01") from None
+
+
+def _search_regex(label, regex):
+    """
+    Return a pattern that fully matches the paths in which ``regex`` finds a
+    match. The regex is checked on its own first, and its global inline
+    flags (``(?i)foo``) are scoped to it (``(?i:foo)``) so that it can be
+    combined with other rules.
+
+    Raises:
+        ValueError: If ``regex`` is invalid
+    """
+    try:
+        re.compile(regex)
+    except re.error as e:
+        raise ValueError(f"Invalid {label}: {e}") from None
+    flags = ''
+    match = _GLOBAL_FLAGS.match(regex)
+    while match:
+        flags += match.group(1)
+        regex = regex[match.end():]
+        match = _GLOBAL_FLAGS.match(regex)
+    if 'x' in flags:
+        regex += '\n'  # ends a trailing comment before the group closes
+    return f".*?(?{flags}:{regex}).*" if flags else f".*?(?:{regex}).*"
+
+
+def _compile_alternatives(patterns):
+    """
+    Compile ``(label, regex)`` pairs into one pattern. Returns it with the
+    ``(group, label)`` of each alternative, to tell which one matched.
+    """
+    parts = []
+    groups = []
+    group = 1
+    for label, regex in patterns:
+        try:
+            extra_groups = re.compile(regex).groups
+        except re.error as e:
+            raise ValueError(f"Invalid {label}: {e}") from None
+        parts.append(f"({regex})")
+        groups.append((group, label))
+        group += 1 + extra_groups
+    return re.compile('|'.join(parts), re.DOTALL), groups
+
+
+class FileFilter:
+    """
+    Decide whether a listed file belongs in the summary.
+
+    Rules run in this order, each rejecting a file under its own label:
+
+    1. ``include_exts`` and ``exclude_exts`` (frozensets of lower-case
+       extensions with the leading dot)
+    2. The exclude patterns of the ``presets`` and of ``exclude_globs`` and
+       ``exclude_regexes``, as one pattern
+    3. The include patterns of each preset that has them, then
+       ``include_globs`` and ``include_regexes`` together: a file must match
+       one pattern of every include rule
+    4. ``min_size`` and ``max_size`` in bytes, then ``newer_than`` and
+       ``older_than`` in seconds since the epoch (files without a known
+       mtime, such as git blobs, pass the mtime rules; the command line
+       does not allow them together with ``--rev`` or ``--diff``)
+
+    Args:
+        presets (iterable[str]): Names of :data:`PRESETS` to apply
+
+    Raises:
+        ValueError: For an unknown preset or an invalid regular expression
+    """
+
+    def __init__(self, include_exts=None, exclude_exts=None, presets=(),
+                 include_globs=(), exclude_globs=(), include_regexes=(), exclude_regexes=(),
+                 min_size=None, max_size=None, newer_than=None, older_than=None):
+        self.include_exts = None if include_exts is None else frozenset(include_exts)
+        self.exclude_exts = frozenset(exclude_exts or ())
+
+        excludes = []
+        includes = []
+        for name in presets:
+            if name not in PRESETS:
+                raise ValueError(f"Unknown preset: {name}")
+            preset = PRESETS[name]
+            excludes.extend((f"preset {name}", f"(?i:{glob_to_regex(glob)})")
+                            for glob in preset.get('exclude', ()))
+            if preset.get('include'):
+                includes.append([(f"preset {name}", f"(?i:{glob_to_regex(glob)})")
+                                 for glob in preset['include']])
+        excludes.extend((f"--exclude-glob {glob}", glob_to_regex(glob)) for glob in exclude_globs)
+        excludes.extend((f"--exclude-regex {regex}",
+                         _search_regex(f"--exclude-regex {regex}", regex))
+                        for regex in exclude_regexes)
+        user_includes = [("--include-glob", glob_to_regex(glob)) for glob in include_globs]
+        user_includes.extend(("--include-regex", _search_regex(f"--include-regex {regex}", regex))
+                             for regex in include_regexes)
+        if user_includes:
+            includes.append(user_includes)
+
+        self._exclude = _compile_alternatives(excludes) if excludes else None
+        self._includes = []
+        for rule in includes:
+            labels = sorted({label for label, _ in rule})
+            self._includes.append((" / ".join(labels), _compile_alternatives(rule)[0]))
+
+        self._stat_rules = []
+        if min_size is not None:
+            self._stat_rules.append(('--min-size', lambda st: st.st_size < min_size))
+        if max_size is not None:
+            self._stat_rules.append(('--max-size', lambda st: st.st_size > max_size))
+        if newer_than is not None:
+            newer_ns = int(newer_than * 1_000_000_000)
+            self._stat_rules.append(
+                ('--newer-than', lambda st: 0 < st.st_mtime_ns < newer_ns))
+        if older_than is not None:
+            older_ns = int(older_than * 1_000_000_000)
+            self._stat_rules.append(('--older-than', lambda st: st.st_mtime_ns > older_ns))
+
+    def rejection(self, entry, rel_path):
+        """
+        Return the label of the first rule that rejects a file, or None if
+        it is accepted.
+
+        Args:
+            entry (Entry): The file
+            rel_path (str): Its path relative to the summarized directory,
+                with ``/`` separators
+        """
+        ext = posixpath.splitext(entry.name.lower())[1]
+        if self.include_exts is not None and ext not in self.include_exts:
+            return '--include'
+        if ext in self.exclude_exts:
+            return '--exclude'
+        if self._exclude is not None:
+            pattern, groups = self._exclude
+            match = pattern.fullmatch(rel_path)
+            if match is not None:
+                return next(label for group, label in groups
+                            if match.group(group) is not None)
+        for label, pattern in self._includes:
+            if pattern.fullmatch(rel_path) is None:
+                return label
+        if self._stat_rules:
+            try:
+                st = entry.stat()
+            except OSError:
+                return None  # reported when the file is read
+            for label, rejects in self._stat_rules:
+                if rejects(st):
+                    return label
+        return None
+
+    def __call__(self, entry, rel_path, rejected=None):
+        """
+        Return True if the file is accepted, counting a rejection in the
+        ``rejected`` Counter (by rule label) if one is given.
+        """
+        label = self.rejection(entry, rel_path)
+        if label is None:
+            return True
+        if rejected is not None:
+            rejected[label] += 1
+        return False
+
+
+def format_rejections(rejected):
+    """Format rejection counts as ``rule: count`` pairs, most rejections first."""
+    return ", ".join(f"{label}: {count}" for label, count in Counter(rejected).most_common())
@@ -0,0 +1,188 @@
+"""
+Enumerate the files tracked by git without walking the working tree.
+
+The repository's ``.git/index`` is parsed directly (versions 2, 3 and 4 are
+supported). If the index cannot be read, for example because it is a sparse
+or split index or uses an unknown version, ``git ls-files -z`` is used
+instead.
+"""
+import logging
+import os
+import struct
+
+logger = logging.getLogger('SummarizeGPT')
+
+# Fixed-size part of an index entry: ctime, mtime, dev, ino, mode, uid, gid,
+# size (4 bytes each, times being 2 x 4 bytes), the object id and the flags
+_ENTRY_HEADER = struct.Struct('>8x8x4x4xI4x4x4x20sH')
+_EXTENDED_FLAG = 0x4000
+_STAGE_MASK = 0x3000
+_NAME_MASK = 0x0fff
+_GITLINK_MODE = 0o160000
+_SPARSE_DIR_MODE = 0o040000
+# Extension of a split index (core.splitIndex), whose entries are only the
+# changes against a shared index; and the trailing checksum after extensions
+_SPLIT_INDEX_EXTENSION = b'link'
+_CHECKSUM_SIZE = 20
+
+
+class GitIndexError(Exception):
+    """Raised when a git index cannot be parsed."""
+
+
+def find_git_dir(directory):
+    """
+    Locate the git directory and work tree containing ``directory``.
+
+    Handles both ``.git`` directories and ``.git`` files (worktrees and
+    submodules) that point elsewhere with ``gitdir:``.
+
+    Args:
+        directory (str): A directory inside the work tree
+
+    Returns:
+        tuple or None: ``(git_dir, work_tree)``, or None if not in a repository
+    """
+    current = os.path.abspath(directory)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            return dot_git, current
+        if os.path.isfile(dot_git):
+            with open(dot_git, 'r', encoding='utf-8') as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                git_dir = line[len('gitdir:'):].strip()
+                return os.path.normpath(os.path.join(current, git_dir)), current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def read_git_index(index_path):
+    """
+    Parse a git index file and return the tracked paths.
+
+    Only stage-0 or first-seen conflict entries are returned once each, and
+    submodule entries (gitlinks) are skipped.
+
+    Args:
+        index_path (str): Path to the ``index`` file
+
+    Returns:
+        list[str]: Paths relative to the work tree, using ``/`` separators
+
+    Raises:
+        GitIndexError: If the file is not an index this parser understands,
+            or is a split index
+    """
+    with open(index_path, 'rb') as f:
+        data = f.read()
+
+    if len(data) < 12 or data[:4] != b'DIRC':
+        raise GitIndexError(f"{index_path} is not a git index")
+    version, count = struct.unpack_from('>II', data, 4)
+    if version not in (2, 3, 4):
+        raise GitIndexError(f"Unsupported git index version {version}")
+
+    paths = []
+    offset = 12
+    previous = b''
+    for _ in range(count):
+        start = offset
+        mode, _object_id, flags = _ENTRY_HEADER.unpack_from(data, offset)
+        offset += _ENTRY_HEADER.size
+        if flags & _EXTENDED_FLAG:
+            if version < 3:
+                raise GitIndexError("Extended flags in a version 2 index")
+            offset += 2
+
+        if version == 4:
+            strip, offset = _read_varint(data, offset)
+            end = data.index(b'\0', offset)
+            name = previous[:len(previous) - strip] + data[offset:end]
+            offset = end + 1
+        else:
+            name_length = flags & _NAME_MASK
+            if name_length == _NAME_MASK:
+                end = data.index(b'\0', offset)
+            else:
+                end = offset + name_length
+            name = data[offset:end]
+            # Entries are NUL-padded to a multiple of 8 bytes
+            offset = start + ((end - start + 8) & ~7)
+        previous = name
+
+        if mode == _SPARSE_DIR_MODE:
+            raise GitIndexError("Sparse indexes are not supported")
+        if mode == _GITLINK_MODE:
+            continue
+        if flags & _STAGE_MASK and paths and paths[-1] == name:
+            continue
+        paths.append(name)
+
+    while offset + 8 <= len(data) - _CHECKSUM_SIZE:
+        signature, size = struct.unpack_from('>4sI', data, offset)
+        if signature == _SPLIT_INDEX_EXTENSION:
+            raise GitIndexError("Split indexes are not supported")
+        offset += 8 + size
+
+    return [os.fsdecode(path) for path in paths]
+
+
+def _read_varint(data, offset):
+    """Decode git's offset-encoded varint used by index version 4."""
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7f
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+    return value, offset
+
+
+def git_ls_files(work_tree):
+    """Return the tracked paths reported by ``git ls-files -z``."""
+    # Only needed on this fallback path, so not imported at startup
+    import subprocess
+    result = subprocess.run(['git', 'ls-files', '-z'], cwd=work_tree,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise OSError(f"git ls-files failed: {os.fsdecode(result.stderr).strip()}")
+    return [os.fsdecode(path) for path in result.stdout.split(b'\0') if path]
+
+
+def list_tracked_files(directory):
+    """
+    List the files git tracks under ``directory``.
+
+    Args:
+        directory (str): A directory inside a git work tree
+
+    Returns:
+        list[str] or None: Paths relative to ``directory`` using ``/``
+        separators, in index order, or None if ``directory`` is not in a
+        git repository
+    """
+    located = find_git_dir(directory)
+    if located is None:
+        return None
+    git_dir, work_tree = located
+
+    try:
+        paths = read_git_index(os.path.join(git_dir, 'index'))
+    except (OSError, ValueError, struct.error, GitIndexError) as e:
+        logger.info(f"Falling back to git ls-files: {e}")
+        try:
+            paths = git_ls_files(work_tree)
+        except OSError as e:
+            logger.warning(f"Could not list tracked files: {e}")
+            return None
+
+    prefix = os.path.relpath(os.path.abspath(directory), work_tree).replace(os.sep, '/')
+    if prefix == '.':
+        return paths
+    prefix += '/'
+    return [path[len(prefix):] for path in paths if path.startswith(prefix)]
@@ -0,0 +1,357 @@
+"""
+Summarize a git revision, or only the files changed between two revisions,
+without checking anything out.
+
+The tree of a commit is listed with ``git ls-tree`` and the changes between
+two commits with ``git diff-tree``; file contents are read from one
+long-lived ``git cat-file --batch`` process per summary, so no working tree
+is touched. Each file becomes an :class:`Entry` whose ``dir_entry`` is a
+:class:`GitBlob`, which stands in for ``os.DirEntry`` like the members of
+:mod:`summarizeGPT.archive`: ``stat()`` reports the blob's size and
+``open()`` returns what the summary shows for it, either the blob itself or,
+with a diff context, its unified diff against the base revision.
+"""
+import difflib
+import io
+import logging
+import os
+import stat
+import subprocess
+import threading
+import weakref
+from collections import OrderedDict, namedtuple
+
+from .gitindex import find_git_dir
+
+logger = logging.getLogger('SummarizeGPT')
+
+# ``git diff-tree`` status letters that are reported
+CHANGE_STATUSES = frozenset('AMDT')
+
+BlobStat = namedtuple('BlobStat', ['st_size', 'st_mtime_ns', 'st_mode'])
+
+# Soft cap on the size of blobs kept after a partial read (such as the
+# binary sniff) for the full read that follows it
+KEPT_BLOB_BYTES = 64 * 1024 * 1024
+
+
+class GitError(OSError):
+    """Raised when a git command fails or a revision cannot be resolved."""
+
+
+def run_git(work_tree, *args):
+    """Run a git command in ``work_tree`` and return its standard output as bytes."""
+    try:
+        result = subprocess.run(['git', *args], cwd=work_tree,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError(f"Cannot run git: {e}") from e
+    if result.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {os.fsdecode(result.stderr).strip()}")
+    return result.stdout
+
+
+class CatFile:
+    """
+    A ``git cat-file --batch`` process that reads objects by id.
+
+    Requests are written one at a time under a lock, so blobs may be read
+    from ``jobs`` threads. The process exits when the object is collected
+    or :meth:`close` is called.
+
+    ``git cat-file`` always sends a whole object, so an object read with
+    ``keep`` is held (up to :data:`KEPT_BLOB_BYTES` in all, oldest dropped
+    first) and handed over to the next read of the same id instead of being
+    fetched again.
+    """
+
+    def __init__(self, work_tree):
+        try:
+            self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=work_tree,
+                                             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise GitError(f"Cannot run git: {e}") from e
+        self._lock = threading.Lock()
+        self._kept = OrderedDict()
+        self._kept_bytes = 0
+        self._finalizer = weakref.finalize(self, _close_process, self._process)
+
+    def read(self, object_id, keep=False):
+        """Return the contents of an object, keeping them for the next read if ``keep``."""
+        with self._lock:
+            data = self._kept.pop(object_id, None)
+            if data is not None:
+                self._kept_bytes -= len(data)
+            else:
+                data = self._fetch(object_id)
+            if keep:
+                self._kept[object_id] = data
+                self._kept_bytes += len(data)
+                while self._kept_bytes > KEPT_BLOB_BYTES and len(self._kept) > 1:
+                    self._kept_bytes -= len(self._kept.popitem(last=False)[1])
+        return data
+
+    def _fetch(self, object_id):
+        # Called with the lock held
+        process = self._process
+        try:
+            process.stdin.write(object_id.encode('ascii') + b'\n')
+            process.stdin.flush()
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                raise GitError(f"git cat-file: cannot read object {object_id}")
+            size = int(header[2])
+            data = process.stdout.read(size)
+            process.stdout.read(1)  # the newline after the contents
+        except (BrokenPipeError, ValueError) as e:
+            raise GitError(f"git cat-file: {e}") from e
+        if len(data) != size:
+            raise GitError(f"git cat-file: object {object_id} was cut short")
+        return data
+
+    def close(self):
+        self._finalizer()
+
+
+def _close_process(process):
+    try:
+        process.stdin.close()
+    except OSError:
+        pass
+    process.wait()
+    process.stdout.close()
+
+
+class GitBlob:
+    """
+    A file at a revision, with the ``os.DirEntry`` methods the scan uses.
+    ``path`` is relative to the top of the work tree.
+
+    ``status`` is None when summarizing a single revision, and otherwise the
+    ``git diff-tree`` status of the file (``A``, ``M``, ``D``, ``T``), or
+    ``''`` for a file that did not change. With a ``context``, :meth:`open`
+    returns the file's unified diff with that many lines of context instead
+    of its contents.
+
+    Blobs have no modification time: ``stat()`` reports an mtime of 0.
+    """
+
+    __slots__ = ('cat_file', 'path', 'object_id', 'base_id', 'status', 'context',
+                 '_stat', '_diff')
+
+    def __init__(self, cat_file, path, object_id, size, status=None, base_id=None,
+                 context=None):
+        self.cat_file = cat_file
+        self.path = path
+        self.object_id = object_id
+        self.base_id = base_id
+        self.status = status
+        self.context = context
+        self._stat = BlobStat(size, 0, stat.S_IFREG | 0o644)
+        self._diff = None
+
+    @property
+    def selected(self):
+        """Whether the file's section belongs in the summary."""
+        if self.status is None:
+            return True
+        if self.context is None:
+            # Without hunks there is nothing to show for a deleted file
+            return self.status not in ('', 'D')
+        return self.status != ''
+
+    def stat(self):
+        return self._stat
+
+    def is_dir(self):
+        return False
+
+    def read(self, keep=False):
+        """
+        Return the blob's contents at the summarized revision (empty if
+        deleted), keeping them in the :class:`CatFile` for the next read if
+        ``keep``.
+        """
+        return b'' if self.object_id is None else self.cat_file.read(self.object_id, keep)
+
+    def open(self, limit=None):
+        """
+        Return a binary file with what the summary shows for this file. The
+        contents read for a ``limit`` are kept for the full read that
+        usually follows.
+        """
+        data = self.read(keep=limit is not None) if self.context is None else self.diff()
+        return io.BytesIO(data if limit is None else data[:limit])
+
+    def diff(self):
+        """Return the unified diff of the file against the base revision, as bytes."""
+        if self._diff is None:
+            old = None if self.base_id is None else self.cat_file.read(self.base_id)
+            new = None if self.object_id is None else self.read()
+            self._diff = format_diff(self.path, old, new, self.context)
+        return self._diff
+
+
+def format_diff(path, old, new, context):
+    """
+    Return the unified diff between two versions of a file (None where the
+    file does not exist), as UTF-8 bytes. Versions that are binary or not
+    UTF-8 are reported in one line, like git.
+    """
+    old_name = '/dev/null' if old is None else f"a/{path}"
+    new_name = '/dev/null' if new is None else f"b/{path}"
+    old, new = old or b'', new or b''
+    try:
+        if b'\x00' in old or b'\x00' in new:
+            raise UnicodeDecodeError('utf-8', b'', 0, 1, 'NUL byte')
+        old_lines = old.decode('utf-8').splitlines()
+        new_lines = new.decode('utf-8').splitlines()
+    except UnicodeDecodeError:
+        return f"Binary files {old_name} and {new_name} differ".encode('utf-8')
+    lines = difflib.unified_diff(old_lines, new_lines, old_name, new_name,
+                                 n=context, lineterm='')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def parse_diff_range(spec):
+    """
+    Split ``BASE..HEAD`` or ``BASE...HEAD`` (diff from their merge base) into
+    ``(base, head, merge_base)``. A missing side means ``HEAD``, as in git.
+    """
+    if '...' in spec:
+        base, head = spec.split('...', 1)
+        merge_base = True
+    elif '..' in spec:
+        base, head = spec.split('..', 1)
+        merge_base = False
+    else:
+        base, head, merge_base = spec, '', False
+    return base or 'HEAD', head or 'HEAD', merge_base
+
+
+def resolve_commit(work_tree, revision):
+    """Return the commit id ``revision`` names in the repository at ``work_tree``."""
+    if revision.startswith('-'):
+        raise GitError(f"Invalid revision: {revision}")
+    output = run_git(work_tree, 'rev-parse', '--verify', '--quiet', f"{revision}^{{commit}}")
+    return output.decode('ascii').strip()
+
+
+def resolve_revisions(directory, revision=None, diff=None):
+    """
+    Resolve the commits a summary of ``directory`` needs.
+
+    Returns:
+        tuple: ``(work_tree, prefix, head, base)``: the repository's work
+        tree, ``directory`` relative to it (``''`` at the top, otherwise
+        ending in ``/``), the commit to list and, with ``diff``, the commit
+        to compare it with
+
+    Raises:
+        GitError: If ``directory`` is not in a git repository or a revision
+            does not name a commit
+    """
+    located = find_git_dir(directory)
+    if located is None:
+        raise GitError(f"{directory} is not inside a git repository")
+    work_tree = located[1]
+    prefix = os.path.relpath(os.path.abspath(directory), work_tree).replace(os.sep, '/')
+    prefix = '' if prefix == '.' else prefix + '/'
+    base = None
+    if diff is not None:
+        base, head, merge_base = parse_diff_range(diff)
+        try:
+            base, head = resolve_commit(work_tree, base), resolve_commit(work_tree, head)
+        except GitError:
+            raise GitError(f"--diff {diff} does not name two commits") from None
+        if merge_base:
+            base = run_git(work_tree, 'merge-base', base, head).decode('ascii').strip()
+    else:
+        try:
+            head = resolve_commit(work_tree, revision)
+        except GitError:
+            raise GitError(f"--rev {revision} does not name a commit") from None
+    return work_tree, prefix, head, base
+
+
+def list_revision(directory, revision=None, diff=None, context=None):
+    """
+    List the files under ``directory`` at ``revision``, or at the head of the
+    ``diff`` range with their changes against its base.
+
+    Submodules and symbolic links are left out. Files deleted by the diff
+    are listed too, so the tree view can show them.
+
+    Returns:
+        dict: :class:`GitBlob` by path relative to ``directory``, in git's
+        path order
+    """
+    work_tree, prefix, head, base = resolve_revisions(directory, revision, diff)
+    cat_file = CatFile(work_tree)
+    members = {}
+    for rel, object_id, size in _list_blobs(work_tree, head, prefix):
+        members[rel] = GitBlob(cat_file, prefix + rel, object_id, size,
+                               status=None if base is None else '', context=context)
+    if base is None:
+        logger.info(f"Listed {len(members)} files at {head[:12]}")
+        return members
+
+    changes = run_git(work_tree, 'diff-tree', '-r', '-z', '--no-renames', base, head)
+    fields = changes.split(b'\0')
+    changed = 0
+    deleted = set()
+    for header, path in zip(fields[0::2], fields[1::2]):
+        _, _, old_id, _, status = header.lstrip(b':').split()
+        status = status.decode('ascii')
+        path = os.fsdecode(path)
+        if status not in CHANGE_STATUSES or not path.startswith(prefix):
+            continue
+        rel = path[len(prefix):]
+        if status == 'D':
+            deleted.add(rel)
+        elif rel in members:
+            members[rel].status = status
+            if set(old_id) != {ord('0')}:
+                members[rel].base_id = old_id.decode('ascii')
+            changed += 1
+    if deleted:
+        # Sizes (and which deleted paths were plain files) come from the base tree
+        for rel, object_id, size in _list_blobs(work_tree, base, prefix):
+            if rel in deleted:
+                members[rel] = GitBlob(cat_file, prefix + rel, None, size, status='D',
+                                       base_id=object_id, context=context)
+                changed += 1
+    logger.info(f"{changed} of {len(members)} files changed between "
+                f"{base[:12]} and {head[:12]}")
+    return members
+
+
+def _list_blobs(work_tree, commit, prefix):
+    """Yield ``(path, object_id, size)`` for the regular files of ``commit`` under ``prefix``."""
+    listing = run_git(work_tree, 'ls-tree', '-r', '-z', '--long', '--full-tree', commit)
+    for record in listing.split(b'\0'):
+        if not record:
+            continue
+        info, _, path = record.partition(b'\t')
+        mode, kind, object_id, size = info.split()
+        path = os.fsdecode(path)
+        # Submodules are commits, and the blob of a symbolic link is its target
+        if kind != b'blob' or mode == b'120000' or not path.startswith(prefix):
+            continue
+        yield path[len(prefix):], object_id.decode('ascii'), int(size)
+
+
+def scan_git_revision(directory, gitignore_file=None, max_depth=None, auto_gitignore=False,
+                      recorder=None, revision=None, diff=None, context=None):
+    """
+    List ``directory`` at a git revision, or with the changes of a diff
+    range, in the same form as :func:`scan_directory` (see
+    :func:`list_revision` and :func:`scan_paths`). With ``auto_gitignore``
+    the ``.gitignore`` files of the revision are applied, not those on disk.
+    """
+    from .summarizeGPT import scan_paths
+
+    members = list_revision(directory, revision, diff, context)
+    return scan_paths(directory, list(members), gitignore_file, max_depth=max_depth,
+                      auto_gitignore=auto_gitignore, recorder=recorder, members=members)
@@ -0,0 +1,312 @@
+"""
+A compiled, hierarchical gitignore matcher.
+
+Each ignore file is compiled into one combined regular expression per level
+(one for directories and one for files, since ``dir/`` patterns only apply to
+directories), so a path is checked against a whole file with a single regex
+call. Levels are consulted from the deepest directory upwards and the last
+matching pattern of the first level that matches decides, which gives git's
+precedence and negation semantics. Results for directories are cached, so
+paths under an ignored directory are rejected without matching them again.
+Compiled files are shared between matchers until the file changes on disk,
+so summarizing many trees with the same ignore file compiles it once.
+"""
+import functools
+import logging
+import os
+import re
+
+from .gitindex import find_git_dir
+
+logger = logging.getLogger('SummarizeGPT')
+
+
+def translate_pattern(pattern):
+    """
+    Translate one gitignore glob (without ``!`` or a trailing ``/``) into a
+    regular expression matched against a ``/``-separated path relative to
+    the ignore file's directory.
+
+    Args:
+        pattern (str): The glob
+
+    Returns:
+        str: A regular expression without capturing groups
+    """
+    anchored = '/' in pattern
+    if pattern.startswith('/'):
+        pattern = pattern[1:]
+
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            j = i
+            while j < n and pattern[j] == '*':
+                j += 1
+            whole_segment = (i == 0 or pattern[i - 1] == '/') and (j == n or pattern[j] == '/')
+            if j - i >= 2 and whole_segment:
+                if j == n:
+                    out.append('.*')
+                    i = j
+                else:
+                    out.append('(?:.*/)?')
+                    i = j + 1
+            else:
+                out.append('[^/]*')
+                i = j
+        elif c == '?':
+            out.append('[^/]')
+            i += 1
+        elif c == '[':
+            j = i + 1
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = pattern[i + 1:j]
+            negate = body[:1] in ('!', '^')
+            if negate:
+                body = body[1:]
+            body = body.replace('\\', '\\\\').replace('[', '\\[').replace('^', '\\^')
+            out.append(f"[^/{body}]" if negate else f"[{body}]")
+            i = j + 1
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+
+    regex = ''.join(out)
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return regex
+
+
+def parse_pattern_line(line):
+    """
+    Parse one line of an ignore file.
+
+    Returns:
+        tuple or None: ``(regex, negation, directory_only)``, or None for
+        blank lines and comments
+    """
+    line = line.rstrip('\r\n')
+    # Trailing spaces are ignored unless escaped with a backslash
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+
+    negation = line.startswith('!')
+    if negation:
+        line = line[1:]
+    elif line.startswith(('\\!', '\\#')):
+        line = line[1:]
+
+    directory_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    return translate_pattern(line), negation, directory_only
+
+
+class IgnoreRules:
+    """The compiled patterns of a single ignore file."""
+
+    def __init__(self, lines, source=None):
+        self.source = source
+        rules = [rule for rule in map(parse_pattern_line, lines) if rule is not None]
+        # Reversed, so the first alternative that matches is the last pattern
+        rules.reverse()
+        self._dir_regex, self._dir_negations = self._compile(rules)
+        self._file_regex, self._file_negations = self._compile(
+            [rule for rule in rules if not rule[2]])
+
+    @staticmethod
+    def _compile(rules):
+        if not rules:
+            return None, ()
+        regex = re.compile('|'.join(f"({pattern})" for pattern, _, _ in rules), re.DOTALL)
+        return regex, tuple(negation for _, negation, _ in rules)
+
+    def match(self, rel_path, is_dir):
+        """
+        Match a path relative to this file's directory.
+
+        Returns:
+            bool or None: True if ignored, False if re-included by a
+            negated pattern, None if no pattern matches
+        """
+        if is_dir:
+            regex, negations = self._dir_regex, self._dir_negations
+        else:
+            regex, negations = self._file_regex, self._file_negations
+        if regex is None:
+            return None
+        m = regex.fullmatch(rel_path)
+        if m is None:
+            return None
+        return not negations[m.lastindex - 1]
+
+
+@functools.lru_cache(maxsize=1024)
+def load_rules(path, size, mtime_ns):
+    """
+    Compile the ignore file at ``path``. ``size`` and ``mtime_ns`` are only
+    part of the cache key, so an edited file is compiled again.
+    """
+    with open(path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+        lines = f.read().splitlines()
+    return IgnoreRules(lines, source=path)
+
+
+def _normalize(path):
+    return os.path.abspath(path).replace(os.sep, '/')
+
+
+class IgnoreMatcher:
+    """
+    Decide whether paths are ignored, combining any number of ignore files.
+
+    Ignore files apply to paths below the directory they are registered for;
+    deeper files take precedence over shallower ones, and files registered
+    later for the same directory take precedence over earlier ones (so
+    ``.git/info/exclude`` is registered before the top-level ``.gitignore``).
+
+    ``root`` is the directory being scanned: it and its ancestors are never
+    treated as ignored, so summarizing an ignored directory explicitly still
+    works.
+    """
+
+    def __init__(self, root):
+        root = _normalize(root)
+        self._root_prefix = root if root.endswith('/') else root + '/'
+        self._levels = {}
+        self._sources = set()
+        self._dir_cache = {}
+
+    def add_file(self, path, base=None):
+        """
+        Compile an ignore file and register it for ``base`` (by default the
+        directory containing it). Files already registered are skipped.
+        """
+        real = os.path.realpath(path)
+        if real in self._sources:
+            return
+        self._sources.add(real)
+        try:
+            st = os.stat(path)
+            rules = load_rules(path, st.st_size, st.st_mtime_ns)
+        except OSError as e:
+            logger.debug(f"Could not read ignore file {path}: {e}")
+            return
+        self.add_rules(rules, base if base is not None else os.path.dirname(os.path.abspath(path)))
+
+    def add_rules(self, rules, base):
+        """
+        Register compiled :class:`IgnoreRules` for ``base``, for ignore files
+        that are not on disk (such as ``.gitignore`` members of an archive).
+        """
+        self._levels.setdefault(_normalize(base), []).append(rules)
+        # Decisions cached before these rules were known may now be stale
+        self._dir_cache.clear()
+
+    def add_directory(self, directory):
+        """Register ``directory/.gitignore`` if it exists."""
+        gitignore = os.path.join(directory, '.gitignore')
+        if os.path.isfile(gitignore):
+            self.add_file(gitignore)
+
+    def __call__(self, path, is_dir=False):
+        return self.is_ignored(path, is_dir)
+
+    def is_ignored(self, path, is_dir=False):
+        """
+        Return True if ``path`` is ignored, either by its own patterns or
+        because one of its parent directories is.
+        """
+        path = _normalize(path)
+        if not path.startswith(self._root_prefix):
+            return False
+        if self._dir_ignored(path.rsplit('/', 1)[0]):
+            return True
+        return self._match(path, is_dir)
+
+    def _dir_ignored(self, directory):
+        if not directory.startswith(self._root_prefix):
+            return False
+        ignored = self._dir_cache.get(directory)
+        if ignored is None:
+            ignored = (self._dir_ignored(directory.rsplit('/', 1)[0])
+                       or self._match(directory, True))
+            self._dir_cache[directory] = ignored
+        return ignored
+
+    def _match(self, path, is_dir):
+        base = path
+        while True:
+            cut = base.rfind('/')
+            if cut < 0:
+                return False
+            base = base[:cut]
+            rule_sets = self._levels.get(base or '/')
+            if rule_sets:
+                rel_path = path[cut + 1:] if not base else path[len(base) + 1:]
+                for rules in reversed(rule_sets):
+                    decision = rules.match(rel_path, is_dir)
+                    if decision is not None:
+                        return decision
+            if not base:
+                return False
+
+
+def build_ignore_matcher(directory, gitignore_file=None, hierarchical=False):
+    """
+    Create the matcher used to scan ``directory``.
+
+    Args:
+        directory (str): The directory being summarized
+        gitignore_file (str, optional): An explicit ignore file to apply
+        hierarchical (bool): Also apply ``.git/info/exclude`` and the
+            ``.gitignore`` files of ``directory``'s ancestors inside its git
+            work tree; nested ``.gitignore`` files are added by the scanner
+            as directories are entered
+
+    Returns:
+        IgnoreMatcher or None: None when there is nothing to match against
+    """
+    if not gitignore_file and not hierarchical:
+        return None
+
+    matcher = IgnoreMatcher(directory)
+    if hierarchical:
+        located = find_git_dir(directory)
+        if located is not None:
+            git_dir, work_tree = located
+            exclude = os.path.join(git_dir, 'info', 'exclude')
+            if os.path.isfile(exclude):
+                matcher.add_file(exclude, base=work_tree)
+            ancestor = work_tree
+            rel_parts = os.path.relpath(os.path.abspath(directory), work_tree).split(os.sep)
+            matcher.add_directory(ancestor)
+            for part in rel_parts:
+                if part in ('', '.'):
+                    continue
+                ancestor = os.path.join(ancestor, part)
+                matcher.add_directory(ancestor)
+        else:
+            matcher.add_directory(directory)
+    if gitignore_file:
+        matcher.add_file(gitignore_file)
+    return matcher
@@ -0,0 +1,175 @@
+"""
+Per-phase timing and resource accounting for a summarizer run.
+
+A :class:`Recorder` is passed to the library functions as ``recorder=`` and
+collects wall and CPU time per phase, file counts by outcome, bytes read and
+memory peaks. Hooks receive the same data as it is produced, so callers can
+forward it to their own metrics without parsing ``--stats-json`` output.
+"""
+import contextlib
+import heapq
+import sys
+import threading
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Phases in the order they first happen in a run
+PHASES = ('scan', 'ignore', 'dedup', 'read', 'render', 'tokenize', 'write')
+
+# Outcomes of the files whose contents were considered; files that were
+# listed but never considered (filter rules, depth limits) are counted as
+# ``filtered``, with the rejections of each filter rule in ``filters``
+FILE_STATUSES = ('emitted', 'cached', 'skipped', 'unreadable', 'omitted', 'duplicate')
+
+
+class Recorder:
+    """
+    Collect instrumentation for one run.
+
+    Phase times are summed over every timed call, including calls made on
+    worker threads with ``jobs``, so with several threads a phase can add up
+    to more than the run's wall time. CPU time is per thread
+    (``time.thread_time``).
+
+    Hooks are called as ``hook(event, data)`` with:
+
+    * ``'phase'``: ``{'phase', 'wall', 'cpu'}`` after every timed call
+    * ``'file'``: ``{'path', 'status', 'size', 'bytes_read', 'reason'}`` for
+      each file considered for its contents
+    * ``'finish'``: the dict returned by :meth:`finish`
+
+    Hooks may be called from worker threads and must not raise.
+
+    Args:
+        hooks (iterable[callable], optional): Callbacks receiving events
+        top_files (int): Number of files listed by bytes and by tokens
+    """
+
+    def __init__(self, hooks=(), top_files=10):
+        self.hooks = list(hooks)
+        self.top_files = top_files
+        self.phases = {}
+        self.files = dict.fromkeys(FILE_STATUSES, 0)
+        self.scan = {'visited': 0, 'ignored': 0, 'pruned_dirs': 0}
+        self.listed_files = 0
+        self.filters = Counter()
+        self.bytes_read = 0
+        self.file_bytes = {}
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def _emit(self, event, data):
+        for hook in self.hooks:
+            hook(event, data)
+
+    def add_phase_time(self, phase, wall, cpu):
+        """Add one timed call to ``phase``."""
+        with self._lock:
+            totals = self.phases.setdefault(phase, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            totals['wall'] += wall
+            totals['cpu'] += cpu
+            totals['calls'] += 1
+        if self.hooks:
+            self._emit('phase', {'phase': phase, 'wall': wall, 'cpu': cpu})
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the enclosed block as part of phase ``name``."""
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def timed(self, name, func):
+        """Wrap ``func`` so every call is timed as part of phase ``name``."""
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def record_scan(self, entries):
+        """Count the entries of a scan: visited, ignored and pruned directories."""
+        ignored = [entry for entry in entries if entry.ignored]
+        with self._lock:
+            self.scan['visited'] += len(entries)
+            self.scan['ignored'] += len(ignored)
+            self.scan['pruned_dirs'] += sum(1 for entry in ignored if entry.is_dir)
+            self.listed_files += sum(1 for entry in entries
+                                     if not entry.is_dir and not entry.ignored)
+
+    def record_filters(self, rejected):
+        """Add the number of files each filter rule rejected (a Counter by rule label)."""
+        with self._lock:
+            self.filters.update(rejected)
+
+    def record_file(self, path, status, size=0, bytes_read=0, reason=None):
+        """
+        Count a file's outcome (one of ``FILE_STATUSES``), its size on disk
+        and the bytes of it that were read.
+        """
+        with self._lock:
+            self.files[status] += 1
+            self.bytes_read += bytes_read
+            if status in ('emitted', 'cached'):
+                self.file_bytes[path] = size
+        if self.hooks:
+            self._emit('file', {'path': path, 'status': status, 'size': size,
+                                'bytes_read': bytes_read, 'reason': reason})
+
+    def finish(self, summary_stats=None):
+        """
+        Close the run and return everything recorded as a JSON-serialisable dict.
+
+        Args:
+            summary_stats (dict, optional): The output statistics of
+                :func:`~summarizeGPT.summarizeGPT.iter_with_stats`, used for
+                the output totals and the files with the most tokens
+        """
+        import tracemalloc
+        phases = {name: self.phases[name] for name in PHASES if name in self.phases}
+        phases.update((name, totals) for name, totals in self.phases.items()
+                      if name not in phases)
+        result = {
+            'total': {'wall': time.perf_counter() - self._start_wall,
+                      'cpu': time.process_time() - self._start_cpu},
+            'phases': phases,
+            'files': dict(self.scan, **self.files,
+                          filtered=max(self.listed_files - sum(self.files.values()), 0),
+                          filters=dict(self.filters.most_common())),
+            'bytes_read': self.bytes_read,
+            'memory': {'peak_rss_bytes': peak_rss_bytes(),
+                       'tracemalloc_peak_bytes': (tracemalloc.get_traced_memory()[1]
+                                                  if tracemalloc.is_tracing() else None)},
+            'top_files': {'by_bytes': _top(self.file_bytes, self.top_files)},
+        }
+        if summary_stats is not None:
+            result['output'] = {key: summary_stats[key]
+                                for key in ('lines', 'chars', 'bytes', 'tokens', 'encoding')}
+            result['output'].update((key, summary_stats[key]) for key in (
+                'duplicates', 'duplicate_bytes_saved', 'duplicate_tokens_saved', 'minified')
+                if key in summary_stats)
+            result['top_files']['by_tokens'] = _top(summary_stats.get('file_tokens') or {},
+                                                    self.top_files)
+        self._emit('finish', result)
+        return result
+
+
+def _top(counts, n):
+    return [[path, value] for path, value in
+            heapq.nlargest(n, counts.items(), key=lambda item: item[1])]
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
@@ -0,0 +1,385 @@
+"""
+Language-aware minification of file contents for ``--minify``.
+
+Comments, docstrings and layout cost tokens without telling the reader much
+about what the code does. :func:`minify` removes them with a handler chosen
+by file extension (see :func:`language_for`):
+
+* Python goes through :mod:`tokenize`: comments and string statements
+  (docstrings) are dropped, with ``pass`` put in a block that would be left
+  empty. The result must still parse, or the file is kept as it was.
+* C, C++, C#, Java, JavaScript, TypeScript and Go lose their ``//`` and
+  ``/* */`` comments. Strings, JavaScript regular expression literals and
+  directives that change how a file builds (``//go:build``, cgo preambles,
+  ``/// <reference>``) are kept.
+* JSON loses the whitespace between its tokens; YAML loses comments,
+  trailing whitespace and the padding inside lines, while its indentation
+  and block scalars are left alone.
+
+Handlers also work on fragments: a file sampled with ``--head``, ``--tail``
+or ``--max-tokens-per-file`` is minified piece by piece around its
+truncation markers.
+"""
+import ast
+import io
+import re
+import tokenize
+
+# Languages by lower-case file extension
+LANGUAGES = {
+    '.py': 'python', '.pyi': 'python', '.pyw': 'python',
+    '.js': 'javascript', '.mjs': 'javascript', '.cjs': 'javascript', '.jsx': 'javascript',
+    '.ts': 'typescript', '.mts': 'typescript', '.cts': 'typescript', '.tsx': 'typescript',
+    '.go': 'go',
+    '.c': 'c', '.h': 'c',
+    '.cc': 'c++', '.cpp': 'c++', '.cxx': 'c++', '.hh': 'c++', '.hpp': 'c++', '.hxx': 'c++',
+    '.cs': 'c#',
+    '.java': 'java',
+    '.json': 'json',
+    '.yaml': 'yaml', '.yml': 'yaml',
+}
+
+# Lines put in by read_sampled_text and the token packer where text was left out
+_MARKER_LINE = re.compile(r'^\[\.\.\. truncated: [^\n]* omitted \.\.\.\]$', re.MULTILINE)
+
+# Characters after which a ``/`` in JavaScript starts a regular expression
+# rather than a division, and the keywords that act the same way
+_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = frozenset(('return', 'typeof', 'instanceof', 'case', 'do', 'else', 'in',
+                             'of', 'new', 'delete', 'void', 'throw', 'yield', 'await'))
+
+
+def language_for(name):
+    """Return the language :func:`minify` handles a file name as, or None."""
+    dot = name.rfind('.')
+    return LANGUAGES.get(name[dot:].lower()) if dot > 0 else None
+
+
+def minify(text, language):
+    """
+    Return ``text`` with the comments and layout of ``language`` removed
+    (see the module documentation). Truncation markers and the text between
+    them are handled separately.
+    """
+    handler = _HANDLERS[language]
+    pieces = _MARKER_LINE.split(text)
+    if len(pieces) == 1:
+        return handler(text, complete=True)
+    markers = _MARKER_LINE.findall(text)
+    out = [handler(pieces[0], complete=False)]
+    for marker, piece in zip(markers, pieces[1:]):
+        out.append(marker)
+        out.append(handler(piece, complete=False))
+    return ''.join(out)
+
+
+def minify_python(text, complete=True):
+    """
+    Drop comments and string statements from Python source, keeping a
+    leading ``#!`` line. When ``complete``, the result is checked to parse
+    (retrying with the strings kept), and the text is returned unchanged if
+    it does not.
+    """
+    result = _strip_python(text, strings=True)
+    if not complete or result == text or _parses(result):
+        return result
+    # Only a change that broke the code is undone
+    if not _parses(text):
+        return result
+    result = _strip_python(text, strings=False)
+    return result if _parses(result) else text
+
+
+def _parses(source):
+    try:
+        compile(source, '<minify>', 'exec', ast.PyCF_ONLY_AST, dont_inherit=True)
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def _python_tokens(text):
+    """Tokenize as far as possible: a fragment may stop in mid-statement."""
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(text).readline):
+            tokens.append(token)
+    except (tokenize.TokenError, SyntaxError):
+        # Only the lines before the one that failed are trusted
+        while tokens and tokens[-1].type not in (tokenize.NEWLINE, tokenize.NL):
+            tokens.pop()
+    return tokens
+
+
+def _strip_python(text, strings=True):
+    tokens = _python_tokens(text)
+    skip = (tokenize.NL, tokenize.COMMENT)
+    significant = [token for token in tokens if token.type not in skip]
+    cuts = {}         # row -> column where a comment starts
+    dropped = set()   # rows of removed string statements
+    replaced = {}     # row -> indentation of a ``pass`` standing in for a block
+    for token in tokens:
+        if token.type != tokenize.COMMENT:
+            continue
+        if not (token.start[0] == 1 and token.string.startswith('#!')):
+            cuts[token.start[0]] = token.start[1]
+    if strings:
+        for i, token in enumerate(significant):
+            if token.type != tokenize.STRING:
+                continue
+            before = significant[i - 1].type if i else None
+            if before not in (None, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+                continue
+            end = i
+            while end + 1 < len(significant) and significant[end + 1].type == tokenize.STRING:
+                end += 1
+            if end + 1 >= len(significant) or significant[end + 1].type not in (
+                    tokenize.NEWLINE, tokenize.ENDMARKER):
+                continue
+            rows = range(token.start[0], significant[end].end[0] + 1)
+            after = significant[end + 2].type if end + 2 < len(significant) else None
+            if before == tokenize.INDENT and after in (tokenize.DEDENT, tokenize.ENDMARKER, None):
+                replaced[token.start[0]] = token.line[:token.start[1]]
+            dropped.update(rows)
+
+    lines = text.splitlines(keepends=True)
+    out = []
+    for row, line in enumerate(lines, 1):
+        if row in replaced:
+            out.append(f"{replaced[row]}pass\n")
+        elif row in dropped:
+            continue
+        elif row in cuts:
+            kept = line[:cuts[row]].rstrip()
+            if kept:
+                out.append(kept + ('\n' if line.endswith('\n') else ''))
+        else:
+            out.append(line)
+    return ''.join(out)
+
+
+def strip_c_comments(text, quotes='"\'', regex_literals=False, keep=(), keep_before=None):
+    """
+    Remove ``//`` and ``/* */`` comments outside string literals.
+
+    A block comment becomes a newline if it spanned lines (where JavaScript
+    and Go insert semicolons) and a space otherwise.
+
+    Args:
+        text (str): The source
+        quotes (str): Characters that open a string literal
+        regex_literals (bool): Recognise JavaScript regular expressions
+        keep (tuple[str]): Prefixes of line comments to keep
+        keep_before (re.Pattern, optional): Keep block comments followed
+            by a match of this pattern
+    """
+    out = []
+    i = start = 0
+    n = len(text)
+    last = ''
+    last_at = -1
+    while i < n:
+        c = text[i]
+        if c in quotes:
+            i = _skip_string(text, i, c)
+            last, last_at = c, i - 1
+            continue
+        if c == '/' and i + 1 < n:
+            following = text[i + 1]
+            if following == '/':
+                end = text.find('\n', i)
+                end = n if end < 0 else end
+                if not (keep and text.startswith(keep, i)):
+                    out.append(text[start:i])
+                    start = end
+                i = end
+                continue
+            if following == '*':
+                end = text.find('*/', i + 2)
+                end = n if end < 0 else end + 2
+                if keep_before is None or not keep_before.match(text, end):
+                    out.append(text[start:i])
+                    out.append('\n' if '\n' in text[i:end] else ' ')
+                    start = end
+                i = end
+                continue
+            if regex_literals and _starts_regex(text, last, last_at):
+                i = _skip_regex(text, i)
+                last, last_at = '/', i - 1
+                continue
+        if not c.isspace():
+            last, last_at = c, i
+        i += 1
+    out.append(text[start:])
+    return '\n'.join(line.rstrip() for line in ''.join(out).split('\n'))
+
+
+def _skip_string(text, i, quote):
+    # Return the index after the string opened at ``i``; strings other than
+    # template literals end at the line
+    j, n = i + 1, len(text)
+    while j < n:
+        c = text[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == quote:
+            return j + 1
+        if c == '\n' and quote != '`':
+            return j
+        j += 1
+    return n
+
+
+def _starts_regex(text, last, last_at):
+    if last == '' or last in _REGEX_PRECEDERS:
+        return True
+    if last.isalpha():
+        start = last_at
+        while start > 0 and (text[start - 1].isalnum() or text[start - 1] in '_$'):
+            start -= 1
+        return text[start:last_at + 1] in _REGEX_KEYWORDS
+    return False
+
+
+def _skip_regex(text, i):
+    # Return the index after the regular expression opened at ``i``, or just
+    # after the ``/`` if the line ends first (it was a division after all)
+    j, n = i + 1, len(text)
+    in_class = False
+    while j < n:
+        c = text[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == '\n':
+            return i + 1
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            return j + 1
+        j += 1
+    return i + 1
+
+
+def minify_json(text, complete=True):
+    """
+    Remove the whitespace between JSON tokens. Line breaks are kept if the
+    text has ``//`` comments (JSON with comments), which end at them.
+    """
+    out = []
+    breaks = []
+    i = start = 0
+    n = len(text)
+    comments = False
+    while i < n:
+        c = text[i]
+        if c == '"':
+            i = _skip_string(text, i, c)
+            continue
+        if c == '/' and text.startswith('//', i):
+            comments = True
+        if c.isspace():
+            out.append(text[start:i])
+            if c == '\n':
+                breaks.append(len(out))
+                out.append('')
+            start = i + 1
+        i += 1
+    out.append(text[start:])
+    if comments:
+        for i in breaks:
+            out[i] = '\n'
+    return ''.join(out)
+
+
+_BLOCK_SCALAR = re.compile(r'(?:^|[\s:\-?])[|>][+-]?\d?[+-]?$')
+
+
+def minify_yaml(text, complete=True):
+    """
+    Drop YAML comments, trailing whitespace and runs of spaces inside lines.
+    Indentation and the contents of block scalars (``|`` and ``>``) are kept.
+    """
+    out = []
+    block_indent = None
+    lines = text.split('\n')
+    if text.endswith('\n'):
+        lines.pop()
+    for line in lines:
+        content = line.lstrip(' ')
+        indent = len(line) - len(content)
+        if block_indent is not None:
+            if not content.strip() or indent > block_indent:
+                out.append(line)
+                continue
+            block_indent = None
+        if not content.strip() or content.startswith('#'):
+            continue
+        content = _compact_yaml_line(content)
+        if not content:
+            continue
+        out.append(' ' * indent + content)
+        if _BLOCK_SCALAR.search(content):
+            block_indent = indent
+    result = '\n'.join(out)
+    return result + '\n' if out and text.endswith('\n') else result
+
+
+def _compact_yaml_line(content):
+    # Remove an inline comment and collapse runs of whitespace outside quotes
+    out = []
+    i, n = 0, len(content)
+    while i < n:
+        c = content[i]
+        if c in '"\'' and (i == 0 or content[i - 1] in ' \t[{,:-'):
+            j = i + 1
+            while j < n:
+                if c == '"' and content[j] == '\\':
+                    j += 2
+                    continue
+                if content[j] == c:
+                    if c == "'" and content.startswith("''", j):
+                        j += 2
+                        continue
+                    break
+                j += 1
+            out.append(content[i:j + 1])
+            i = j + 1
+            continue
+        if c in ' \t':
+            j = i
+            while j < n and content[j] in ' \t':
+                j += 1
+            if j < n and content[j] == '#':
+                break
+            out.append(' ')
+            i = j
+            continue
+        out.append(c)
+        i += 1
+    return ''.join(out).rstrip()
+
+
+def _c_family(**options):
+    def handler(text, complete=True):
+        return strip_c_comments(text, **options)
+    return handler
+
+
+_HANDLERS = {
+    'python': minify_python,
+    'javascript': _c_family(quotes='"\'`', regex_literals=True),
+    'typescript': _c_family(quotes='"\'`', regex_literals=True,
+                            keep=('/// <reference', '/// <amd')),
+    'go': _c_family(quotes='"\'`', keep=('//go:', '// +build'),
+                    keep_before=re.compile(r'\s*import\s+"C"')),
+    'c': _c_family(),
+    'c++': _c_family(),
+    'c#': _c_family(),
+    'java': _c_family(),
+    'json': minify_json,
+    'yaml': minify_yaml,
+}
@@ -0,0 +1,192 @@
+"""
+Read the beginning and end of a file without reading the middle.
+
+Used for ``--max-lines``, ``--head``/``--tail`` and ``--max-tokens-per-file``:
+the head is read forwards line by line and the tail is found by seeking back
+from the end of the file in blocks, so the cost depends on the size of the
+sample rather than the size of the file. The omitted part is replaced by a
+marker giving its size in lines and bytes.
+"""
+import codecs
+
+# Block size for scanning backwards from the end of a file
+TAIL_BLOCK_BYTES = 64 * 1024
+
+# The lines of an omitted region are only counted if it is at most this large
+LINE_COUNT_SCAN_BYTES = 8 * 1024 * 1024
+
+# Bytes read per token of --max-tokens-per-file budget; tokens are rarely
+# longer, so this bounds the read without usually keeping fewer tokens
+SAMPLE_BYTES_PER_TOKEN = 16
+
+
+def read_sampled_text(path, head=None, tail=None, max_tokens=None, encoding=None, fileobj=None):
+    """
+    Read the first ``head`` and last ``tail`` lines of a file, then keep at
+    most ``max_tokens`` tokens of them.
+
+    With neither ``head`` nor ``tail``, the token budget is split between the
+    beginning and the end of the file; with only ``head`` it all goes to the
+    beginning. Line endings are normalised to ``\\n`` as in text mode.
+
+    Args:
+        path (str): The file to read
+        head (int, optional): Number of leading lines to keep
+        tail (int, optional): Number of trailing lines to keep
+        max_tokens (int, optional): Maximum number of tokens to keep
+        encoding (tiktoken.Encoding, optional): Required with ``max_tokens``
+        fileobj (file, optional): An open, seekable binary file to read
+            (and close) instead of opening ``path``
+
+    Returns:
+        str: The sampled text, with a truncation marker where lines or bytes
+        were omitted
+
+    Raises:
+        OSError: If the file cannot be read
+        UnicodeDecodeError: If the sampled bytes are not valid UTF-8
+    """
+    line_sampling = head is not None or tail is not None
+    head = head if head is not None else (0 if tail is not None else None)
+    tail = tail or 0
+    if max_tokens is None:
+        head_budget = tail_budget = None
+    elif tail or not line_sampling:
+        head_budget, tail_budget = max_tokens - max_tokens // 2, max_tokens // 2
+    else:
+        head_budget, tail_budget = max_tokens, 0
+    head_limit = None if head_budget is None else head_budget * SAMPLE_BYTES_PER_TOKEN
+    tail_limit = None if tail_budget is None else tail_budget * SAMPLE_BYTES_PER_TOKEN
+
+    with open(path, 'rb') if fileobj is None else fileobj as f:
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(0)
+        head_bytes = _read_head(f, head, head_limit)
+        head_end = len(head_bytes)
+        if line_sampling and not tail:
+            tail_start = size
+        else:
+            tail_start = _find_tail_start(f, size, tail if line_sampling else None,
+                                          head_end, tail_limit)
+        f.seek(tail_start)
+        tail_bytes = f.read(size - tail_start)
+        gap_lines = _count_lines(f, head_end, tail_start, size)
+
+    if head_end == tail_start:
+        head_text, tail_text = (head_bytes + tail_bytes).decode('utf-8'), ''
+    else:
+        # Byte limits may cut through a character at either edge
+        head_text = codecs.getincrementaldecoder('utf-8')().decode(head_bytes, final=False)
+        skip = 0
+        while skip < len(tail_bytes) and 0x80 <= tail_bytes[skip] < 0xc0:
+            skip += 1
+        tail_text = tail_bytes[skip:].decode('utf-8')
+
+    dropped = []
+    if max_tokens is not None:
+        head_text, tail_text, dropped = _limit_tokens(head_text, tail_text, head_budget,
+                                                      tail_budget, encoding)
+
+    omitted_bytes = size - len(head_text.encode('utf-8')) - len(tail_text.encode('utf-8'))
+    if omitted_bytes <= 0:
+        return _normalize_newlines(head_text + tail_text)
+    omitted_lines = None
+    if gap_lines is not None:
+        omitted_lines = gap_lines + sum(text.count('\n') for text in dropped)
+    if head_text and not head_text.endswith('\n'):
+        head_text += '\n'
+    marker = format_truncation_marker(omitted_lines, omitted_bytes)
+    return _normalize_newlines(f"{head_text}{marker}\n{tail_text}")
+
+
+def format_truncation_marker(omitted_lines, omitted_bytes):
+    """Describe an omitted region; the line count is left out when unknown."""
+    if omitted_lines is None:
+        return f"[... truncated: {omitted_bytes} bytes omitted ...]"
+    return f"[... truncated: {omitted_lines} lines, {omitted_bytes} bytes omitted ...]"
+
+
+def _read_head(f, lines, limit):
+    """Read up to ``lines`` lines (all if None), stopping after ``limit`` bytes."""
+    if lines is None:
+        return f.read() if limit is None else f.read(limit)
+    chunks = []
+    remaining = limit
+    for _ in range(lines):
+        line = f.readline() if remaining is None else f.readline(remaining)
+        if not line:
+            break
+        chunks.append(line)
+        if remaining is not None:
+            remaining -= len(line)
+            if remaining <= 0:
+                break
+    return b''.join(chunks)
+
+
+def _find_tail_start(f, size, lines, floor, limit):
+    """
+    Return the offset where the last ``lines`` lines begin (or the last
+    ``limit`` bytes if ``lines`` is None), never before ``floor``.
+    """
+    lowest = floor if limit is None else max(floor, size - limit)
+    if lines is None:
+        return lowest if limit is not None else size
+    if lines == 0 or size <= lowest:
+        return size
+    f.seek(size - 1)
+    pos = size - 1 if f.read(1) == b'\n' else size
+    found = 0
+    while pos > lowest:
+        start = max(lowest, pos - TAIL_BLOCK_BYTES)
+        f.seek(start)
+        block = f.read(pos - start)
+        index = len(block)
+        while True:
+            index = block.rfind(b'\n', 0, index)
+            if index < 0:
+                break
+            found += 1
+            if found == lines:
+                return start + index + 1
+        pos = start
+    return lowest
+
+
+def _count_lines(f, start, end, size):
+    """
+    Count the line breaks in ``[start, end)``, plus an unterminated last line
+    of the file, or return None if the region is too large to scan.
+    """
+    if end - start > LINE_COUNT_SCAN_BYTES:
+        return None
+    if end <= start:
+        return 0
+    f.seek(start)
+    region = f.read(end - start)
+    return region.count(b'\n') + (end == size and not region.endswith(b'\n'))
+
+
+def _limit_tokens(head_text, tail_text, head_budget, tail_budget, encoding):
+    """Keep the first ``head_budget`` and last ``tail_budget`` tokens."""
+    dropped = []
+    head_tokens = encoding.encode(head_text, disallowed_special=())
+    if not tail_text and len(head_tokens) > head_budget + tail_budget:
+        kept_tail = head_tokens[len(head_tokens) - tail_budget:] if tail_budget else []
+        dropped.append(encoding.decode(head_tokens[head_budget:len(head_tokens) - tail_budget]))
+        return encoding.decode(head_tokens[:head_budget]), encoding.decode(kept_tail), dropped
+    if tail_text and len(head_tokens) > head_budget:
+        dropped.append(encoding.decode(head_tokens[head_budget:]))
+        head_text = encoding.decode(head_tokens[:head_budget])
+    if tail_text:
+        tail_tokens = encoding.encode(tail_text, disallowed_special=())
+        if len(tail_tokens) > tail_budget:
+            cut = len(tail_tokens) - tail_budget
+            dropped.append(encoding.decode(tail_tokens[:cut]))
+            tail_text = encoding.decode(tail_tokens[cut:])
+    return head_text, tail_text, dropped
+
+
+def _normalize_newlines(text):
+    return text.replace('\r\n', '\n').replace('\r', '\n')
@@ -0,0 +1,496 @@
+"""
+A local summary server: ``SummarizeGPT serve``.
+
+Editors and agents that summarize the same repositories over and over can
+talk to one long-lived process instead of starting the CLI each time. The
+server speaks a minimal HTTP/1.1 on localhost or on a Unix socket:
+
+* ``POST /summarize`` with a JSON body ``{"args": [DIRECTORY, OPTION...]}``
+  taking the same arguments as the command line (for example
+  ``["/src/app", "--include", "py", "-ig"]``) streams the markdown summary
+  back with chunked transfer encoding.
+* ``GET /stats`` returns the cache counters as JSON.
+
+Between requests the server keeps, in size-bounded LRU caches, the scanned
+entries of recently used trees and the rendered section of every file.
+A scan is reused while the stat signatures of its directories and of the
+ignore files that shaped it are unchanged, and a section while its file's
+signature is, so a repeated request only stats the tree.
+
+Usage:
+    SummarizeGPT serve [--host HOST] [--port PORT | --socket PATH]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from .gitrev import resolve_revisions
+from .summarizeGPT import (
+    RACY_MTIME_NS, Summarizer, add_summary_arguments, check_summary_arguments,
+    is_archive, setup_logging, summarizer_options,
+)
+
+logger = logging.getLogger('SummarizeGPT')
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Cache bounds: rendered section text, scanned trees and configurations
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_TREES = 64
+MAX_SUMMARIZERS = 16
+
+# Bookkeeping charged to each cached section on top of its text
+SECTION_OVERHEAD_BYTES = 200
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+# Sections are sent in chunks of about this size
+CHUNK_BYTES = 64 * 1024
+QUEUED_CHUNKS = 8
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    """Raised for a request the server cannot serve; carries the HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class SectionCache:
+    """
+    Size-bounded LRU cache of rendered file sections.
+
+    Implements the ``lookup``/``store`` interface of
+    :class:`~summarizeGPT.summarizeGPT.FileIndex`: a section is served
+    while its file's size and mtime are unchanged. When the cached text
+    exceeds ``max_bytes``, the least recently used sections are dropped.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._sections = OrderedDict()  # (path, options) -> (signature, section, cost)
+
+    def lookup(self, entry, options):
+        key = (os.path.abspath(entry.path), options)
+        try:
+            st = entry.stat()
+        except OSError:
+            return False, None
+        with self._lock:
+            item = self._sections.get(key)
+            if item is None or item[0] != (st.st_size, st.st_mtime_ns):
+                self.misses += 1
+                return False, None
+            self._sections.move_to_end(key)
+            self.hits += 1
+            return True, item[1]
+
+    def store(self, entry, options, contents, section):
+        try:
+            st = entry.stat()
+        except OSError:
+            return
+        if time.time_ns() - st.st_mtime_ns < RACY_MTIME_NS:
+            return
+        key = (os.path.abspath(entry.path), options)
+        cost = SECTION_OVERHEAD_BYTES
+        if section is not None:
+            cost += len(section.text)
+            if section.minified is not None:
+                cost += len(section.minified[1])
+        with self._lock:
+            old = self._sections.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self._sections[key] = ((st.st_size, st.st_mtime_ns), section, cost)
+            self.bytes += cost
+            while self.bytes > self.max_bytes and self._sections:
+                _, (_, _, evicted) = self._sections.popitem(last=False)
+                self.bytes -= evicted
+
+    def stats(self):
+        with self._lock:
+            return {'sections': len(self._sections), 'bytes': self.bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+class TreeCache:
+    """
+    LRU cache of scanned trees, keyed by directory and scan options.
+
+    A scan is valid while the signatures of its directories, of the
+    ``.gitignore`` files it found, and of the ignore files and git index
+    above the directory are unchanged: files appearing, disappearing or
+    being renamed change their directory's mtime. Cached entries carry no
+    ``DirEntry``, so the sections' stat checks always see the current file.
+    """
+
+    def __init__(self, max_trees=DEFAULT_MAX_TREES):
+        self.max_trees = max_trees
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._trees = OrderedDict()  # key -> (signatures, entries)
+
+    def scan(self, summarizer, directory):
+        """Return the entries of ``directory`` as :meth:`Summarizer.scan` would."""
+        directory = os.path.abspath(directory)
+        key = (directory, summarizer.gitignore_file, summarizer.tree_depth,
+               summarizer.file_depth, summarizer.git_tracked, summarizer.auto_gitignore)
+        with self._lock:
+            cached = self._trees.get(key)
+        if cached is not None:
+            signatures, entries = cached
+            if all(_signature(path) == signature for path, signature in signatures.items()):
+                with self._lock:
+                    self._trees.move_to_end(key)
+                    self.hits += 1
+                return entries
+        # DirEntry stat results go stale; archive members are read through theirs
+        entries = [entry._replace(dir_entry=None) if isinstance(entry.dir_entry, os.DirEntry)
+                   else entry for entry in summarizer.scan(directory)]
+        signatures = {path: _signature(path)
+                      for path in self._watched_paths(directory, summarizer, entries)}
+        with self._lock:
+            self.misses += 1
+            self._trees[key] = (signatures, entries)
+            self._trees.move_to_end(key)
+            while len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+        return entries
+
+    @staticmethod
+    def _watched_paths(directory, summarizer, entries):
+        paths = {directory}
+        for entry in entries:
+            if entry.is_dir and not entry.ignored or entry.name == '.gitignore':
+                paths.add(os.path.abspath(entry.path))
+        if summarizer.gitignore_file:
+            paths.add(os.path.abspath(summarizer.gitignore_file))
+        parent = directory
+        while True:
+            paths.add(os.path.join(parent, '.gitignore'))
+            paths.add(os.path.join(parent, '.git', 'info', 'exclude'))
+            paths.add(os.path.join(parent, '.git', 'index'))
+            parent, previous = os.path.dirname(parent), parent
+            if parent == previous:
+                return paths
+
+    def stats(self):
+        with self._lock:
+            return {'trees': len(self._trees), 'max_trees': self.max_trees,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class _ArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise RequestError(400, message)
+
+    def exit(self, status=0, message=None):
+        raise RequestError(400, message or "invalid arguments")
+
+
+def request_parser():
+    """Return the parser for the ``args`` of a summarize request."""
+    parser = _ArgumentParser(prog='summarize', add_help=False)
+    parser.add_argument('directory', type=str)
+    add_summary_arguments(parser)
+    return parser
+
+
+class SummaryServer:
+    """
+    The server state: request parsing, configurations and caches.
+
+    Summarizers are kept per distinct set of options (a few at most), each
+    guarded by a lock since a :class:`Summarizer` is used from one thread
+    at a time; requests with different options run concurrently.
+    """
+
+    def __init__(self, cache_bytes=DEFAULT_CACHE_BYTES, max_trees=DEFAULT_MAX_TREES):
+        self.sections = SectionCache(cache_bytes)
+        self.trees = TreeCache(max_trees)
+        self.requests = 0
+        self._parser = request_parser()
+        self._lock = threading.Lock()
+        self._summarizers = OrderedDict()  # options -> (Summarizer, Lock)
+
+    def summarizer_for(self, args):
+        """Return the summarizer and its lock for parsed request arguments."""
+        error = check_summary_arguments(args)
+        if error is not None:
+            raise RequestError(400, error)
+        options = summarizer_options(args)
+        # Token counts stay in memory; the on-disk cache would be rewritten per request
+        options['cache_dir'] = None
+        key = repr(sorted(options.items()))
+        with self._lock:
+            item = self._summarizers.get(key)
+            if item is None:
+                try:
+                    item = (Summarizer(**options), threading.Lock())
+                except ValueError as e:
+                    raise RequestError(400, str(e)) from e
+                self._summarizers[key] = item
+                while len(self._summarizers) > MAX_SUMMARIZERS:
+                    self._summarizers.popitem(last=False)
+            self._summarizers.move_to_end(key)
+            return item
+
+    def prepare(self, body):
+        """Parse a summarize request body into ``(directory, summarizer, lock)``."""
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError as e:
+            raise RequestError(400, f"Invalid JSON: {e}") from e
+        argv = request.get('args') if isinstance(request, dict) else None
+        if not isinstance(argv, list) or not all(isinstance(arg, str) for arg in argv):
+            raise RequestError(400, 'Expected {"args": [DIRECTORY, OPTION...]}')
+        args = self._parser.parse_args(argv)
+        if not os.path.isdir(args.directory) and not is_archive(args.directory):
+            raise RequestError(404, f"Not a directory or archive: {args.directory}")
+        summarizer, lock = self.summarizer_for(args)
+        if args.rev is not None or args.diff is not None:
+            try:
+                resolve_revisions(args.directory, args.rev, args.diff)
+            except OSError as e:
+                raise RequestError(400, str(e)) from e
+        # The server's working directory means nothing to its clients
+        return os.path.abspath(args.directory), summarizer, lock
+
+    def iter_chunks(self, directory, summarizer, lock):
+        """Yield the summary of ``directory`` as UTF-8 chunks of about ``CHUNK_BYTES``."""
+        with lock:
+            if summarizer.revision is None and summarizer.diff is None:
+                entries = self.trees.scan(summarizer, directory)
+                file_index = self.sections
+            else:
+                # Both caches are validated against the working tree, not a revision
+                entries = file_index = None
+            pending, size = [], 0
+            for section in summarizer.iter_sections(directory, file_index=file_index,
+                                                    entries=entries):
+                data = section.text.encode('utf-8')
+                pending.append(data)
+                size += len(data)
+                if size >= CHUNK_BYTES:
+                    yield b''.join(pending)
+                    pending, size = [], 0
+            if pending:
+                yield b''.join(pending)
+
+    def stats(self):
+        with self._lock:
+            summarizers = len(self._summarizers)
+        return {'requests': self.requests, 'summarizers': summarizers,
+                'sections': self.sections.stats(), 'trees': self.trees.stats()}
+
+
+async def read_request(reader):
+    """Read an HTTP request; return ``(method, path, body)``."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.LimitOverrunError as e:
+        raise RequestError(413, "Request headers too large") from e
+    except asyncio.IncompleteReadError as e:
+        raise ConnectionError("Connection closed before the request was complete") from e
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, _version = lines[0].split(' ', 2)
+    except ValueError as e:
+        raise RequestError(400, "Malformed request line") from e
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError as e:
+        raise RequestError(400, "Invalid Content-Length") from e
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, urlsplit(target).path, body
+
+
+def _response_head(status, content_type, extra=()):
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+             f"Content-Type: {content_type}", "Connection: close", *extra]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_json(writer, status, data):
+    body = json.dumps(data).encode('utf-8')
+    writer.write(_response_head(status, 'application/json',
+                                [f"Content-Length: {len(body)}"]) + body)
+    await writer.drain()
+
+
+async def stream_summary(writer, server, directory, summarizer, lock):
+    """Run the summary on a worker thread and relay its chunks as they are produced."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(QUEUED_CHUNKS)
+    cancelled = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in server.iter_chunks(directory, summarizer, lock):
+                if cancelled.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+            item = done
+        except Exception as e:
+            logger.exception(f"Summary of {directory} failed")
+            item = e
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    producer = loop.run_in_executor(None, produce)
+    started = False
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                if not started:
+                    await send_json(writer, 500, {'error': str(item)})
+                return  # mid-stream: the missing final chunk tells the client
+            if not started:
+                writer.write(_response_head(200, 'text/markdown; charset=utf-8',
+                                            ["Transfer-Encoding: chunked"]))
+                started = True
+            writer.write(b'%x\r\n%s\r\n' % (len(item), item))
+            await writer.drain()
+        if not started:
+            writer.write(_response_head(200, 'text/markdown; charset=utf-8',
+                                        ["Transfer-Encoding: chunked"]))
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+    finally:
+        cancelled.set()
+        while not producer.done():
+            # Let a producer blocked on a full queue finish
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                await asyncio.sleep(0.01)
+        await producer
+
+
+async def handle_connection(server, reader, writer):
+    """Serve one request, then close the connection."""
+    try:
+        method, path, body = await read_request(reader)
+        server.requests += 1
+        if path == '/summarize':
+            if method != 'POST':
+                raise RequestError(405, "Use POST /summarize")
+            # Resolving revisions and building a summarizer (which may load
+            # a tokenizer) block, so they must not hold up other connections
+            loop = asyncio.get_running_loop()
+            directory, summarizer, lock = await loop.run_in_executor(None, server.prepare, body)
+            await stream_summary(writer, server, directory, summarizer, lock)
+        elif path == '/stats':
+            await send_json(writer, 200, server.stats())
+        else:
+            raise RequestError(404, f"No such endpoint: {path}")
+    except RequestError as e:
+        try:
+            await send_json(writer, e.status, {'error': str(e)})
+        except ConnectionError:
+            pass
+    except ConnectionError as e:
+        logger.debug(f"Client went away: {e}")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def start_server(server, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """
+    Start listening for ``server`` and return the ``asyncio.Server``.
+
+    With ``socket_path``, listen on that Unix socket (replacing a stale one)
+    instead of ``host``:``port``.
+    """
+    def handler(reader, writer):
+        return handle_connection(server, reader, writer)
+
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return await asyncio.start_unix_server(handler, socket_path, limit=MAX_HEADER_BYTES)
+    return await asyncio.start_server(handler, host, port, limit=MAX_HEADER_BYTES)
+
+
+async def _serve(server, host, port, socket_path):
+    listener = await start_server(server, host, port, socket_path)
+    address = socket_path or '{}:{}'.format(*listener.sockets[0].getsockname()[:2])
+    print(f"SummarizeGPT serving on {address}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def serve_main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='SummarizeGPT serve',
+        description='Serve summaries from a long-lived process with warm caches.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST,
+                        help=f'Address to listen on (default: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', type=str, default=None, metavar='PATH',
+                        help='Listen on a Unix socket at PATH instead of a TCP port')
+    parser.add_argument('--cache-bytes', type=int, default=DEFAULT_CACHE_BYTES, metavar='N',
+                        help='Memory for cached file sections (default: 256 MiB)')
+    parser.add_argument('--max-trees', type=int, default=DEFAULT_MAX_TREES, metavar='N',
+                        help=f'Number of scanned trees to keep (default: {DEFAULT_MAX_TREES})')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.verbose)
+    if args.socket is not None and not hasattr(asyncio, 'start_unix_server'):
+        logger.error("Unix sockets are not supported on this platform.")
+        sys.exit(1)
+        return
+    server = SummaryServer(cache_bytes=args.cache_bytes, max_trees=args.max_trees)
+    try:
+        asyncio.run(_serve(server, args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        logger.error(f"Cannot listen: {str(e)}")
+        sys.exit(1)
+    finally:
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
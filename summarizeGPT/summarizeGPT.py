@@ -1,12 +1,75 @@
 import argparse
 import os
 import sys
+import contextlib
+import functools
+import hashlib
+import io
+import json
 import logging
-import gitignore_parser
-import tiktoken
+import operator
+import sqlite3
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from .archive import ArchiveMember, is_archive, scan_archive
+from .filters import PRESETS, FileFilter, format_rejections, parse_time
+from .gitindex import list_tracked_files
+from .gitrev import GitBlob, resolve_revisions, scan_git_revision
+from .ignore import IgnoreMatcher, IgnoreRules, build_ignore_matcher
+from .instrument import Recorder
+from .minify import language_for, minify as minify_text
+from .sampling import read_sampled_text
+from .tokenizer import get_encoding
+
+# tiktoken (in .tokenizer), concurrent.futures, tracemalloc and the watch
+# module are imported where they are used: a short run that needs none of
+# them starts faster
 
 output_file = "Context_for_ChatGPT.md"
 
+# --shard-tokens writes Context_for_ChatGPT.part-001.md, part-002.md, ...
+SHARD_PREFIX = f"{os.path.splitext(output_file)[0]}.part-"
+
+# Extensions named in the line of a directory collapsed by --tree-collapse
+TREE_COLLAPSE_EXTENSIONS = 3
+
+# Scan entries read through their ``dir_entry`` instead of from disk
+VIRTUAL_FILE_TYPES = (ArchiveMember, GitBlob)
+
+# Soft cap on the size of files being read concurrently with --jobs
+MAX_IN_FLIGHT_BYTES = 64 * 1024 * 1024
+
+# Token budget packing (--max-tokens)
+PACK_STRATEGIES = ('order', 'smallest', 'knapsack')
+MIN_TRUNCATED_TOKENS = 64
+# Files listed by name in the trailer of a packed summary; the rest are counted
+OMITTED_LIST_MAX_FILES = 20
+
+# Persistent token counts and statistics
+TOKEN_CACHE_MAX_ENTRIES = 500000
+TOP_FILES_BY_TOKENS = 10
+
+# --dedup hashes files in chunks of this size
+HASH_CHUNK_BYTES = 1024 * 1024
+
+# Files modified this recently are not stored in the incremental index
+RACY_MTIME_NS = 2 * 1000 * 1000 * 1000
+# How long to wait for another process holding the index database's lock
+SQLITE_TIMEOUT_SECONDS = 30
+
+# Binary detection reads only this much of each file before decoding it
+SNIFF_BYTES = 8192
+BINARY_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'\xff\xd8\xff', b'II*\x00', b'MM\x00*',
+    b'%PDF-', b'PK\x03\x04', b'PK\x05\x06', b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00',
+    b'7z\xbc\xaf\x27\x1c', b'\x28\xb5\x2f\xfd', b'Rar!\x1a\x07', b'\x7fELF',
+    b'\xca\xfe\xba\xbe', b'\xcf\xfa\xed\xfe', b'\xce\xfa\xed\xfe', b'\x00asm',
+    b'SQLite format 3\x00', b'\x93NUMPY', b'\x89HDF\r\n\x1a\n', b'GGUF', b'OggS',
+    b'fLaC', b'ID3', b'RIFF', b'wOFF', b'wOF2',
+)
+
 # Setup logging
 logger = logging.getLogger('SummarizeGPT')
 
@@ -67,137 +130,2188 @@ def setup_logging(verbose):
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
+class Entry(namedtuple('Entry', ['path', 'name', 'depth', 'is_dir', 'ignored', 'dir_entry'])):
+    """
+    A single file or directory discovered by :func:`scan_directory`.
+
+    ``depth`` is the directory level the entry is listed under (root=1), so a
+    directory and the files directly inside it share the same depth.
+    """
+    __slots__ = ()
+
+    def stat(self):
+        """Return the stat result, served from the cached DirEntry when available."""
+        if self.dir_entry is not None:
+            return self.dir_entry.stat()
+        return os.stat(self.path)
+
+Section = namedtuple('Section', ['path', 'text', 'duplicate_of', 'minified'],
+                     defaults=(None, None))
+Section.__doc__ = """
+A fragment of the summary; ``path`` is set only for file sections,
+``duplicate_of`` only for the stubs of files identical to an earlier one,
+and ``minified`` only for minified file sections, as ``(language, text)``
+with the text the section would have had without minification.
+"""
+
+class TokenCache:
+    """
+    Token counts of rendered file sections, optionally persisted to disk.
+
+    Counts are keyed by a hash of the section text, which covers the file's
+    path (it is part of the section heading) and content as well as every
+    rendering option, and the cache file is per encoding. Unchanged files
+    therefore skip tokenization on the next run. The tokenizer itself is
+    loaded on first use, from ``tokenizer_cache`` if given (see
+    :func:`~summarizeGPT.tokenizer.get_encoding`).
+    """
+
+    def __init__(self, encoding_name="cl100k_base", cache_dir=None, tokenizer_cache=None):
+        self.encoding_name = encoding_name
+        self.tokenizer_cache = tokenizer_cache
+        self.path = None
+        self.hits = 0
+        self.misses = 0
+        self._encoding = None
+        self._counts = {}
+        self._used = {}
+        if cache_dir:
+            self.path = os.path.join(cache_dir, f"tokens-{encoding_name}.json")
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._counts = json.load(f)
+            except (OSError, ValueError, TypeError):
+                self._counts = {}
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, loaded on first access."""
+        if self._encoding is None:
+            self._encoding = load_encoding(self.encoding_name, self.tokenizer_cache)
+        return self._encoding
+
+    def count(self, text):
+        """Return the number of tokens in ``text``, computing it only on a cache miss."""
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+        tokens = self._used.get(key)
+        if tokens is None:
+            tokens = self._counts.get(key)
+            if tokens is None:
+                self.misses += 1
+                tokens = count_tokens(text, self.encoding)
+            else:
+                self.hits += 1
+            self._used[key] = tokens
+        else:
+            self.hits += 1
+        return tokens
+
+    def save(self):
+        """
+        Write the counts used in this run back to disk, newest last. The file
+        is read again first, so counts saved meanwhile by other processes
+        (such as the workers of a batch) are kept.
+        """
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                on_disk = json.load(f)
+            if isinstance(on_disk, dict):
+                self._counts = on_disk
+        except (OSError, ValueError):
+            pass
+        counts = {k: v for k, v in self._counts.items() if k not in self._used}
+        counts.update(self._used)
+        if len(counts) > TOKEN_CACHE_MAX_ENTRIES:
+            counts = dict(list(counts.items())[-TOKEN_CACHE_MAX_ENTRIES:])
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(counts, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save token cache {self.path}: {e}")
+        logger.info(f"Token cache: {self.hits} hits, {self.misses} misses")
+
+def default_cache_dir():
+    """Return the per-user cache directory (``$XDG_CACHE_HOME/summarizeGPT``)."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'summarizeGPT')
+
+class FileIndex:
+    """
+    On-disk index of rendered file sections for incremental re-runs.
+
+    Each file is stored with its stat signature (size and mtime), a hash of
+    its contents and its rendered section, keyed by path and rendering
+    options, in a SQLite database under the cache directory. A file whose
+    signature is unchanged is served from the index without being opened.
+    Sections are stored without their ``## <path>`` heading, which is
+    rebuilt from the path the file was reached by, since the same file can
+    be summarized from roots spelled differently (``.`` or an absolute path).
+    Files modified within the last ``RACY_MTIME_NS`` are not stored, since a
+    second write within the same mtime tick would go unnoticed.
+
+    Lookups and stores may come from worker threads, so the connection is
+    guarded by a lock. Stored sections are queued and written by
+    :meth:`close` in one short transaction, which also drops entries for
+    files that were removed; several processes (``batch`` workers) can
+    then share the database without holding its write lock for a whole run.
+    """
+
+    def __init__(self, cache_dir, root):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "index.sqlite3")
+        self.root = os.path.abspath(root)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._seen = set()
+        self._pending = []
+        self._db = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT_SECONDS,
+                                   check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            " root TEXT NOT NULL, path TEXT NOT NULL, options TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " content_hash TEXT, section TEXT,"
+            " PRIMARY KEY (path, options))"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sections)")}
+        if 'minified' not in columns:
+            # Indexes written before --minify existed
+            self._db.execute("ALTER TABLE sections ADD COLUMN minified TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sections_root ON sections (root)")
+        rows = self._db.execute(
+            "SELECT path, options, size, mtime_ns FROM sections WHERE root = ?", (self.root,))
+        self._signatures = {(path, options): (size, mtime_ns)
+                            for path, options, size, mtime_ns in rows}
+
+    def lookup(self, entry, options):
+        """
+        Return ``(True, section)`` if the entry is unchanged since it was
+        stored (``section`` is None for files that could not be read), or
+        ``(False, None)`` on a miss.
+        """
+        key = (os.path.abspath(entry.path), options)
+        try:
+            st = entry.stat()
+        except OSError:
+            return False, None
+        with self._lock:
+            self._seen.add(key)
+            if self._signatures.get(key) != (st.st_size, st.st_mtime_ns):
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            row = self._db.execute(
+                "SELECT section, minified FROM sections WHERE path = ? AND options = ?",
+                key).fetchone()
+        if row is None or row[0] is None:
+            return True, None
+        file_path = entry.path.replace("\\", "/")
+        heading = f"## {file_path}\n\n"
+        minified = None
+        if row[1] is not None:
+            language, original = json.loads(row[1])
+            minified = (language, heading + original)
+        return True, Section(file_path, heading + row[0], minified=minified)
+
+    def store(self, entry, options, contents, section):
+        """Record the rendered section of an entry after a miss."""
+        try:
+            st = entry.stat()
+        except OSError:
+            return
+        if time.time_ns() - st.st_mtime_ns < RACY_MTIME_NS:
+            return
+        content_hash = None
+        if contents is not None:
+            content_hash = hashlib.blake2b(contents.encode('utf-8'), digest_size=16).hexdigest()
+        text = minified = None
+        if section is not None:
+            heading = len(f"## {section.path}\n\n")
+            text = section.text[heading:]
+            if section.minified is not None:
+                language, original = section.minified
+                minified = json.dumps((language, original[heading:]))
+        key = (os.path.abspath(entry.path), options)
+        with self._lock:
+            self._pending.append((self.root, key[0], options, st.st_size, st.st_mtime_ns,
+                                  content_hash, text, minified))
+            self._seen.add(key)
+
+    def close(self):
+        """Write stored sections, forget files that were not seen in this run, and close."""
+        with self._lock:
+            stored = {(row[1], row[2]) for row in self._pending}
+            removed = [key for key in self._signatures
+                       if key not in self._seen and key not in stored]
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO sections (root, path, options, size, mtime_ns,"
+                    " content_hash, section, minified) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._pending)
+                self._db.executemany("DELETE FROM sections WHERE path = ? AND options = ?",
+                                     removed)
+            self._pending = []
+            self._db.close()
+        logger.info(f"File index: {self.hits} hits, {self.misses} misses, "
+                    f"{len(removed)} removed")
+
+class MemoryIndex:
+    """
+    In-memory index of rendered file sections for ``--watch``.
+
+    Sections stay valid until their path is passed to :meth:`invalidate`, so
+    unchanged files are not even stat'ed when the summary is regenerated.
+    Misses fall through to an optional :class:`FileIndex`, which also
+    receives every store.
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._sections = {}
+
+    def lookup(self, entry, options):
+        key = (os.path.abspath(entry.path), options)
+        with self._lock:
+            if key in self._sections:
+                return True, self._sections[key]
+        if self.fallback is None:
+            return False, None
+        hit, section = self.fallback.lookup(entry, options)
+        if hit:
+            with self._lock:
+                self._sections[key] = section
+        return hit, section
+
+    def store(self, entry, options, contents, section):
+        with self._lock:
+            self._sections[(os.path.abspath(entry.path), options)] = section
+        if self.fallback is not None:
+            self.fallback.store(entry, options, contents, section)
+
+    def invalidate(self, paths):
+        """Forget the sections of ``paths`` and of everything below them."""
+        paths = {os.path.abspath(path) for path in paths}
+        prefixes = tuple(path + os.sep for path in paths)
+        with self._lock:
+            for key in list(self._sections):
+                if key[0] in paths or key[0].startswith(prefixes):
+                    del self._sections[key]
+
+    def clear(self):
+        with self._lock:
+            self._sections.clear()
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+def scan_directory(directory, gitignore_file=None, max_depth=None, auto_gitignore=False,
+                   recorder=None):
+    """
+    Walk a directory tree once and record every entry together with its
+    gitignore decision.
+
+    The tree is listed with ``os.scandir`` in the same top-down order as
+    ``os.walk``: each directory is followed by its files and then by its
+    subdirectories, both sorted by name so the order does not depend on the
+    filesystem. Ignored directories are recorded but not descended into,
+    and ``.git`` directories are skipped entirely.
+
+    Args:
+        directory (str): The directory to scan
+        gitignore_file (str, optional): Path to a gitignore file to apply
+        max_depth (int, optional): Deepest directory level to list (root=1)
+        auto_gitignore (bool): Also apply every nested ``.gitignore`` as its
+            directory is entered, plus ``.git/info/exclude`` and the
+            ``.gitignore`` files above ``directory`` in its work tree
+        recorder (Recorder, optional): Times ignore matching as its own phase
+
+    Returns:
+        list[Entry]: The entries in traversal order
+    """
+    matcher = build_ignore_matcher(directory, gitignore_file, hierarchical=auto_gitignore)
+    gitignore = matcher
+    if matcher is not None and recorder is not None:
+        gitignore = recorder.timed('ignore', matcher)
+    return _walk_directory(directory, os.path.basename(directory), 1, None, matcher, gitignore,
+                           max_depth, auto_gitignore)
+
+def _walk_directory(path, name, depth, dir_entry, matcher, gitignore, max_depth, auto_gitignore):
+    # The entries of the tree below ``path``, listed at ``depth``, in the
+    # order described by scan_directory
+    entries = []
+    stack = [(path, name, depth, dir_entry)]
+    while stack:
+        path, name, depth, dir_entry = stack.pop()
+        if max_depth is not None and depth > max_depth:
+            continue
+        entries.append(Entry(path, name, depth, True, False, dir_entry))
+        listed, subdirs = _list_directory(path, depth, matcher, gitignore, auto_gitignore)
+        entries.extend(listed)
+        for child in reversed(subdirs):
+            stack.append((child.path, child.name, depth + 1, child))
+    return entries
+
+def _list_directory(path, depth, matcher, gitignore, auto_gitignore):
+    """
+    List one directory: return its file and ignored directory entries in name
+    order, and the DirEntries of the subdirectories to descend into.
+    """
+    try:
+        with os.scandir(path) as it:
+            children = sorted(it, key=operator.attrgetter('name'))
+    except OSError as e:
+        logger.debug(f"Skipping directory {path}: {e}")
+        return [], []
+
+    if auto_gitignore:
+        for child in children:
+            if child.name == '.gitignore':
+                matcher.add_file(child.path)
+
+    listed = []
+    subdirs = []
+    for child in children:
+        try:
+            is_dir = child.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            if child.name == '.git' or child.is_symlink():
+                continue
+            if gitignore and gitignore(child.path, True):
+                listed.append(Entry(child.path, child.name, depth + 1, True, True, child))
+                continue
+            subdirs.append(child)
+        else:
+            ignored = bool(gitignore and gitignore(child.path))
+            listed.append(Entry(child.path, child.name, depth, False, ignored, child))
+    return listed, subdirs
+
+def rescan_directories(entries, directories, matcher=None, max_depth=None,
+                       auto_gitignore=False):
+    """
+    Bring the listings of some directories in a :func:`scan_directory`
+    result up to date, for files and directories that were created, deleted
+    or renamed in them.
+
+    Each directory is listed again; its subdirectories that were already
+    listed keep their entries, and new ones are walked. The rest of the
+    tree is not touched.
+
+    Args:
+        entries (list[Entry]): The entries of the last scan
+        directories (iterable[str]): Absolute paths of the changed
+            directories; those not listed (ignored, too deep or inside a
+            directory that is walked anyway) are skipped
+        matcher (IgnoreMatcher, optional): The ignore rules of the tree,
+            with the nested ``.gitignore`` files already added
+        max_depth (int, optional): Deepest directory level to list (root=1)
+        auto_gitignore (bool): Add the ``.gitignore`` files of new
+            directories to ``matcher``
+
+    Returns:
+        list[Entry]: The updated entries
+    """
+    # Parents first, so a subdirectory is found where its parent put it
+    for directory in sorted(directories, key=lambda path: path.count(os.sep)):
+        position = next((i for i, entry in enumerate(entries)
+                         if entry.is_dir and not entry.ignored
+                         and os.path.abspath(entry.path) == directory), None)
+        if position is None:
+            continue
+        parent = entries[position]
+        prefix = os.path.join(parent.path, '')
+        end = position + 1
+        while end < len(entries) and entries[end].path.startswith(prefix):
+            end += 1
+        starts = [i for i in range(position + 1, end)
+                  if entries[i].is_dir and entries[i].depth == parent.depth + 1]
+        subtrees = {entries[start].name: entries[start:stop]
+                    for start, stop in zip(starts, starts[1:] + [end])}
+
+        listed, subdirs = _list_directory(parent.path, parent.depth, matcher, matcher,
+                                          auto_gitignore)
+        updated = [parent, *listed]
+        for child in subdirs:
+            subtree = subtrees.get(child.name)
+            if subtree is None or subtree[0].ignored:
+                subtree = _walk_directory(child.path, child.name, parent.depth + 1, child,
+                                          matcher, matcher, max_depth, auto_gitignore)
+            updated.extend(subtree)
+        entries = entries[:position] + updated + entries[end:]
+    return entries
+
+def scan_paths(directory, paths, gitignore_file=None, max_depth=None, auto_gitignore=False,
+               recorder=None, members=None):
+    """
+    Build the same entry list as :func:`scan_directory` from a list of file
+    paths instead of a directory walk.
+
+    Directories are derived from the paths, so nothing outside the listed
+    files is ever touched on disk, and their contents are sorted by name
+    whatever the order of ``paths``. Entries have no cached DirEntry and are
+    stat'ed lazily.
+
+    Args:
+        directory (str): The directory the paths are relative to
+        paths (iterable[str]): Relative file paths using ``/`` separators
+        gitignore_file (str, optional): Path to a gitignore file to apply
+        max_depth (int, optional): Deepest directory level to list (root=1)
+        auto_gitignore (bool): Also apply the ``.gitignore`` files among the
+            paths, as in :func:`scan_directory`
+        recorder (Recorder, optional): Times ignore matching as its own phase
+        members (dict, optional): The ``dir_entry`` of each path, for files
+            that are not on disk (see :mod:`summarizeGPT.gitrev`); their
+            ``.gitignore`` files are read through it, and ignore files on
+            disk other than ``gitignore_file`` are not applied
+
+    Returns:
+        list[Entry]: The entries in traversal order
+    """
+    paths = list(paths)
+    if members is None:
+        matcher = build_ignore_matcher(directory, gitignore_file, hierarchical=auto_gitignore)
+    else:
+        matcher = build_ignore_matcher(directory, gitignore_file)
+        if matcher is None and auto_gitignore:
+            matcher = IgnoreMatcher(directory)
+    if auto_gitignore:
+        for path in paths:
+            if path != '.gitignore' and not path.endswith('/.gitignore'):
+                continue
+            if members is None:
+                matcher.add_file(os.path.join(directory, path))
+            elif members[path].object_id is not None:
+                text = members[path].read().decode('utf-8', 'surrogateescape')
+                matcher.add_rules(IgnoreRules(text.splitlines(), source=path),
+                                  base=os.path.join(directory, os.path.dirname(path)))
+    gitignore = matcher
+    if matcher is not None and recorder is not None:
+        gitignore = recorder.timed('ignore', matcher)
+
+    tree = ({}, [])  # (subdirectories by name, (file name, path) pairs)
+    for path in paths:
+        *parts, name = path.split('/')
+        if max_depth is not None and len(parts) + 1 > max_depth:
+            continue
+        node = tree
+        for part in parts:
+            node = node[0].setdefault(part, ({}, []))
+        node[1].append((name, path))
+
+    entries = []
+    stack = [(directory, os.path.basename(directory), 1, tree)]
+    while stack:
+        path, name, depth, (subdirs, files) = stack.pop()
+        entries.append(Entry(path, name, depth, True, False, None))
+        for file, rel_path in sorted(files):
+            file_path = os.path.join(path, file)
+            ignored = bool(gitignore and gitignore(file_path))
+            member = None if members is None else members[rel_path]
+            entries.append(Entry(file_path, file, depth, False, ignored, member))
+        for subdir, node in sorted(subdirs.items(), reverse=True):
+            subdir_path = os.path.join(path, subdir)
+            if gitignore and gitignore(subdir_path, True):
+                entries.append(Entry(subdir_path, subdir, depth + 1, True, True, None))
+                continue
+            stack.append((subdir_path, subdir, depth + 1, node))
+    return entries
+
+def scan_git_tracked(directory, gitignore_file=None, max_depth=None, auto_gitignore=False,
+                     recorder=None):
+    """
+    List a git checkout from its index rather than by walking it.
+
+    Falls back to :func:`scan_directory` if ``directory`` is not inside a
+    git repository.
+    """
+    paths = list_tracked_files(directory)
+    if paths is None:
+        logger.warning(f"{directory} is not a git checkout; walking it instead.")
+        return scan_directory(directory, gitignore_file, max_depth=max_depth,
+                              auto_gitignore=auto_gitignore, recorder=recorder)
+    logger.info(f"Listed {len(paths)} tracked files from the git index")
+    return scan_paths(directory, paths, gitignore_file, max_depth=max_depth,
+                      auto_gitignore=auto_gitignore, recorder=recorder)
+
+class Summarizer:
+    """
+    A summarizer configuration, compiled once and reusable for any number of
+    directories.
+
+    The extension lists, presets and path, size and time rules become a
+    precompiled file filter (see :func:`compile_file_filter`), the tokenizer is loaded on first use
+    and kept along with its token cache, and compiled ignore files are
+    shared between runs. Auto-discovered ``.gitignore`` files are looked up
+    once per directory. An instance is meant to be reused from one thread
+    at a time; create one per thread for concurrent use.
+
+    Takes the keyword arguments of :func:`summarize_directory`; extensions
+    may be given with or without the leading dot. ``auto_gitignore`` also
+    discovers the nearest ``.gitignore`` when ``gitignore_file`` is not set.
+    ``cache_dir`` persists token counts between processes, and
+    ``tokenizer_cache`` is a directory of offline encoding files. With
+    ``count_tokens`` off, statistics carry no token count and the tokenizer
+    is never loaded.
+
+    ``revision`` summarizes a git commit instead of the working tree, and
+    ``diff`` (``BASE..HEAD`` or ``BASE...HEAD``) only the files changed in
+    that range, as their contents or, with ``diff_context``, as unified
+    diffs with that many lines of context (see :mod:`summarizeGPT.gitrev`).
+    ``tree_collapse`` shows directories with more entries than that as one
+    line in the tree view (see :func:`iter_tree_view`). ``presets`` and the
+    glob, regex, size and time rules are those of
+    :func:`compile_file_filter`. ``minify`` strips comments and layout from
+    the languages :mod:`summarizeGPT.minify` handles.
+
+    Raises:
+        ValueError: If ``show_docker`` and ``show_only_docker`` are both set
+            or combined with ``presets``, a preset or ``pack_strategy`` is
+            unknown, a regular expression is invalid, ``count_tokens`` is off
+            while a token limit is set, both ``revision`` and ``diff`` are
+            set, or ``diff_context`` is set without ``diff``
+    """
+
+    def __init__(self, gitignore_file=None, include_exts=None, exclude_exts=None,
+                 show_docker=False, show_only_docker=False, max_lines=None,
+                 tree_depth=None, file_depth=None, jobs=None, max_tokens=None,
+                 pack_strategy='order', encoding_name="cl100k_base", git_tracked=False,
+                 auto_gitignore=False, max_file_bytes=None, head=None, tail=None,
+                 max_tokens_per_file=None, dedup=False, cache_dir=None, count_tokens=True,
+                 tokenizer_cache=None, revision=None, diff=None, diff_context=None,
+                 tree_collapse=None, presets=None, include_globs=(), exclude_globs=(),
+                 include_regexes=(), exclude_regexes=(), min_size=None, max_size=None,
+                 newer_than=None, older_than=None, minify=False):
+        if not count_tokens and (max_tokens is not None or max_tokens_per_file is not None):
+            raise ValueError("Token limits need token counting")
+        if pack_strategy not in PACK_STRATEGIES:
+            raise ValueError(f"Unknown pack strategy: {pack_strategy}")
+        if revision is not None and diff is not None:
+            raise ValueError("revision and diff are mutually exclusive")
+        if diff_context is not None and diff is None:
+            raise ValueError("diff_context needs a diff range")
+        self.gitignore_file = gitignore_file
+        self.include_exts = _normalize_exts(include_exts)
+        self.exclude_exts = _normalize_exts(exclude_exts)
+        self.show_docker = show_docker
+        self.show_only_docker = show_only_docker
+        self.max_lines = max_lines
+        self.tree_depth = tree_depth
+        self.file_depth = file_depth
+        self.jobs = jobs
+        self.max_tokens = max_tokens
+        self.pack_strategy = pack_strategy
+        self.encoding_name = encoding_name
+        self.git_tracked = git_tracked
+        self.auto_gitignore = auto_gitignore
+        self.max_file_bytes = max_file_bytes
+        self.head = head
+        self.tail = tail
+        self.max_tokens_per_file = max_tokens_per_file
+        self.dedup = dedup
+        self.count_tokens = count_tokens
+        self.cache_dir = cache_dir
+        self.revision = revision
+        self.diff = diff
+        self.diff_context = diff_context
+        self.tree_collapse = tree_collapse
+        self.minify = minify
+        self.file_filter = compile_file_filter(self.include_exts, self.exclude_exts,
+                                               show_docker, show_only_docker, presets=presets,
+                                               include_globs=include_globs,
+                                               exclude_globs=exclude_globs,
+                                               include_regexes=include_regexes,
+                                               exclude_regexes=exclude_regexes,
+                                               min_size=min_size, max_size=max_size,
+                                               newer_than=newer_than, older_than=older_than)
+        self.token_cache = TokenCache(encoding_name, cache_dir if count_tokens else None,
+                                      tokenizer_cache)
+        self._gitignore_files = {}
+
+    def gitignore_for(self, directory):
+        """Return the explicit or auto-discovered ignore file used for ``directory``."""
+        if (self.gitignore_file or not self.auto_gitignore or is_archive(directory)
+                or self.revision is not None or self.diff is not None):
+            # The .gitignore files of an archive or revision are applied by its scan
+            return self.gitignore_file
+        key = os.path.abspath(directory)
+        if key not in self._gitignore_files:
+            gitignore_path = discover_gitignore(directory)
+            if gitignore_path:
+                logger.info(f"Using auto-discovered .gitignore: {gitignore_path}")
+            else:
+                logger.info("No .gitignore file found.")
+            self._gitignore_files[key] = gitignore_path
+        return self._gitignore_files[key]
+
+    def scan(self, directory, recorder=None):
+        """Return the entries of ``directory`` (see :func:`scan_entries`)."""
+        return scan_entries(directory.replace("\\", "/"), self.gitignore_for(directory),
+                            tree_depth=self.tree_depth, file_depth=self.file_depth,
+                            git_tracked=self.git_tracked,
+                            auto_gitignore=self.auto_gitignore, recorder=recorder,
+                            revision=self.revision, diff=self.diff,
+                            diff_context=self.diff_context)
+
+    def iter_sections(self, directory, file_index=None, recorder=None, entries=None):
+        """
+        Yield the summary of ``directory`` as :class:`Section` records (see
+        :func:`iter_summary_sections`).
+        """
+        return iter_summary_sections(directory, self.gitignore_for(directory),
+                                     show_docker=self.show_docker,
+                                     show_only_docker=self.show_only_docker,
+                                     max_lines=self.max_lines, tree_depth=self.tree_depth,
+                                     file_depth=self.file_depth, jobs=self.jobs,
+                                     max_tokens=self.max_tokens,
+                                     pack_strategy=self.pack_strategy,
+                                     encoding_name=self.encoding_name,
+                                     token_cache=self.token_cache, file_index=file_index,
+                                     git_tracked=self.git_tracked,
+                                     auto_gitignore=self.auto_gitignore,
+                                     max_file_bytes=self.max_file_bytes,
+                                     head=self.head, tail=self.tail,
+                                     max_tokens_per_file=self.max_tokens_per_file,
+                                     dedup=self.dedup,
+                                     recorder=recorder, entries=entries,
+                                     file_filter=self.file_filter, revision=self.revision,
+                                     diff=self.diff, diff_context=self.diff_context,
+                                     tree_collapse=self.tree_collapse, minify=self.minify)
+
+    def iter_summary(self, directory):
+        """Yield the markdown summary of ``directory`` as consecutive fragments."""
+        for section in self.iter_sections(directory):
+            yield section.text
+
+    def summarize(self, directory):
+        """Return the markdown summary of ``directory``."""
+        return ''.join(self.iter_summary(directory))
+
+    def stats(self, directory):
+        """
+        Return the statistics of the summary of ``directory`` without keeping
+        the summary (see :func:`new_summary_stats`).
+        """
+        stats = new_summary_stats(self.encoding_name)
+        for _ in self.with_stats(self.iter_sections(directory), stats):
+            pass
+        return stats
+
+    def with_stats(self, sections, stats, recorder=None):
+        """
+        Pass ``sections`` through :func:`iter_with_stats`, counting tokens
+        unless ``count_tokens`` is off.
+        """
+        token_cache = self.token_cache if self.count_tokens else None
+        return iter_with_stats(sections, stats, token_cache, recorder)
+
+def _normalize_exts(exts):
+    if exts is None:
+        return None
+    return frozenset(ext.lower() if ext.startswith('.') else f".{ext.lower()}" for ext in exts)
+
 def summarize_directory(directory, gitignore_file=None, include_exts=None, 
                        exclude_exts=None, show_docker=False, show_only_docker=False, 
-                       max_lines=None, tree_depth=None, file_depth=None):
+                       max_lines=None, tree_depth=None, file_depth=None, jobs=None,
+                       max_tokens=None, pack_strategy='order', encoding_name="cl100k_base",
+                       git_tracked=False, auto_gitignore=False, max_file_bytes=None,
+                       head=None, tail=None, max_tokens_per_file=None, dedup=False,
+                       recorder=None):
+    return ''.join(iter_summary(directory, gitignore_file, include_exts,
+                                exclude_exts, show_docker=show_docker,
+                                show_only_docker=show_only_docker,
+                                max_lines=max_lines, tree_depth=tree_depth,
+                                file_depth=file_depth, jobs=jobs,
+                                max_tokens=max_tokens, pack_strategy=pack_strategy,
+                                encoding_name=encoding_name, git_tracked=git_tracked,
+                                auto_gitignore=auto_gitignore,
+                                max_file_bytes=max_file_bytes, head=head, tail=tail,
+                                max_tokens_per_file=max_tokens_per_file,
+                                dedup=dedup, recorder=recorder))
+
+def iter_summary(directory, gitignore_file=None, include_exts=None,
+                 exclude_exts=None, show_docker=False, show_only_docker=False,
+                 max_lines=None, tree_depth=None, file_depth=None, jobs=None,
+                 max_tokens=None, pack_strategy='order', encoding_name="cl100k_base",
+                 git_tracked=False, auto_gitignore=False, max_file_bytes=None,
+                 head=None, tail=None, max_tokens_per_file=None, dedup=False,
+                 recorder=None):
+    """
+    Generate the markdown summary of a directory as a stream of fragments.
+
+    Takes the same arguments as :func:`summarize_directory`. Joining the
+    fragments gives exactly the document ``summarize_directory`` returns, but
+    only one file section is held in memory at a time.
+
+    When ``max_tokens`` is set, the header, tree view and file sections are
+    packed into that many tokens of ``encoding_name`` using ``pack_strategy``
+    (see :func:`pack_sections`), and a trailer lists the files that were
+    dropped or truncated.
+
+    With ``git_tracked``, files are enumerated from the git index (see
+    :func:`scan_git_tracked`) instead of walking the directory. With
+    ``auto_gitignore``, nested ``.gitignore`` files are honoured as well (see
+    :func:`scan_directory`).
+
+    Binary files, and files larger than ``max_file_bytes``, are listed with a
+    one-line placeholder instead of their contents. ``head`` and ``tail``
+    keep only the first and last lines of each file (``max_lines`` is
+    shorthand for ``head``), and ``max_tokens_per_file`` caps each file's
+    contents, keeping its beginning and end; see
+    :func:`~summarizeGPT.sampling.read_sampled_text`.
+
+    With ``dedup``, a file whose contents are identical to an earlier file's
+    is listed as a one-line stub naming that file (see
+    :func:`find_duplicates`).
+
+    A :class:`~summarizeGPT.instrument.Recorder` passed as ``recorder``
+    receives per-phase timings and per-file outcomes; call its ``finish``
+    method once the summary has been consumed.
+
+    Yields:
+        str: Consecutive markdown fragments of the summary
+    """
+    for section in iter_summary_sections(directory, gitignore_file, include_exts,
+                                         exclude_exts, show_docker=show_docker,
+                                         show_only_docker=show_only_docker,
+                                         max_lines=max_lines, tree_depth=tree_depth,
+                                         file_depth=file_depth, jobs=jobs,
+                                         max_tokens=max_tokens,
+                                         pack_strategy=pack_strategy,
+                                         encoding_name=encoding_name,
+                                         git_tracked=git_tracked,
+                                         auto_gitignore=auto_gitignore,
+                                         max_file_bytes=max_file_bytes,
+                                         head=head, tail=tail,
+                                         max_tokens_per_file=max_tokens_per_file,
+                                         dedup=dedup, recorder=recorder):
+        yield section.text
+
+def iter_summary_sections(directory, gitignore_file=None, include_exts=None,
+                          exclude_exts=None, show_docker=False, show_only_docker=False,
+                          max_lines=None, tree_depth=None, file_depth=None, jobs=None,
+                          max_tokens=None, pack_strategy='order',
+                          encoding_name="cl100k_base", token_cache=None,
+                          file_index=None, git_tracked=False, auto_gitignore=False,
+                          max_file_bytes=None, head=None, tail=None, max_tokens_per_file=None,
+                          dedup=False, recorder=None, entries=None, file_filter=None,
+                          revision=None, diff=None, diff_context=None, tree_collapse=None,
+                          minify=False):
+    """
+    Like :func:`iter_summary`, but yield :class:`Section` records so callers
+    can tell file sections (which carry their path) from the header, tree
+    view and trailer. ``token_cache`` is used to size sections for
+    ``max_tokens``, and ``file_index`` to reuse sections of unchanged files.
+    ``entries`` from an earlier :func:`scan_entries` call skip the scan, and
+    a ``file_filter`` from :func:`compile_file_filter` replaces the extension
+    and docker arguments. ``revision``, ``diff`` and ``diff_context`` are
+    passed to :func:`scan_entries`, ``tree_collapse`` to
+    :func:`iter_tree_view` as ``collapse``, and ``minify`` to
+    :func:`render_file_section`.
+    """
     directory = directory.replace("\\", "/")
-    prompt_md = f"# Summary of directory: {directory}\n\n"
-    tree_view = get_tree_view(directory, gitignore_file=gitignore_file, max_depth=tree_depth)
-    prompt_md += "```\n" + tree_view + "\n```\n\n"
-    file_contents = get_file_contents(directory, gitignore_file, include_exts, 
-                                    exclude_exts, show_docker=show_docker,
-                                    show_only_docker=show_only_docker, 
-                                    max_lines=max_lines, max_depth=file_depth)
-    prompt_md += file_contents
-    return prompt_md
-
-def get_tree_view(directory, gitignore_file=None, max_depth=None):
-    tree_view = ""
-    if gitignore_file:
-        gitignore = gitignore_parser.parse_gitignore(gitignore_file)
+    if entries is None:
+        entries = scan_entries(directory, gitignore_file, tree_depth=tree_depth,
+                               file_depth=file_depth, git_tracked=git_tracked,
+                               auto_gitignore=auto_gitignore, recorder=recorder,
+                               revision=revision, diff=diff, diff_context=diff_context)
+
+    if token_cache is None and (max_tokens is not None or max_tokens_per_file is not None):
+        token_cache = TokenCache(encoding_name)
+    header = f"# Summary of directory: {directory}\n\n"
+    tree_view = iter_tree_view(directory, max_depth=tree_depth, entries=entries,
+                               collapse=tree_collapse)
+    if max_tokens is None:
+        yield Section(None, header)
+        yield Section(None, "```\n")
+        for line in tree_view:
+            yield Section(None, line)
+        yield Section(None, "\n```\n\n")
+        yield from iter_file_sections(directory, None, include_exts,
+                                      exclude_exts, show_docker=show_docker,
+                                      show_only_docker=show_only_docker,
+                                      max_lines=max_lines, max_depth=file_depth,
+                                      entries=entries, jobs=jobs,
+                                      file_index=file_index,
+                                      max_file_bytes=max_file_bytes,
+                                      head=head, tail=tail,
+                                      max_tokens_per_file=max_tokens_per_file,
+                                      dedup=dedup, token_cache=token_cache,
+                                      recorder=recorder, file_filter=file_filter,
+                                      minify=minify)
+        return
+
+    preamble = [header, "```\n", *tree_view, "\n```\n\n"]
+    preamble_tokens = count_tokens(''.join(preamble), token_cache.encoding)
+    budget = max_tokens - preamble_tokens
+    if budget <= 0:
+        logger.warning(f"The header and tree view alone take {preamble_tokens} tokens, more "
+                       f"than the {max_tokens}-token budget; no file contents fit")
+    for fragment in preamble:
+        yield Section(None, fragment)
+    selected = list(select_files(entries, include_exts, exclude_exts,
+                                 show_docker=show_docker,
+                                 show_only_docker=show_only_docker,
+                                 max_depth=file_depth, file_filter=file_filter,
+                                 recorder=recorder))
+    yield from iter_packed_file_sections(selected, budget, token_cache,
+                                         strategy=pack_strategy,
+                                         max_lines=max_lines, jobs=jobs,
+                                         file_index=file_index,
+                                         max_file_bytes=max_file_bytes,
+                                         head=head, tail=tail,
+                                         max_tokens_per_file=max_tokens_per_file,
+                                         dedup=dedup, recorder=recorder, minify=minify)
+
+def scan_entries(directory, gitignore_file=None, tree_depth=None, file_depth=None,
+                 git_tracked=False, auto_gitignore=False, recorder=None, revision=None,
+                 diff=None, diff_context=None):
+    """
+    Scan the entries needed for a summary with the given depths, walking the
+    directory or reading the git index (see :func:`scan_directory` and
+    :func:`scan_git_tracked`), or listing the members of a tar or zip
+    archive (see :func:`~summarizeGPT.archive.scan_archive`). With a git
+    ``revision`` or ``diff`` range, the files of that revision are listed
+    instead (see :func:`~summarizeGPT.gitrev.scan_git_revision`).
+    """
+    if tree_depth is None or file_depth is None:
+        scan_depth = None
+    else:
+        scan_depth = max(tree_depth, file_depth)
+    if revision is not None or diff is not None:
+        scan = functools.partial(scan_git_revision, revision=revision, diff=diff,
+                                 context=diff_context)
+    elif is_archive(directory):
+        if git_tracked:
+            logger.info("Ignoring --git-tracked for an archive.")
+        scan = scan_archive
     else:
-        gitignore = None
+        scan = scan_git_tracked if git_tracked else scan_directory
+    if recorder is None:
+        return scan(directory, gitignore_file, max_depth=scan_depth,
+                    auto_gitignore=auto_gitignore)
+    with recorder.phase('scan'):
+        entries = scan(directory, gitignore_file, max_depth=scan_depth,
+                       auto_gitignore=auto_gitignore, recorder=recorder)
+    recorder.record_scan(entries)
+    return entries
 
-    for root, dirs, files in os.walk(directory):
-        if '.git' in root:
+def get_tree_view(directory, gitignore_file=None, max_depth=None, entries=None, collapse=None):
+    return ''.join(iter_tree_view(directory, gitignore_file, max_depth=max_depth,
+                                  entries=entries, collapse=collapse))
+
+def iter_tree_view(directory, gitignore_file=None, max_depth=None, entries=None, collapse=None):
+    """
+    Yield the lines of the tree view of ``directory``.
+
+    With ``collapse``, a directory (other than the root) with more than that
+    many entries is shown as a single line giving the number and total size
+    of the files below it and their most common extensions (see
+    :func:`describe_subtree`). The counts come from the scanned ``entries``,
+    so the tree is not walked again.
+    """
+    if entries is None:
+        entries = scan_directory(directory, gitignore_file, max_depth=max_depth)
+    if collapse is not None:
+        child_counts = count_children(entries)
+
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if entry.ignored:
             continue
-            
-        level = root.replace(directory, '').count(os.sep) + 1  # +1 because root is level 1
-        
         # Skip if we've exceeded the maximum depth
-        if max_depth is not None and level > max_depth:
-            dirs[:] = []  # Clear dirs to prevent further recursion
+        if max_depth is not None and entry.depth > max_depth:
             continue
-            
-        if gitignore:
-            dirs[:] = [d for d in dirs if not gitignore(os.path.join(root, d))]
-            files = [f for f in files if not gitignore(os.path.join(root, f))]
-            
-        indent = ' ' * 4 * (level - 1)  # Adjust indent because level starts at 1
-        tree_view += f"{indent}{os.path.basename(root)}/\n"
-        sub_indent = ' ' * 4 * level
-        for file in files:
-            if file == output_file:
+        if entry.is_dir:
+            indent = ' ' * 4 * (entry.depth - 1)  # Adjust indent because level starts at 1
+            if collapse is not None and entry.depth > 1 and child_counts[entry.path] > collapse:
+                # The directory's subtree runs up to the next directory at its level or above
+                end = i
+                while end < len(entries) and not (entries[end].is_dir
+                                                  and entries[end].depth <= entry.depth):
+                    end += 1
+                yield f"{indent}{entry.name}/ ({describe_subtree(entries[i:end])})\n"
+                i = end
                 continue
-            tree_view += f"{sub_indent}{file}\n"
-    return tree_view
+            yield f"{indent}{entry.name}/\n"
+        elif entry.name != output_file:
+            sub_indent = ' ' * 4 * entry.depth
+            yield f"{sub_indent}{entry.name}{_change_marker(entry)}\n"
+
+def count_children(entries):
+    """
+    Return the number of files and subdirectories directly in each listed
+    directory, by path, leaving out ignored entries.
+    """
+    counts = {}
+    open_dirs = [None]  # open_dirs[depth] is the directory listed at that depth
+    for entry in entries:
+        if entry.ignored:
+            continue
+        if entry.is_dir:
+            del open_dirs[entry.depth:]
+            if entry.depth > 1:
+                counts[open_dirs[-1]] += 1
+            open_dirs.append(entry.path)
+            counts[entry.path] = 0
+        else:
+            # A file is listed at the depth of the directory containing it
+            counts[open_dirs[entry.depth]] += 1
+    return counts
+
+def describe_subtree(entries):
+    """
+    Summarize the files among ``entries`` in one phrase, e.g.
+    ``81234 files, 1.2 GiB: .json 97%, .csv 2%, .md <1%``.
+    """
+    files = 0
+    total = 0
+    extensions = Counter()
+    for entry in entries:
+        if entry.is_dir or entry.ignored or entry.name == output_file:
+            continue
+        files += 1
+        total += _file_size(entry)
+        extensions[os.path.splitext(entry.name)[1].lower() or 'no extension'] += 1
+    if not files:
+        return "0 files"
+    shares = []
+    for ext, count in extensions.most_common(TREE_COLLAPSE_EXTENSIONS):
+        percent = round(100 * count / files)
+        shares.append(f"{ext} {percent}%" if percent else f"{ext} <1%")
+    return f"{files} {'file' if files == 1 else 'files'}, {format_size(total)}: {', '.join(shares)}"
+
+def _change_marker(entry):
+    """Return `` [M]`` (or ``A``, ``D``, ``T``) for files changed in a ``--diff`` range."""
+    if isinstance(entry.dir_entry, GitBlob) and entry.dir_entry.status:
+        return f" [{entry.dir_entry.status}]"
+    return ""
 
 def get_file_contents(directory, gitignore_file=None, include_exts=None, 
                      exclude_exts=None, show_docker=False, show_only_docker=False, 
-                     max_lines=None, max_depth=None):
-    file_contents = ""
-    excluded_files = ['docker', 'Dockerfile']
-    if gitignore_file:
-        gitignore = gitignore_parser.parse_gitignore(gitignore_file)
+                     max_lines=None, max_depth=None, entries=None, jobs=None,
+                     max_file_bytes=None, head=None, tail=None, max_tokens_per_file=None,
+                     dedup=False, recorder=None):
+    return ''.join(iter_file_contents(directory, gitignore_file, include_exts,
+                                      exclude_exts, show_docker=show_docker,
+                                      show_only_docker=show_only_docker,
+                                      max_lines=max_lines, max_depth=max_depth,
+                                      entries=entries, jobs=jobs,
+                                      max_file_bytes=max_file_bytes, head=head,
+                                      tail=tail, max_tokens_per_file=max_tokens_per_file,
+                                      dedup=dedup, recorder=recorder))
+
+def iter_file_contents(directory, gitignore_file=None, include_exts=None,
+                       exclude_exts=None, show_docker=False, show_only_docker=False,
+                       max_lines=None, max_depth=None, entries=None, jobs=None,
+                       max_file_bytes=None, head=None, tail=None, max_tokens_per_file=None,
+                       dedup=False, recorder=None):
+    for section in iter_file_sections(directory, gitignore_file, include_exts,
+                                      exclude_exts, show_docker=show_docker,
+                                      show_only_docker=show_only_docker,
+                                      max_lines=max_lines, max_depth=max_depth,
+                                      entries=entries, jobs=jobs,
+                                      max_file_bytes=max_file_bytes, head=head,
+                                      tail=tail, max_tokens_per_file=max_tokens_per_file,
+                                      dedup=dedup, recorder=recorder):
+        yield section.text
+
+def iter_file_sections(directory, gitignore_file=None, include_exts=None,
+                       exclude_exts=None, show_docker=False, show_only_docker=False,
+                       max_lines=None, max_depth=None, entries=None, jobs=None,
+                       file_index=None, max_file_bytes=None, head=None, tail=None,
+                       max_tokens_per_file=None, dedup=False, token_cache=None, recorder=None,
+                       file_filter=None, minify=False):
+    if entries is None:
+        entries = scan_directory(directory, gitignore_file, max_depth=max_depth,
+                                 recorder=recorder)
+        if recorder is not None:
+            recorder.record_scan(entries)
+
+    selected = select_files(entries, include_exts, exclude_exts,
+                            show_docker=show_docker,
+                            show_only_docker=show_only_docker,
+                            max_depth=max_depth, file_filter=file_filter,
+                            recorder=recorder)
+    if token_cache is None and max_tokens_per_file is not None:
+        token_cache = TokenCache()
+    render = functools.partial(render_file_section, max_lines=max_lines,
+                               file_index=file_index, max_file_bytes=max_file_bytes,
+                               head=head, tail=tail,
+                               max_tokens_per_file=max_tokens_per_file,
+                               token_cache=token_cache, recorder=recorder, minify=minify)
+    if dedup:
+        selected = list(selected)
+        with _phase(recorder, 'dedup'):
+            duplicates = find_duplicates(selected, max_file_bytes, jobs)
+        render = _render_duplicates(render, duplicates, recorder)
+        prefetch_archive([entry for entry in selected if entry.path not in duplicates],
+                         max_file_bytes)
     else:
-        gitignore = None
+        selected = list(selected)
+        prefetch_archive(selected, max_file_bytes)
+    if jobs is not None and jobs > 1:
+        sections = iter_parallel(render, selected, jobs)
+    else:
+        sections = map(render, selected)
+    for section in sections:
+        if section is not None:
+            yield section
+
+def compile_file_filter(include_exts=None, exclude_exts=None, show_docker=False,
+                        show_only_docker=False, presets=None, include_globs=(),
+                        exclude_globs=(), include_regexes=(), exclude_regexes=(),
+                        min_size=None, max_size=None, newer_than=None, older_than=None):
+    """
+    Return the compiled filter telling whether a file belongs in the summary.
 
-    for root, _, files in os.walk(directory):
-        if '.git' in root:
+    The extension lists become frozensets and the name and path rules one
+    compiled pattern, once instead of on every file (see
+    :class:`~summarizeGPT.filters.FileFilter`).
+
+    Args:
+        include_exts (iterable[str], optional): Keep only these extensions
+            (with the leading dot, in lower case)
+        exclude_exts (iterable[str], optional): Drop these extensions
+        show_docker (bool): Keep docker files (the ``all`` preset)
+        show_only_docker (bool): Keep only docker files and requirements.txt
+            (the ``docker-only`` preset)
+        presets (iterable[str], optional): Names of
+            :data:`~summarizeGPT.filters.PRESETS` to apply instead of
+            ``default``
+        include_globs, exclude_globs (iterable[str]): Path globs a file must
+            match one of, or must match none of
+        include_regexes, exclude_regexes (iterable[str]): The same as
+            regular expressions searched for in the relative path
+        min_size, max_size (int, optional): Size bounds in bytes
+        newer_than, older_than (float, optional): Modification time bounds
+            in seconds since the epoch
+
+    Returns:
+        FileFilter: ``file_filter(entry, rel_path, rejected=None)`` returning
+        True for files to include
+
+    Raises:
+        ValueError: If the docker options are combined with each other or
+            with ``presets``, a preset is unknown or a regular expression
+            is invalid
+    """
+    if show_docker or show_only_docker:
+        if show_docker and show_only_docker:
+            raise ValueError("show_docker and show_only_docker are mutually exclusive")
+        if presets:
+            raise ValueError("The docker options cannot be combined with presets")
+        presets = ['all' if show_docker else 'docker-only']
+    return FileFilter(include_exts, exclude_exts, presets=presets or ['default'],
+                      include_globs=include_globs, exclude_globs=exclude_globs,
+                      include_regexes=include_regexes, exclude_regexes=exclude_regexes,
+                      min_size=min_size, max_size=max_size,
+                      newer_than=newer_than, older_than=older_than)
+
+def select_files(entries, include_exts=None, exclude_exts=None, show_docker=False,
+                 show_only_docker=False, max_depth=None, file_filter=None, recorder=None):
+    """
+    Yield the file entries whose contents belong in the summary, in traversal
+    order. A ``file_filter`` from :func:`compile_file_filter` replaces the
+    extension and docker arguments. Files are matched by their path relative
+    to the first entry (the scanned root), and the number of files each
+    rule rejected is logged and passed to the ``recorder``.
+    """
+    if file_filter is None:
+        file_filter = compile_file_filter(include_exts, exclude_exts, show_docker,
+                                          show_only_docker)
+    root_length = len(entries[0].path) + 1 if entries else 0
+    rejected = Counter()
+    for entry in entries:
+        if entry.is_dir or entry.ignored:
             continue
-        level = root.replace(directory, '').count(os.sep) + 1  # +1 because root is level 1
         # Skip if we've exceeded the maximum depth
-        if max_depth is not None and level > max_depth:
+        if max_depth is not None and entry.depth > max_depth:
             continue
-        if gitignore:
-            files = [f for f in files if not gitignore(os.path.join(root, f))]
-        for file in files:
-            _, ext = os.path.splitext(file)
-            ext = ext.lower()  # Make the check case-insensitive
-            if include_exts is not None and ext not in include_exts:
-                continue
-            if exclude_exts is not None and ext in exclude_exts:
-                continue
-            if not show_docker and not show_only_docker:
-                if file.lower().endswith(('.env', 'license', 'gitignore', 'setup.py', '__init__.py', 'test_summarize_gpt.py')) or any(substring in file.lower() for substring in excluded_files):
-                    continue
-            elif show_only_docker:
-                if not any(substring in file.lower() for substring in ['docker', 'Dockerfile', 'requirements.txt']):
-                    continue
+        if isinstance(entry.dir_entry, GitBlob) and not entry.dir_entry.selected:
+            continue
+        if entry.name == output_file or entry.name.startswith(SHARD_PREFIX):
+            continue
+        if file_filter(entry, entry.path[root_length:], rejected):
+            yield entry
+    if rejected:
+        logger.info(f"Filtered out {sum(rejected.values())} files: {format_rejections(rejected)}")
+        if recorder is not None:
+            recorder.record_filters(rejected)
 
-            if file == output_file:
-                continue
-            file_path = os.path.join(root, file).replace("\\", "/")
+def render_file_section(entry, max_lines=None, file_index=None, max_file_bytes=None,
+                        head=None, tail=None, max_tokens_per_file=None, token_cache=None,
+                        recorder=None, minify=False):
+    """
+    Read a file and format it as a markdown section.
+
+    Binary files and files over ``max_file_bytes`` are not read; they get a
+    one-line placeholder instead (see :func:`sniff_file`).
+
+    Args:
+        entry (Entry): The file to render
+        max_lines (int, optional): Maximum number of lines to keep
+        file_index (FileIndex, optional): Reuse the stored section when the
+            file is unchanged since the last run, and store fresh renders
+        max_file_bytes (int, optional): Size above which files are skipped
+        head (int, optional): Number of leading lines to keep
+        tail (int, optional): Number of trailing lines to keep
+        max_tokens_per_file (int, optional): Maximum number of content tokens
+        token_cache (TokenCache, optional): Provides the tokenizer for
+            ``max_tokens_per_file``
+        recorder (Recorder, optional): Receives the file's outcome and the
+            time spent reading and formatting it
+        minify (bool): Strip the comments and layout of languages that
+            :mod:`summarizeGPT.minify` handles
+
+    Returns:
+        Section or None: The section, or None if the file could not be read
+    """
+    encoding = None
+    encoding_name = None
+    if max_tokens_per_file is not None:
+        encoding = token_cache.encoding
+        encoding_name = token_cache.encoding_name
+    options = repr((max_lines, max_file_bytes, head, tail, max_tokens_per_file, encoding_name,
+                    minify))
+    if file_index is not None:
+        hit, section = file_index.lookup(entry, options)
+        if hit:
+            if recorder is not None:
+                recorder.record_file(entry.path, 'cached', _file_size(entry))
+            return section
+    with _phase(recorder, 'read'):
+        skipped = sniff_file(entry, max_file_bytes)
+        contents = None
+        if skipped is None:
+            contents = read_file_text(entry, max_lines=max_lines, head=head, tail=tail,
+                                      max_tokens=max_tokens_per_file, encoding=encoding)
+    with _phase(recorder, 'render'):
+        if skipped is not None:
+            section = format_skipped_section(entry, *skipped)
+        else:
+            section = None if contents is None else format_file_section(entry, contents, minify)
+    if file_index is not None:
+        file_index.store(entry, options, contents, section)
+    if recorder is not None:
+        if skipped is not None:
+            recorder.record_file(entry.path, 'skipped', skipped[1], reason=skipped[0])
+        elif contents is None:
+            recorder.record_file(entry.path, 'unreadable', _file_size(entry))
+        else:
+            recorder.record_file(entry.path, 'emitted', _file_size(entry),
+                                 len(contents.encode('utf-8')))
+    return section
+
+def _phase(recorder, name):
+    """Time a block as phase ``name`` of ``recorder``, if there is one."""
+    return recorder.phase(name) if recorder is not None else contextlib.nullcontext()
+
+def _file_size(entry):
+    try:
+        return entry.stat().st_size
+    except OSError:
+        return 0
+
+def open_entry(entry, limit=None):
+    """
+    Open a file entry for reading bytes: from disk, or through its
+    ``dir_entry`` for archive members and git blobs (see
+    ``VIRTUAL_FILE_TYPES``), of which at most ``limit`` bytes are read.
+    """
+    if isinstance(entry.dir_entry, VIRTUAL_FILE_TYPES):
+        return entry.dir_entry.open(limit)
+    return open(entry.path, "rb")
+
+def prefetch_archive(entries, max_file_bytes=None):
+    """
+    Tell the archive that ``entries`` are about to be read in this order, so
+    a compressed tar can read them in forward passes (see
+    :meth:`~summarizeGPT.archive.Archive.prefetch`). Does nothing for files
+    on disk.
+    """
+    if entries and isinstance(entries[0].dir_entry, ArchiveMember):
+        entries[0].dir_entry.archive.prefetch([entry.dir_entry for entry in entries],
+                                              max_file_bytes)
+
+def sniff_file(entry, max_file_bytes=None):
+    """
+    Decide from its size and first ``SNIFF_BYTES`` whether a file is worth
+    decoding, without reading the rest of it.
+
+    Args:
+        entry (Entry): The file to check
+        max_file_bytes (int, optional): Size above which the file is skipped
+
+    Returns:
+        tuple or None: ``(reason, size)`` if the file should be skipped,
+        otherwise None (including when it cannot be opened, so the read
+        reports the error)
+    """
+    try:
+        size = entry.stat().st_size
+    except OSError:
+        return None
+    if max_file_bytes is not None and size > max_file_bytes:
+        return "larger than --max-file-bytes", size
+    try:
+        with open_entry(entry, SNIFF_BYTES) as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    if not isinstance(head, bytes):
+        return None
+    if b'\x00' in head or head.startswith(BINARY_SIGNATURES):
+        return "binary file", size
+    return None
+
+def format_size(num_bytes):
+    """Format a byte count for humans, e.g. ``1.5 MiB``."""
+    size = float(num_bytes)
+    for unit in ('bytes', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            break
+        size /= 1024
+    if unit == 'bytes':
+        return f"{num_bytes} bytes"
+    return f"{size:.1f} {unit}"
+
+def format_skipped_section(entry, reason, size):
+    file_path = entry.path.replace("\\", "/")
+    logger.info(f"Skipping file {file_path}: {reason} ({size} bytes)")
+    return Section(file_path, f"## {file_path}\n\n[Skipped: {reason}, {format_size(size)}]\n\n")
+
+def read_file_text(entry, max_lines=None, head=None, tail=None, max_tokens=None,
+                   encoding=None):
+    """
+    Return a file's text, or None (with a warning) if it cannot be read as UTF-8.
+
+    When any limit is given, only the lines and bytes that are kept are read
+    and the omitted part is marked (see :func:`read_sampled_text`);
+    ``max_lines`` is used as ``head`` when neither ``head`` nor ``tail`` is set.
+    """
+    file_path = entry.path.replace("\\", "/")
+    member = entry.dir_entry if isinstance(entry.dir_entry, VIRTUAL_FILE_TYPES) else None
+    if head is None and tail is None:
+        head = max_lines
+    try:
+        if head is not None or tail is not None or max_tokens is not None:
+            return read_sampled_text(file_path, head=head, tail=tail,
+                                     max_tokens=max_tokens, encoding=encoding,
+                                     fileobj=None if member is None else member.open())
+        if member is not None:
+            with io.TextIOWrapper(member.open(), encoding="utf-8") as f:
+                return f.read()
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except UnicodeDecodeError:
+        logger.warning(f"Skipping file {file_path}: unable to decode with UTF-8 encoding.")
+    except OSError as e:
+        logger.warning(f"Skipping file {file_path}: {e}")
+    return None
+
+def format_file_section(entry, contents, minify=False):
+    """
+    Format a file's contents as a markdown section. With ``minify``, files
+    in a language :mod:`summarizeGPT.minify` handles are minified, and the
+    section keeps the text it would have had otherwise for the statistics.
+    """
+    file_path = entry.path.replace("\\", "/")
+    section = Section(file_path, f"## {file_path}\n\n```\n{remove_empty_lines(contents)}\n```\n\n")
+    language = language_for(entry.name) if minify else None
+    if language is None:
+        return section
+    minified = remove_empty_lines(minify_text(contents, language))
+    return Section(file_path, f"## {file_path}\n\n```\n{minified}\n```\n\n",
+                   minified=(language, section.text))
+
+def format_duplicate_section(entry, original):
+    file_path = entry.path.replace("\\", "/")
+    return Section(file_path, f"## {file_path}\n\n[Identical to {original}]\n\n", original)
+
+def _content_hash(entry):
+    blob = entry.dir_entry
+    if isinstance(blob, GitBlob) and blob.context is None and blob.object_id is not None:
+        # A blob's id already names its contents, so it need not be read
+        return bytes.fromhex(blob.object_id)
+    try:
+        digest = hashlib.blake2b(digest_size=16)
+        with open_entry(entry) as f:
+            for chunk in iter(functools.partial(f.read, HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+        return digest.digest()
+    except OSError:
+        return None
+
+def find_duplicates(entries, max_file_bytes=None, jobs=None):
+    """
+    Find files whose contents are identical to an earlier file's.
+
+    Files are bucketed by size first, so only files that share their size
+    with another are read and hashed (BLAKE2b). Empty files, and files over
+    ``max_file_bytes`` (which only get a placeholder), are left alone.
+
+    Args:
+        entries (list[Entry]): The files, in output order
+        max_file_bytes (int, optional): Size above which files are skipped
+        jobs (int, optional): Number of threads hashing files
+
+    Returns:
+        dict: Path of each duplicate -> path of the first file with the same
+        contents (with forward slashes, as in the summary)
+    """
+    by_size = {}
+    for entry in entries:
+        size = _file_size(entry)
+        if size and (max_file_bytes is None or size <= max_file_bytes):
+            by_size.setdefault(size, []).append(entry)
+    candidates = [entry for group in by_size.values() if len(group) > 1 for entry in group]
+    if not candidates:
+        return {}
+    if jobs is not None and jobs > 1:
+        digests = list(iter_parallel(_content_hash, candidates, jobs))
+    else:
+        digests = list(map(_content_hash, candidates))
+    first = {}
+    duplicates = {}
+    # Each size group is in output order, so the first file seen is the original
+    for entry, digest in zip(candidates, digests):
+        if digest is None:
+            continue
+        original = first.setdefault((_file_size(entry), digest), entry)
+        if original is not entry:
+            duplicates[entry.path] = original.path.replace("\\", "/")
+    logger.info(f"Found {len(duplicates)} duplicate files among {len(candidates)} "
+                f"files sharing a size")
+    return duplicates
+
+def _render_duplicates(render, duplicates, recorder=None):
+    """Wrap ``render`` so files in ``duplicates`` get a stub instead of their contents."""
+    if not duplicates:
+        return render
+
+    def render_or_stub(entry):
+        original = duplicates.get(entry.path)
+        if original is None:
+            return render(entry)
+        if recorder is not None:
+            recorder.record_file(entry.path, 'duplicate', _file_size(entry))
+        return format_duplicate_section(entry, original)
+
+    return render_or_stub
+
+def iter_parallel(render, entries, jobs, max_in_flight_bytes=MAX_IN_FLIGHT_BYTES):
+    """
+    Render entries on a thread pool and yield the results in input order.
+
+    At most ``2 * jobs`` files are in flight at once, and no new file is
+    submitted while the sizes of the pending files exceed
+    ``max_in_flight_bytes`` (a single oversized file is still allowed through
+    on its own), so memory stays bounded no matter how large the tree is.
+
+    Args:
+        render (callable): Function rendering one entry
+        entries (iterable[Entry]): The entries to render, in output order
+        jobs (int): Number of worker threads
+        max_in_flight_bytes (int): Soft cap on the bytes of pending files
+
+    Yields:
+        The value of ``render(entry)`` for each entry, in order
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = deque()
+    in_flight_bytes = 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for entry in entries:
             try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    contents = f.readlines()
-                    if max_lines is not None:
-                        contents = contents[:max_lines]
-                    contents = ''.join(contents)
-                    file_contents += f"## {file_path}\n\n```\n{remove_empty_lines(contents)}\n```\n\n"
-            except UnicodeDecodeError:
-                logger.warning(f"Skipping file {file_path}: unable to decode with UTF-8 encoding.")
-    return file_contents
+                size = entry.stat().st_size
+            except OSError:
+                size = 0
+            while pending and (len(pending) >= 2 * jobs
+                               or in_flight_bytes + size > max_in_flight_bytes):
+                future, future_size = pending.popleft()
+                in_flight_bytes -= future_size
+                yield future.result()
+            pending.append((executor.submit(render, entry), size))
+            in_flight_bytes += size
+        while pending:
+            future, _ = pending.popleft()
+            yield future.result()
+
+def pack_sections(sizes, budget, strategy='order', values=None):
+    """
+    Choose which file sections fit into a token budget.
+
+    Sections are considered in priority order and kept whenever they still
+    fit. The strategies differ only in that order:
+
+    * ``order``: walk order
+    * ``smallest``: fewest tokens first, which keeps the most files
+    * ``knapsack``: highest ``value / tokens`` first (greedy 0/1 knapsack)
+
+    If budget is left over, the first section that did not fit is truncated
+    to fill it, provided at least ``MIN_TRUNCATED_TOKENS`` remain.
+
+    Args:
+        sizes (list[int]): Token count of each section, in walk order
+        budget (int): Tokens available for file sections
+        strategy (str): One of ``PACK_STRATEGIES``
+        values (list[float], optional): Value of each section for ``knapsack``
+
+    Returns:
+        tuple: The set of kept indices and ``(index, tokens)`` for the
+        truncated section, or None if no section is truncated
+    """
+    indices = range(len(sizes))
+    if strategy == 'order':
+        priority = list(indices)
+    elif strategy == 'smallest':
+        priority = sorted(indices, key=lambda i: (sizes[i], i))
+    elif strategy == 'knapsack':
+        if values is None:
+            values = [1.0] * len(sizes)
+        priority = sorted(indices, key=lambda i: (-values[i] / max(sizes[i], 1), i))
+    else:
+        raise ValueError(f"Unknown packing strategy: {strategy}")
+
+    kept = set()
+    skipped = []
+    remaining = budget
+    for i in priority:
+        if sizes[i] <= remaining:
+            kept.add(i)
+            remaining -= sizes[i]
+        else:
+            skipped.append(i)
+
+    truncated = None
+    if skipped and remaining >= MIN_TRUNCATED_TOKENS:
+        truncated = (skipped[0], remaining)
+    return kept, truncated
+
+def iter_packed_file_sections(entries, budget, token_cache, strategy='order',
+                              max_lines=None, jobs=None, file_index=None,
+                              max_file_bytes=None, head=None, tail=None, max_tokens_per_file=None,
+                              dedup=False, recorder=None, minify=False):
+    """
+    Yield the file sections that fit in ``budget`` tokens, in walk order,
+    followed by a trailer listing the files that were dropped or truncated.
+
+    Every section is rendered and counted once to size it, then the chosen
+    sections are rendered again for output, so only token counts (not file
+    contents) are kept for the whole tree. In ``knapsack`` mode a file is
+    valued at ``1 / depth``, favouring files near the root. With a
+    ``recorder``, the sizing pass is timed as the ``pack`` phase and dropped
+    files are recorded as ``omitted``. With ``dedup``, duplicate files are
+    sized and emitted as their stubs.
+    """
+    encoding = token_cache.encoding
+    duplicates = {}
+    if dedup:
+        with _phase(recorder, 'dedup'):
+            duplicates = find_duplicates(entries, max_file_bytes, jobs)
+
+    def measure(entry):
+        if entry.path in duplicates:
+            section = format_duplicate_section(entry, duplicates[entry.path])
+        else:
+            section = render_file_section(entry, max_lines=max_lines, file_index=file_index,
+                                          max_file_bytes=max_file_bytes, head=head, tail=tail,
+                                          max_tokens_per_file=max_tokens_per_file,
+                                          token_cache=token_cache, minify=minify)
+        return None if section is None else token_cache.count(section.text)
+
+    if recorder is not None:
+        measure = recorder.timed('pack', measure)
+    prefetch_archive([entry for entry in entries if entry.path not in duplicates],
+                     max_file_bytes)
+    if jobs is not None and jobs > 1:
+        measured = iter_parallel(measure, entries, jobs)
+    else:
+        measured = map(measure, entries)
+    sized = [(entry, tokens) for entry, tokens in zip(entries, measured) if tokens is not None]
+    sizes = [tokens for _, tokens in sized]
+    values = [1.0 / entry.depth for entry, _ in sized]
+    # The trailer listing what was left out counts against the budget too;
+    # reserve its tokens and pack again until it fits in the reservation,
+    # naming fewer files if it would not fit the budget at all
+    reserved = 0
+    listed = OMITTED_LIST_MAX_FILES
+    while True:
+        kept, truncated = pack_sections(sizes, max(budget - reserved, 0), strategy, values)
+        trailer = format_omitted_trailer(budget, sized, kept, truncated, listed)
+        trailer_tokens = 0 if trailer is None else count_tokens(trailer, encoding)
+        if trailer_tokens <= reserved:
+            break
+        if trailer_tokens > budget and listed > 0:
+            listed //= 2
+            continue
+        reserved = trailer_tokens
+    if trailer_tokens > budget:
+        trailer = None
+    truncated_entry = sized[truncated[0]][0] if truncated else None
+
+    render_whole = _render_duplicates(
+        functools.partial(render_file_section, max_lines=max_lines, file_index=file_index,
+                          max_file_bytes=max_file_bytes, head=head, tail=tail,
+                          max_tokens_per_file=max_tokens_per_file,
+                          token_cache=token_cache, recorder=recorder, minify=minify),
+        duplicates, recorder)
+
+    def render(entry):
+        if entry is not truncated_entry or entry.path in duplicates:
+            return render_whole(entry)
+        skipped = sniff_file(entry, max_file_bytes)
+        if skipped is not None:
+            return format_skipped_section(entry, *skipped)
+        with _phase(recorder, 'read'):
+            contents = read_file_text(entry, max_lines=max_lines, head=head, tail=tail,
+                                      max_tokens=max_tokens_per_file, encoding=encoding)
+        if contents is None:
+            if recorder is not None:
+                recorder.record_file(entry.path, 'unreadable', _file_size(entry))
+            return None
+        if recorder is not None:
+            recorder.record_file(entry.path, 'emitted', _file_size(entry),
+                                 len(contents.encode('utf-8')))
+        original = contents
+        language = language_for(entry.name) if minify else None
+        if language is not None:
+            # Minified before it is cut, so more of the file fits
+            contents = minify_text(contents, language)
+        tokens = encoding.encode(contents, disallowed_special=())
+        marker = f"\n[... truncated: {len(tokens)} tokens omitted ...]"
+        overhead = (count_tokens(format_file_section(entry, "").text, encoding)
+                    + count_tokens(marker, encoding))
+        kept_tokens = max(truncated[1] - overhead, 0)
+        while True:
+            head_text = encoding.decode(tokens[:kept_tokens])
+            left_out = len(tokens) - kept_tokens
+            section = format_file_section(
+                entry, f"{head_text}\n[... truncated: {left_out} tokens omitted ...]")
+            # Decoding a cut token sequence can re-encode to more tokens
+            excess = count_tokens(section.text, encoding) - truncated[1]
+            if excess <= 0 or kept_tokens == 0:
+                break
+            kept_tokens = max(kept_tokens - excess, 0)
+        if language is None:
+            return section
+        # The statistics compare the kept text with the share of the
+        # original it stands for, estimated by length
+        share = round(len(original) * len(head_text) / len(contents)) if contents else 0
+        before = format_file_section(
+            entry, original[:share] + "\n[... truncated: "
+            f"{len(original) - share} characters omitted ...]")
+        return section._replace(minified=(language, before.text))
+
+    chosen = [entry for i, (entry, _) in enumerate(sized)
+              if i in kept or entry is truncated_entry]
+    prefetch_archive([entry for entry in chosen if entry.path not in duplicates],
+                     max_file_bytes)
+    if jobs is not None and jobs > 1:
+        sections = iter_parallel(render, chosen, jobs)
+    else:
+        sections = map(render, chosen)
+    for section in sections:
+        if section is not None:
+            yield section
+
+    omitted = [entry for i, (entry, _) in enumerate(sized)
+               if i not in kept and entry is not truncated_entry]
+    if recorder is not None:
+        for entry in omitted:
+            recorder.record_file(entry.path, 'omitted', _file_size(entry))
+    if trailer is not None:
+        yield Section(None, trailer)
+    elif omitted or truncated_entry is not None:
+        logger.warning(f"No room to list the {len(omitted)} files left out of the "
+                       f"{budget}-token file budget")
+
+def format_omitted_trailer(budget, sized, kept, truncated, listed=OMITTED_LIST_MAX_FILES):
+    """
+    Format the trailer of a packed summary, listing the truncated file and
+    the first ``listed`` omitted ones, or return None if every file was kept
+    whole. Further omitted files are only counted.
+
+    Args:
+        budget (int): Tokens available for file sections
+        sized (list[tuple]): ``(entry, tokens)`` of each section, in walk order
+        kept (set[int]): Indices of the sections kept whole
+        truncated (tuple): ``(index, tokens)`` of the truncated section, or None
+        listed (int): How many omitted files to name
+    """
+    omitted = [(entry, tokens) for i, (entry, tokens) in enumerate(sized)
+               if i not in kept and (truncated is None or i != truncated[0])]
+    if not omitted and truncated is None:
+        return None
+    trailer = f"## Omitted from the {budget}-token file budget\n\n"
+    if truncated is not None:
+        entry, tokens = sized[truncated[0]]
+        trailer += f"Truncated:\n- {entry.path} ({tokens} tokens before truncation)\n"
+    if omitted:
+        trailer += "Omitted:\n"
+        for entry, tokens in omitted[:listed]:
+            trailer += f"- {entry.path} ({tokens} tokens)\n"
+        rest = omitted[listed:]
+        if rest:
+            more = "... and {} more files" if listed else "{} files"
+            trailer += (f"- {more.format(len(rest))} "
+                        f"({sum(tokens for _, tokens in rest)} tokens)\n")
+    return trailer + "\n"
+
+def load_encoding(encoding_name, tokenizer_cache=None):
+    """
+    Return the tiktoken encoding called ``encoding_name``, loaded once per
+    process (see :func:`~summarizeGPT.tokenizer.get_encoding`).
+    """
+    return get_encoding(encoding_name, tokenizer_cache)
+
+def count_tokens(text, encoding):
+    return len(encoding.encode(text, disallowed_special=()))
 
 def remove_empty_lines(text):
     return "\n".join([line for line in text.split("\n") if line.strip()])
 
-def print_summary(summary, encoding_name="cl100k_base"):
-    # Get token count using tiktoken
-    try:
-        encoding = tiktoken.get_encoding(encoding_name)
-        token_count = len(encoding.encode(summary))
-    except Exception as e:
-        logger.error(f"Could not count tokens: {str(e)}")
-        token_count = None
-
-    total_lines = summary.count('\n')
-    total_chars = len(summary)
-    total_bytes = sys.getsizeof(summary.encode('utf-8'))
-    
-    print("\nSummary Statistics:")
-    print(f"Total Lines: {total_lines}")
-    print(f"Total Characters: {total_chars}")
-    print(f"Total Bytes: {total_bytes}")
+def new_summary_stats(encoding_name="cl100k_base"):
+    """Return an empty statistics record for :func:`iter_with_stats`."""
+    return {'lines': 0, 'chars': 0, 'bytes': 0, 'tokens': None,
+            'encoding': encoding_name, 'file_tokens': {},
+            'duplicates': 0, 'duplicate_bytes_saved': 0, 'duplicate_tokens_saved': None,
+            'minified': {}}
+
+def iter_with_stats(sections, stats, token_cache=None, recorder=None):
+    """
+    Pass summary sections through unchanged while accumulating statistics.
+
+    Line, character, byte and token counts are added to ``stats`` as each
+    section goes by, so the full summary never has to be materialised to
+    measure it. File sections are counted through ``token_cache`` and their
+    counts recorded per path in ``stats['file_tokens']``. Without a token
+    cache, or if its tokenizer cannot be loaded, the token count stays None.
+    Duplicate stubs (see :func:`find_duplicates`) are counted in
+    ``stats['duplicates']``, along with the bytes and tokens the original's
+    section would have taken again. Minified sections are counted per
+    language in ``stats['minified']``, with their bytes and tokens before
+    and after minification.
+
+    Args:
+        sections (iterable[Section]): The summary sections
+        stats (dict): A record created by :func:`new_summary_stats`
+        token_cache (TokenCache, optional): Counts tokens per section
+        recorder (Recorder, optional): Times token counting as the
+            ``tokenize`` phase
+
+    Yields:
+        Section: The sections, unchanged
+    """
+    if token_cache is not None:
+        try:
+            token_cache.encoding
+            stats['tokens'] = 0
+            stats['duplicate_tokens_saved'] = 0
+        except Exception as e:
+            logger.error(f"Could not count tokens: {str(e)}")
+            token_cache = None
+
+    file_bytes = {}
+    for section in sections:
+        text = section.text
+        size = len(text.encode('utf-8'))
+        stats['lines'] += text.count('\n')
+        stats['chars'] += len(text)
+        stats['bytes'] += size
+        if section.duplicate_of is not None:
+            stats['duplicates'] += 1
+            stats['duplicate_bytes_saved'] += max(file_bytes.get(section.duplicate_of, 0) - size, 0)
+        elif section.path is not None:
+            file_bytes[section.path] = size
+        minified = None
+        if section.minified is not None:
+            language, original = section.minified
+            minified = stats['minified'].get(language)
+            if minified is None:
+                minified = stats['minified'][language] = {
+                    'files': 0, 'bytes_before': 0, 'bytes_after': 0,
+                    'tokens_before': None if token_cache is None else 0,
+                    'tokens_after': None if token_cache is None else 0}
+            minified['files'] += 1
+            minified['bytes_before'] += len(original.encode('utf-8'))
+            minified['bytes_after'] += size
+        if token_cache is not None:
+            with _phase(recorder, 'tokenize'):
+                if section.path is None:
+                    tokens = count_tokens(text, token_cache.encoding)
+                else:
+                    tokens = token_cache.count(text)
+            if section.duplicate_of is not None:
+                original = stats['file_tokens'].get(section.duplicate_of, 0)
+                stats['duplicate_tokens_saved'] += max(original - tokens, 0)
+            if section.path is not None:
+                stats['file_tokens'][section.path] = tokens
+            if minified is not None:
+                with _phase(recorder, 'tokenize'):
+                    minified['tokens_before'] += token_cache.count(original)
+                minified['tokens_after'] += tokens
+            stats['tokens'] += tokens
+        yield section
+
+    if token_cache is not None:
+        token_cache.save()
+
+def print_statistics(stats, file=None, top_files=TOP_FILES_BY_TOKENS):
+    print("\nSummary Statistics:", file=file)
+    print(f"Total Lines: {stats['lines']}", file=file)
+    print(f"Total Characters: {stats['chars']}", file=file)
+    print(f"Total Bytes: {stats['bytes']}", file=file)
     
-    if token_count is not None:
-        print(f"Approximate Tokens ({encoding_name}): {token_count}")
+    if stats['tokens'] is not None:
+        print(f"Approximate Tokens ({stats['encoding']}): {stats['tokens']}", file=file)
+
+    if stats.get('duplicates'):
+        saved = f"{stats['duplicate_bytes_saved']} bytes"
+        if stats['duplicate_tokens_saved'] is not None:
+            saved += f", {stats['duplicate_tokens_saved']} tokens"
+        print(f"Duplicate Files: {stats['duplicates']} ({saved} saved)", file=file)
+
+    if stats.get('minified'):
+        print("\nMinified Files:", file=file)
+        for language, totals in sorted(stats['minified'].items()):
+            unit = 'tokens' if totals['tokens_before'] is not None else 'bytes'
+            before, after = totals[f"{unit}_before"], totals[f"{unit}_after"]
+            saved = (before - after) / before * 100 if before else 0.0
+            print(f"  {language}: {totals['files']} files, {before} -> {after} {unit} "
+                  f"({saved:.1f}% saved)", file=file)
+
+    file_tokens = stats.get('file_tokens')
+    if stats['tokens'] is not None and file_tokens and top_files:
+        print("\nLargest Files by Tokens:", file=file)
+        largest = sorted(file_tokens.items(), key=lambda item: item[1], reverse=True)
+        for path, tokens in largest[:top_files]:
+            print(f"  {tokens:>8}  {path}", file=file)
     
-    print()  # Empty line for spacing
+    print(file=file)  # Empty line for spacing
 
-def main():
-    parser = argparse.ArgumentParser(description='Code summarization tool.')
-    parser.add_argument('directory', type=str, help='Path to the directory to summarize')
+def write_stats_json(recorder, stats, path):
+    """Finish ``recorder`` and write its report, with the output statistics, to ``path``."""
+    if recorder is None:
+        return
+    import tracemalloc
+    report = recorder.finish(stats)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    except OSError as e:
+        logger.error(f"Failed to write statistics to {path}: {str(e)}")
+
+def write_atomically(path, sections):
+    """
+    Write the text of ``sections`` to a temporary file next to ``path`` and
+    rename it over ``path``, so readers never see a partial summary.
+    """
+    tmp_path = os.path.join(os.path.dirname(path),
+                            f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for section in sections:
+                f.write(section.text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def shard_path(prompt_file, number):
+    """Return the path of shard ``number`` (from 1) of ``prompt_file``: ``<name>.part-001.md``."""
+    root, ext = os.path.splitext(prompt_file)
+    return f"{root}.part-{number:03d}{ext}"
+
+def _split_lines(text, room, encoding):
+    """
+    Yield ``(text, tokens)`` for each line of ``text``, cutting lines longer
+    than ``room`` tokens.
+    """
+    for line in text.splitlines(keepends=True):
+        tokens = encoding.encode(line, disallowed_special=())
+        if len(tokens) <= room:
+            yield line, len(tokens)
+            continue
+        for start in range(0, len(tokens), room):
+            piece = tokens[start:start + room]
+            yield encoding.decode(piece), len(piece)
+
+def split_section(section, budget, encoding):
+    """
+    Split a section larger than ``budget`` tokens into pieces that fit.
+
+    File sections are cut between lines (a single line longer than the
+    budget is cut between tokens); every piece closes the code block, and
+    the pieces after the first repeat the heading marked as continued.
+
+    Returns:
+        list[tuple[Section, int]]: The pieces and their token counts
+    """
+    text = section.text
+    opening = continued = closing = ""
+    if section.path is not None:
+        heading = f"## {section.path}\n\n```\n"
+        if text.startswith(heading) and text.endswith("\n```\n\n"):
+            opening, closing = heading, "```\n\n"
+            continued = f"## {section.path} (continued)\n\n```\n"
+            text = text[len(heading):-len(closing)]
+    opening_tokens = count_tokens(opening, encoding)
+    continued_tokens = count_tokens(continued, encoding)
+    closing_tokens = count_tokens(closing, encoding)
+    room = max(budget - max(opening_tokens, continued_tokens) - closing_tokens - 1, 1)
+
+    pieces = []
+    lines, used = [], 0
+
+    def flush():
+        body, tokens = "".join(lines), used + closing_tokens
+        if closing and not body.endswith("\n"):
+            body += "\n"
+            tokens += 1
+        prefix, prefix_tokens = ((continued, continued_tokens) if pieces
+                                 else (opening, opening_tokens))
+        pieces.append((Section(section.path, prefix + body + closing), prefix_tokens + tokens))
+
+    for line, tokens in _split_lines(text, room, encoding):
+        if lines and used + tokens > room:
+            flush()
+            lines, used = [], 0
+        lines.append(line)
+        used += tokens
+    if lines or not pieces:
+        flush()
+    return pieces
+
+def write_shards(prompt_file, sections, budget, token_cache, directory=None, recorder=None):
+    """
+    Write the summary into shards of at most ``budget`` tokens each, in one
+    streaming pass.
+
+    The header and tree view (everything before the first file section) go
+    into the first shard; file sections are then added in order, starting
+    a new shard whenever the next one would not fit. A section is split
+    (see :func:`split_section`) only if it exceeds the budget on its own.
+    Shard sizes are the sums of per-section token counts, taken through
+    ``token_cache``, so no shard is ever encoded as a whole. Shards left
+    over from an earlier run with more parts are removed.
+
+    Args:
+        prompt_file (str): The unsharded output path; shards are named by
+            :func:`shard_path`
+        sections (iterable[Section]): The summary sections
+        budget (int): Token budget of each shard
+        token_cache (TokenCache): Counts tokens per section
+        directory (str, optional): Named in a short header at the top of
+            every shard after the first
+        recorder (Recorder, optional): Times file writes as the ``write`` phase
+
+    Returns:
+        list[tuple[str, int]]: Path and token count of each shard
+    """
+    encoding = token_cache.encoding
+    shards = []
+    out = None
+    used = 0
+    fresh = True  # nothing but the shard header written yet
+
+    def start_shard():
+        nonlocal out, used, fresh
+        if out is not None:
+            out.close()
+        path = shard_path(prompt_file, len(shards) + 1)
+        out = open(path, "w", encoding="utf-8")
+        shards.append([path, 0])
+        used = 0
+        if directory is not None and len(shards) > 1:
+            header = f"# Summary of directory: {directory} (part {len(shards):03d})\n\n"
+            emit(header, count_tokens(header, encoding))
+        fresh = True
+
+    def emit(text, tokens):
+        nonlocal used
+        with _phase(recorder, 'write'):
+            out.write(text)
+        used += tokens
+        shards[-1][1] += tokens
+
+    header_tokens = 0
+    if directory is not None:
+        header_tokens = count_tokens(f"# Summary of directory: {directory} (part 002)\n\n",
+                                     encoding)
+    in_preamble = True
+    try:
+        start_shard()
+        for section in sections:
+            if section.path is None:
+                tokens = count_tokens(section.text, encoding)
+            else:
+                tokens = token_cache.count(section.text)
+                in_preamble = False
+            if in_preamble:
+                emit(section.text, tokens)
+                fresh = False
+                continue
+            if used + tokens <= budget or header_tokens + tokens <= budget:
+                pieces = [(section, tokens)]
+            else:
+                pieces = split_section(section, budget - header_tokens, encoding)
+            for piece, piece_tokens in pieces:
+                if not fresh and used + piece_tokens > budget:
+                    start_shard()
+                emit(piece.text, piece_tokens)
+                fresh = False
+    finally:
+        if out is not None:
+            out.close()
+
+    if shards[0][1] > budget:
+        logger.warning(f"The tree view alone takes {shards[0][1]} tokens, more than the "
+                       f"{budget}-token shard budget")
+    current = {os.path.basename(path) for path, _ in shards}
+    shard_dir = os.path.dirname(prompt_file) or "."
+    stem, ext = os.path.splitext(os.path.basename(prompt_file))
+    for name in os.listdir(shard_dir):
+        number = name[len(stem) + len(".part-"):-len(ext) or None]
+        if (name.startswith(f"{stem}.part-") and name.endswith(ext) and number.isdigit()
+                and name not in current):
+            os.remove(os.path.join(shard_dir, name))
+    for path, tokens in shards:
+        logger.info(f"Wrote {path} ({tokens} tokens)")
+    return [tuple(shard) for shard in shards]
+
+def _is_output_path(path):
+    name = os.path.basename(path)
+    return (name == output_file or name.startswith(f".{output_file}.")
+            or name.startswith(SHARD_PREFIX))
+
+def _listed_paths(entries):
+    return {os.path.abspath(entry.path) for entry in entries if not entry.ignored}
+
+def _watched_directories(directory, entries):
+    directories = {os.path.abspath(directory)}
+    directories.update(os.path.abspath(entry.path) for entry in entries
+                       if entry.is_dir and not entry.ignored)
+    return directories
+
+def _tree_snapshot(entries):
+    """Map every listed path to its stat signature (None for directories)."""
+    snapshot = {}
+    for entry in entries:
+        if entry.ignored or _is_output_path(entry.path):
+            continue
+        signature = None
+        if not entry.is_dir:
+            try:
+                st = entry.stat()
+                signature = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        snapshot[os.path.abspath(entry.path)] = signature
+    return snapshot
+
+def watch_directory(summarizer, directory, prompt_file, file_index=None, stats_json=None,
+                    polling=False, poll_interval=None, debounce=None, stop=None):
+    """
+    Write the summary to ``prompt_file`` and keep it up to date until ``stop``
+    is set (or forever).
+
+    Changes are received through inotify where available and by polling
+    otherwise (see :mod:`summarizeGPT.watch`), and debounced so a burst of
+    saves causes a single regeneration. Sections are kept in a
+    :class:`MemoryIndex`: only files that changed are read again. When files
+    or directories are created, deleted or renamed, only the directories
+    they are in are listed again (see :func:`rescan_directories`); the whole
+    tree is rescanned only if events were lost, the summarized directory
+    itself changed, a ``.gitignore`` changed, or files come from the git
+    index (``git_tracked``). If new directories exhaust the inotify
+    watches, watching continues by polling. Each regeneration replaces the
+    output atomically and prints fresh statistics.
+
+    Args:
+        summarizer (Summarizer): The summary configuration
+        directory (str): The directory to summarize
+        prompt_file (str): Where to write the summary
+        file_index (FileIndex, optional): Persistent index behind the
+            in-memory one; closed when watching stops
+        stats_json (str, optional): Rewrite a ``--stats-json`` report for
+            every regeneration
+        polling (bool): Poll even where inotify is available
+        poll_interval (float, optional): Seconds between polls
+        debounce (float, optional): Quiet period that ends a burst of changes
+        stop (threading.Event, optional): Stops watching once set
+    """
+    from . import watch
+
+    if poll_interval is None:
+        poll_interval = watch.POLL_INTERVAL_SECONDS
+    if debounce is None:
+        debounce = watch.DEBOUNCE_SECONDS
+    stop = stop or threading.Event()
+    index = MemoryIndex(file_index)
+    root = os.path.abspath(directory)
+    max_depth = None
+    if summarizer.tree_depth is not None and summarizer.file_depth is not None:
+        max_depth = max(summarizer.tree_depth, summarizer.file_depth)
+    matcher = None
+
+    def scan():
+        nonlocal matcher
+        entries = summarizer.scan(directory)
+        # The scan's ignore rules, to list changed directories with later
+        matcher = build_ignore_matcher(directory, summarizer.gitignore_for(directory),
+                                       hierarchical=summarizer.auto_gitignore)
+        if summarizer.auto_gitignore:
+            for entry in entries:
+                if entry.name == '.gitignore' and not entry.is_dir:
+                    matcher.add_file(entry.path)
+        return entries
+
+    def snapshot():
+        return _tree_snapshot(summarizer.scan(directory))
+
+    def regenerate(entries):
+        recorder = Recorder() if stats_json else None
+        stats = new_summary_stats(summarizer.encoding_name)
+        sections = summarizer.iter_sections(directory, file_index=index, recorder=recorder,
+                                            entries=entries)
+        with _phase(recorder, 'write'):
+            write_atomically(prompt_file, summarizer.with_stats(sections, stats, recorder))
+        print_statistics(stats)
+        write_stats_json(recorder, stats, stats_json)
+        print(prompt_file, flush=True)
+
+    entries = scan()
+    # Watching starts before the first write, so no change made meanwhile is missed
+    watcher = watch.create_watcher(_watched_directories(directory, entries),
+                                   snapshot, poll_interval, polling)
+    try:
+        regenerate(entries)
+        while not stop.is_set():
+            changes = watch.wait_for_changes(watcher, stop, debounce)
+            changes = {path: structural for path, structural in changes.items()
+                       if path is None or not _is_output_path(path)}
+            if not changes:
+                continue
+            # Directories in which files or directories were created, deleted or renamed
+            changed_directories = {os.path.dirname(path)
+                                   for path, structural in changes.items()
+                                   if structural and path is not None}
+            rescan = any(path is None or path == root or os.path.basename(path) == '.gitignore'
+                         for path in changes)
+            if rescan or (changed_directories and summarizer.git_tracked):
+                entries = scan()
+            else:
+                listed = _listed_paths(entries)
+                if changed_directories:
+                    entries = rescan_directories(entries, changed_directories, matcher,
+                                                 max_depth, summarizer.auto_gitignore)
+                    listed |= _listed_paths(entries)
+                if not listed.intersection(changes):
+                    continue
+            if changed_directories or rescan:
+                try:
+                    watcher.watch_directories(_watched_directories(directory, entries))
+                except watch.WatchError as e:
+                    # New directories can run inotify out of watches
+                    watcher.close()
+                    logger.info(f"inotify unavailable ({e}); polling every {poll_interval}s")
+                    watcher = watch.PollingWatcher(snapshot, poll_interval)
+                    # Events lost in between are covered by scanning after the first snapshot
+                    entries = scan()
+                    changes[None] = True
+            if None in changes:
+                index.clear()
+            else:
+                index.invalidate(changes)
+            logger.info(f"{len(changes)} changed path(s), regenerating {prompt_file}")
+            # Drop the stat results cached by the scan for modified files
+            entries = [entry._replace(dir_entry=None)
+                       if not entry.is_dir and os.path.abspath(entry.path) in changes else entry
+                       for entry in entries]
+            try:
+                regenerate(entries)
+            except OSError as e:
+                logger.error(f"Failed to write output file: {str(e)}")
+    finally:
+        watcher.close()
+        index.close()
+
+def print_summary(summary, encoding_name="cl100k_base", count_tokens=True):
+    stats = new_summary_stats(encoding_name)
+    token_cache = TokenCache(encoding_name) if count_tokens else None
+    for _ in iter_with_stats([Section(None, summary)], stats, token_cache):
+        pass
+    print_statistics(stats)
+
+def output_path_for(directory):
+    """
+    Return where the summary of ``directory`` is written: inside it, or next
+    to it for a tar or zip archive.
+    """
+    if is_archive(directory):
+        return os.path.join(os.path.dirname(directory), output_file)
+    return os.path.join(directory, output_file)
+
+def add_summary_arguments(parser):
+    """Add the options that shape a summary, shared by ``main`` and ``batch``."""
     parser.add_argument('--gitignore', type=str, help='Path to the gitignore file')
     parser.add_argument('-ig', '--auto-gitignore', action='store_true', 
-                       help='Auto-discover and use nearest .gitignore file')
+                       help='Auto-discover and use nearest .gitignore file, plus nested .gitignore '
+                            'files and .git/info/exclude')
     parser.add_argument('--include', type=str, help='Comma-separated list of file extensions to include')
     parser.add_argument('--exclude', type=str, help='Comma-separated list of file extensions to exclude')
     parser.add_argument('-d', '--show_docker', action='store_true', help='Include docker files')
     parser.add_argument('-o', '--show_only_docker', action='store_true', help='Show only docker files')
+    parser.add_argument('--preset', type=str, action='append', default=None, dest='presets',
+                       choices=list(PRESETS), metavar='NAME',
+                       help='Apply a named filter preset instead of "default" (repeatable): '
+                            + '; '.join(f"{name}: {preset['description']}"
+                                        for name, preset in PRESETS.items()))
+    parser.add_argument('--include-glob', type=str, action='append', default=[], metavar='GLOB',
+                       help='Only include files whose relative path matches GLOB (gitignore '
+                            'syntax, repeatable)')
+    parser.add_argument('--exclude-glob', type=str, action='append', default=[], metavar='GLOB',
+                       help='Leave out files whose relative path matches GLOB (gitignore syntax, '
+                            'repeatable)')
+    parser.add_argument('--include-regex', type=str, action='append', default=[], metavar='REGEX',
+                       help='Only include files whose relative path contains a match of REGEX '
+                            '(repeatable)')
+    parser.add_argument('--exclude-regex', type=str, action='append', default=[], metavar='REGEX',
+                       help='Leave out files whose relative path contains a match of REGEX '
+                            '(repeatable)')
+    parser.add_argument('--min-size', type=int, default=None, metavar='BYTES',
+                       help='Leave out files smaller than BYTES')
+    parser.add_argument('--max-size', type=int, default=None, metavar='BYTES',
+                       help='Leave out files larger than BYTES (unlike --max-file-bytes, without a '
+                            'placeholder)')
+    parser.add_argument('--newer-than', type=_time_argument, default=None, metavar='TIME',
+                       help='Only include files modified after TIME: a duration ago (30m, 12h, 7d, '
+                            '2w) or a date (not with --rev or --diff)')
+    parser.add_argument('--older-than', type=_time_argument, default=None, metavar='TIME',
+                       help='Only include files modified before TIME: a duration ago (30m, 12h, '
+                            '7d, 2w) or a date (not with --rev or --diff)')
     parser.add_argument('-n', '--max-lines', type=int, default=None, help='Maximum number of lines to include from each file')
     parser.add_argument('--encoding', type=str, 
-                       choices=['cl100k_base', 'p50k_base', 'r50k_base'], 
+                       choices=['cl100k_base', 'o200k_base', 'p50k_base', 'r50k_base'], 
                        default='cl100k_base',
                        help='Tiktoken encoding to use for token counting (default: cl100k_base)')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose output')
@@ -207,47 +2321,286 @@ def main():
                        help='Maximum directory depth for tree view (root=1)')
     parser.add_argument('-Lf', '--file-depth', type=int, default=None,
                        help='Maximum directory depth for file contents (root=1)')
-    
-    args = parser.parse_args()
+    parser.add_argument('--tree-collapse', type=int, default=None, metavar='N',
+                       help='Show directories with more than N entries as one line in the tree '
+                            'view, with their file count, total size and most common extensions')
+    parser.add_argument('--head', type=int, default=None,
+                       help='Keep only the first N lines of each file (read without loading the '
+                            'rest)')
+    parser.add_argument('--tail', type=int, default=None,
+                       help='Keep only the last N lines of each file (read by seeking from the '
+                            'end)')
+    parser.add_argument('--max-tokens-per-file', type=int, default=None,
+                       help='Keep at most this many tokens of each file, sampled from its '
+                            'beginning and end')
+    parser.add_argument('--minify', action='store_true',
+                       help='Strip comments and docstrings from Python, JS/TS, Go and C-family '
+                            'files, and whitespace from JSON and YAML; the statistics show the '
+                            'savings per language')
+    parser.add_argument('--dedup', action='store_true',
+                       help='List files identical to an earlier file as a one-line stub instead of '
+                            'repeating them')
+    parser.add_argument('--max-file-bytes', type=int, default=None,
+                       help='Skip files larger than this many bytes, listing them with a '
+                            'placeholder')
+    parser.add_argument('--git-tracked', action='store_true',
+                       help='List only files tracked by git, read from the repository index '
+                            'instead of walking the tree')
+    parser.add_argument('--rev', type=str, default=None, metavar='REV',
+                       help='Summarize the tree as of git commit REV, read from the repository '
+                            'without a checkout')
+    parser.add_argument('--diff', type=str, default=None, metavar='BASE..HEAD',
+                       help='Summarize only the files changed between two commits (BASE...HEAD '
+                            'diffs from their merge base); the tree view marks them [A], [M], [D] '
+                            'or [T]')
+    parser.add_argument('--diff-context', type=int, default=None, metavar='N',
+                       help='With --diff, emit unified diffs with N lines of context instead of '
+                            'whole files')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                       help='Number of threads used to read files concurrently (output order is '
+                            'unchanged)')
+    parser.add_argument('--max-tokens', type=int, default=None,
+                       help='Pack file sections into at most this many tokens and list the dropped '
+                            'files in a trailer')
+    parser.add_argument('--pack-strategy', type=str, choices=PACK_STRATEGIES, default='order',
+                       help='How --max-tokens chooses files: walk order, smallest first, or '
+                            'value-per-token knapsack (default: order)')
+    parser.add_argument('--tokenizer-cache', type=str, default=None, metavar='DIR',
+                       help='Load encodings from <name>.tiktoken files in DIR and never download '
+                            'them (default: $SUMMARIZEGPT_TOKENIZER_CACHE)')
+    parser.add_argument('--no-tokens', action='store_true',
+                       help='Do not count tokens (skips loading the tokenizer entirely)')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                       help='Directory for persistent caches (default: '
+                            '$XDG_CACHE_HOME/summarizeGPT)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Do not read or write persistent caches')
+
+def _time_argument(value):
+    try:
+        return parse_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+def check_summary_arguments(args):
+    """Return an error message for conflicting summary options, or None."""
+    if args.show_docker and args.show_only_docker:
+        return "Cannot use both show_docker and show_only_docker options."
+    if args.presets and (args.show_docker or args.show_only_docker):
+        option = "-d" if args.show_docker else "-o"
+        return f"Cannot use --preset with {option}."
+    if args.no_tokens and (args.max_tokens is not None or args.max_tokens_per_file is not None):
+        option = "--max-tokens" if args.max_tokens is not None else "--max-tokens-per-file"
+        return f"Cannot use --no-tokens with {option}."
+    if args.tree_collapse is not None and args.tree_collapse < 0:
+        return "--tree-collapse must not be negative."
+    if args.rev is not None and args.diff is not None:
+        return "Cannot use both --rev and --diff."
+    if (args.rev is not None or args.diff is not None) and (args.newer_than is not None
+                                                            or args.older_than is not None):
+        option = "--newer-than" if args.newer_than is not None else "--older-than"
+        revision = "--rev" if args.rev is not None else "--diff"
+        return (f"Cannot use {option} with {revision}: files read from git have no "
+                f"modification time.")
+    if args.diff_context is not None:
+        if args.diff is None:
+            return "--diff-context needs --diff."
+        if args.diff_context < 0:
+            return "--diff-context must not be negative."
+    return None
+
+def summarizer_options(args):
+    """Return the :class:`Summarizer` keyword arguments for parsed command line options."""
+    return dict(
+        gitignore_file=args.gitignore,
+        include_exts=args.include.split(',') if args.include else None,
+        exclude_exts=args.exclude.split(',') if args.exclude else None,
+        show_docker=args.show_docker, show_only_docker=args.show_only_docker,
+        max_lines=args.max_lines,
+        tree_depth=args.tree_depth if args.tree_depth is not None else args.max_depth,
+        file_depth=args.file_depth if args.file_depth is not None else args.max_depth,
+        jobs=args.jobs, max_tokens=args.max_tokens, pack_strategy=args.pack_strategy,
+        encoding_name=args.encoding, git_tracked=args.git_tracked,
+        auto_gitignore=args.auto_gitignore, max_file_bytes=args.max_file_bytes,
+        head=args.head, tail=args.tail, max_tokens_per_file=args.max_tokens_per_file,
+        dedup=args.dedup,
+        cache_dir=None if args.no_cache else (args.cache_dir or default_cache_dir()),
+        count_tokens=not args.no_tokens, tokenizer_cache=args.tokenizer_cache,
+        revision=args.rev, diff=args.diff, diff_context=args.diff_context,
+        tree_collapse=args.tree_collapse, presets=args.presets,
+        include_globs=args.include_glob, exclude_globs=args.exclude_glob,
+        include_regexes=args.include_regex, exclude_regexes=args.exclude_regex,
+        min_size=args.min_size, max_size=args.max_size,
+        newer_than=args.newer_than, older_than=args.older_than, minify=args.minify,
+    )
+
+def build_parser():
+    """Return the argument parser of the SummarizeGPT command."""
+    parser = argparse.ArgumentParser(
+        description='Code summarization tool.',
+        epilog="Run 'SummarizeGPT batch --help' to summarize many directories in one run, "
+               "or 'SummarizeGPT serve --help' to serve summaries from a long-lived process.")
+    parser.add_argument('directory', type=str,
+                        help='Path to the directory (or .tar, .tar.gz, .zip, ... archive) to '
+                             'summarize')
+    add_summary_arguments(parser)
+    parser.add_argument('--stats-json', type=str, default=None, metavar='PATH',
+                       help='Write per-phase timings, file counts and memory peaks of the run to '
+                            'PATH as JSON')
+    parser.add_argument('--stdout', action='store_true',
+                       help='Write the summary to stdout instead of the output file (statistics go '
+                            'to stderr)')
+    parser.add_argument('--shard-tokens', type=int, default=None, metavar='N',
+                       help='Split the output into Context_for_ChatGPT.part-001.md, part-002.md, '
+                            '... of at most N tokens each')
+    parser.add_argument('-w', '--watch', action='store_true',
+                       help='Keep running and update the output file whenever files change')
+    parser.add_argument('--poll-interval', type=float, default=None, metavar='SECONDS',
+                       help='With --watch, poll for changes every SECONDS instead of using inotify')
+    return parser
+
+def main():
+    if sys.argv[1:2] == ['batch']:
+        from .batch import batch_main
+        return batch_main(sys.argv[2:])
+    if sys.argv[1:2] == ['serve']:
+        from .server import serve_main
+        return serve_main(sys.argv[2:])
+
+    args = build_parser().parse_args()
     
     # Setup logging based on verbosity
     setup_logging(args.verbose)
     
-    if args.show_docker and args.show_only_docker:
-        logger.error("Cannot use both show_docker and show_only_docker options.")
-        sys.exit(1)
-    
-    # Handle gitignore auto-discovery
-    gitignore_path = args.gitignore
-    if args.auto_gitignore and not gitignore_path:
-        gitignore_path = discover_gitignore(args.directory)
-        if gitignore_path:
-            logger.info(f"Using auto-discovered .gitignore: {gitignore_path}")
+    error = check_summary_arguments(args)
+    if error is None and args.watch and args.stdout:
+        error = "Cannot use --watch with --stdout."
+    if error is None and args.watch and is_archive(args.directory):
+        error = "Cannot use --watch with an archive."
+    if error is None and args.watch and (args.rev is not None or args.diff is not None):
+        error = f"Cannot use --watch with --{'rev' if args.rev is not None else 'diff'}."
+    if error is None and args.shard_tokens is not None:
+        if args.shard_tokens < 1:
+            error = "--shard-tokens must be at least 1."
         else:
-            logger.info("No .gitignore file found.")
+            for conflict in ('no_tokens', 'stdout', 'watch'):
+                if getattr(args, conflict):
+                    error = f"Cannot use --shard-tokens with --{conflict.replace('_', '-')}."
+                    break
+    if error is not None:
+        logger.error(error)
+        sys.exit(1)
+        return
 
-    include_exts = [".{}".format(ext.lower()) for ext in args.include.split(',')] if args.include else None
-    exclude_exts = [".{}".format(ext.lower()) for ext in args.exclude.split(',')] if args.exclude else None
-    
-    tree_depth = args.tree_depth if args.tree_depth is not None else args.max_depth
-    file_depth = args.file_depth if args.file_depth is not None else args.max_depth
-    
-    prompt_md = summarize_directory(args.directory, gitignore_path, include_exts,
-                                  exclude_exts, show_docker=args.show_docker,
-                                  show_only_docker=args.show_only_docker,
-                                  max_lines=args.max_lines,
-                                  tree_depth=tree_depth,
-                                  file_depth=file_depth)
-    prompt_file = os.path.join(args.directory, output_file)
+    options = summarizer_options(args)
+    cache_dir = options['cache_dir']
+    try:
+        summarizer = Summarizer(**options)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+        return
+    if (args.max_tokens is not None or args.max_tokens_per_file is not None
+            or args.shard_tokens is not None):
+        try:
+            summarizer.token_cache.encoding
+        except Exception as e:
+            if args.max_tokens is not None:
+                option = "--max-tokens"
+            elif args.max_tokens_per_file is not None:
+                option = "--max-tokens-per-file"
+            else:
+                option = "--shard-tokens"
+            logger.error(f"Cannot enforce {option} without a tokenizer: {str(e)}")
+            sys.exit(1)
+
+    recorder = None
+    if args.stats_json and not args.watch:
+        import tracemalloc
+        tracemalloc.start()
+        recorder = Recorder()
+
+    if args.rev is not None or args.diff is not None:
+        try:
+            resolve_revisions(args.directory, args.rev, args.diff)
+        except OSError as e:
+            logger.error(str(e))
+            sys.exit(1)
+            return
+        # Sections are keyed by working-tree path, so a revision must not share them
+        cache_dir = None
+
+    file_index = None
+    if cache_dir:
+        try:
+            file_index = FileIndex(cache_dir, args.directory)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Incremental index disabled: {str(e)}")
+
+    if args.watch:
+        prompt_file = output_path_for(args.directory)
+        try:
+            watch_directory(summarizer, args.directory, prompt_file, file_index=file_index,
+                            stats_json=args.stats_json,
+                            polling=args.poll_interval is not None,
+                            poll_interval=args.poll_interval)
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to write output file: {str(e)}")
+            sys.exit(1)
+        return
+
+    sections = summarizer.iter_sections(args.directory, file_index=file_index,
+                                        recorder=recorder)
+    stats = new_summary_stats(args.encoding)
+
+    if args.stdout:
+        try:
+            for section in summarizer.with_stats(sections, stats, recorder):
+                with _phase(recorder, 'write'):
+                    sys.stdout.write(section.text)
+        finally:
+            if file_index is not None:
+                file_index.close()
+        print_statistics(stats, file=sys.stderr)
+        write_stats_json(recorder, stats, args.stats_json)
+        return
+
+    prompt_file = output_path_for(args.directory)
+
+    if args.shard_tokens is not None:
+        try:
+            shards = write_shards(prompt_file, summarizer.with_stats(sections, stats, recorder),
+                                  args.shard_tokens, summarizer.token_cache,
+                                  directory=args.directory, recorder=recorder)
+        except IOError as e:
+            logger.error(f"Failed to write output file: {str(e)}")
+            sys.exit(1)
+            return
+        finally:
+            if file_index is not None:
+                file_index.close()
+        print_statistics(stats)
+        write_stats_json(recorder, stats, args.stats_json)
+        for path, _ in shards:
+            print(path)
+        return
     
     try:
         with open(prompt_file, "w", encoding="utf-8") as f:
-            f.write(prompt_md)
+            for section in summarizer.with_stats(sections, stats, recorder):
+                with _phase(recorder, 'write'):
+                    f.write(section.text)
     except IOError as e:
         logger.error(f"Failed to write output file: {str(e)}")
         sys.exit(1)
+    finally:
+        if file_index is not None:
+            file_index.close()
         
-    print_summary(prompt_md, encoding_name=args.encoding)
+    print_statistics(stats)
+    write_stats_json(recorder, stats, args.stats_json)
     print(prompt_file)
 
 if __name__ == '__main__':
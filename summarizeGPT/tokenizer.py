@@ -0,0 +1,250 @@
+"""
+Tokenizer loading, with an offline cache of encoding files.
+
+``tiktoken.get_encoding`` downloads its BPE files on first use. With a
+tokenizer cache directory (``--tokenizer-cache`` or the
+``SUMMARIZEGPT_TOKENIZER_CACHE`` environment variable), the encodings are
+built from plain ``<name>.tiktoken`` files in that directory instead,
+checked against the same SHA-256 hashes tiktoken pins, and nothing is
+fetched. Fill the directory on a connected machine with::
+
+    python -m summarizeGPT.tokenizer DIR
+
+Loaded encodings are kept for the life of the process, so the BPE ranks are
+parsed at most once however many summaries are made. Failures are kept for
+a few minutes as well, so a machine without network access does not retry
+the download for every summary.
+"""
+import argparse
+import base64
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger('SummarizeGPT')
+
+TOKENIZER_CACHE_ENV = 'SUMMARIZEGPT_TOKENIZER_CACHE'
+
+# How long a failed load is remembered before it is tried again
+FAILURE_RETRY_SECONDS = 300
+
+_BASE_URL = 'https://openaipublic.blob.core.windows.net/encodings/'
+_ENDOFTEXT = '<|endoftext|>'
+_FIM_PREFIX = '<|fim_prefix|>'
+_FIM_MIDDLE = '<|fim_middle|>'
+_FIM_SUFFIX = '<|fim_suffix|>'
+_ENDOFPROMPT = '<|endofprompt|>'
+_R50K_PATTERN = (
+    r"""'(?:[sdmt]|ll|ve|re)| ?\p{L}++| ?\p{N}++| ?[^\s\p{L}\p{N}]++|\s++$|\s+(?!\S)|\s"""
+)
+
+# The parameters of tiktoken's public encodings (tiktoken_ext.openai_public)
+ENCODINGS = {
+    'r50k_base': {
+        'sha256': '306cd27f03c1a714eca7108e03d66b7dc042abe8c258b44c199a7ed9838dd930',
+        'pat_str': _R50K_PATTERN,
+        'special_tokens': {_ENDOFTEXT: 50256},
+        'explicit_n_vocab': 50257,
+    },
+    'p50k_base': {
+        'sha256': '94b5ca7dff4d00767bc256fdd1b27e5b17361d7b8a5f968547f9f23eb70d2069',
+        'pat_str': _R50K_PATTERN,
+        'special_tokens': {_ENDOFTEXT: 50256},
+        'explicit_n_vocab': 50281,
+    },
+    'cl100k_base': {
+        'sha256': '223921b76ee99bde995b7ff738513eef100fb51d18c93597a113bcffe865b2a7',
+        'pat_str': (r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+|"""
+                    r""" ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""),
+        'special_tokens': {_ENDOFTEXT: 100257, _FIM_PREFIX: 100258, _FIM_MIDDLE: 100259,
+                           _FIM_SUFFIX: 100260, _ENDOFPROMPT: 100276},
+        'explicit_n_vocab': None,
+    },
+    'o200k_base': {
+        'sha256': '446a9538cb6c348e3516120d7c08b09f57c36495e2acfffe59a5bf8b0cfb1a2d',
+        'pat_str': '|'.join([
+            (r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+"""
+             r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)?"""),
+            (r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*"""
+             r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)?"""),
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]),
+        'special_tokens': {_ENDOFTEXT: 199999, _ENDOFPROMPT: 200018},
+        'explicit_n_vocab': None,
+    },
+}
+
+# ``_lock`` guards the dicts; a load holds only the lock of its own key
+_lock = threading.Lock()
+_load_locks = {}
+_encodings = {}
+_failures = {}
+
+
+class TokenizerError(Exception):
+    """Raised when an encoding cannot be loaded from the tokenizer cache."""
+
+
+def encoding_file(cache_dir, encoding_name):
+    """Return the path of ``encoding_name``'s BPE file in ``cache_dir``."""
+    return os.path.join(cache_dir, f"{encoding_name}.tiktoken")
+
+
+def encoding_url(encoding_name):
+    """Return the URL tiktoken downloads ``encoding_name``'s BPE file from."""
+    return f"{_BASE_URL}{encoding_name}.tiktoken"
+
+
+def get_encoding(encoding_name, cache_dir=None):
+    """
+    Return the tiktoken encoding called ``encoding_name``.
+
+    Args:
+        encoding_name (str): One of ``ENCODINGS`` with a cache directory,
+            any tiktoken encoding otherwise
+        cache_dir (str, optional): Directory holding ``<name>.tiktoken``
+            files; defaults to ``$SUMMARIZEGPT_TOKENIZER_CACHE``. Without
+            one, tiktoken loads (and may download) the encoding itself
+
+    Returns:
+        tiktoken.Encoding: The same object for every call with the same
+        arguments in this process
+
+    Raises:
+        TokenizerError: If the file is missing from the cache directory or
+            does not match its hash
+        Exception: Whatever tiktoken raises when it cannot load or download
+            the encoding; repeated within ``FAILURE_RETRY_SECONDS``
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(TOKENIZER_CACHE_ENV) or None
+    key = (encoding_name, os.path.abspath(cache_dir) if cache_dir else None)
+    encoding = _cached_encoding(key)
+    if encoding is not None:
+        return encoding
+    with _lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        # Another thread may have loaded it (or failed) in the meantime
+        encoding = _cached_encoding(key)
+        if encoding is not None:
+            return encoding
+        try:
+            encoding = _load_encoding(encoding_name, cache_dir)
+        except Exception as e:
+            with _lock:
+                _failures[key] = (time.monotonic(), e)
+            raise
+        with _lock:
+            _encodings[key] = encoding
+            _failures.pop(key, None)
+        return encoding
+
+
+def _cached_encoding(key):
+    # Return the loaded encoding, None to load it, or raise a recent failure
+    with _lock:
+        encoding = _encodings.get(key)
+        failed_at, error = _failures.get(key, (None, None))
+    if encoding is None and failed_at is not None \
+            and time.monotonic() - failed_at < FAILURE_RETRY_SECONDS:
+        raise error.with_traceback(None)
+    return encoding
+
+
+def _load_encoding(encoding_name, cache_dir):
+    import tiktoken
+
+    if cache_dir is None:
+        return tiktoken.get_encoding(encoding_name)
+    params = ENCODINGS.get(encoding_name)
+    if params is None:
+        raise TokenizerError(f"{encoding_name} cannot be loaded from a tokenizer cache "
+                             f"(supported: {', '.join(ENCODINGS)})")
+    path = encoding_file(cache_dir, encoding_name)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise TokenizerError(f"{encoding_name} is not in the tokenizer cache ({e}); fetch it "
+                             f"with: python -m summarizeGPT.tokenizer {cache_dir}") from e
+    if hashlib.sha256(data).hexdigest() != params['sha256']:
+        raise TokenizerError(f"{path} does not match the published {encoding_name} file")
+    logger.info(f"Loaded {encoding_name} from {path}")
+    return tiktoken.Encoding(encoding_name, pat_str=params['pat_str'],
+                             mergeable_ranks=parse_bpe_ranks(data),
+                             special_tokens=params['special_tokens'],
+                             explicit_n_vocab=params['explicit_n_vocab'])
+
+
+def parse_bpe_ranks(data):
+    """Parse a ``.tiktoken`` file: one base64 token and its rank per line."""
+    ranks = {}
+    for line in data.splitlines():
+        if line:
+            token, rank = line.split()
+            ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def fetch_encodings(cache_dir, encoding_names=None):
+    """
+    Download the BPE files of ``encoding_names`` (default: all of
+    ``ENCODINGS``) into ``cache_dir``, verifying their hashes. Files already
+    present and intact are kept.
+
+    Returns:
+        list[str]: The paths of the files in the cache
+    """
+    from urllib.request import urlopen
+
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = []
+    for name in encoding_names or ENCODINGS:
+        expected = ENCODINGS[name]['sha256']
+        path = encoding_file(cache_dir, name)
+        paths.append(path)
+        try:
+            with open(path, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() == expected:
+                    continue
+        except OSError:
+            pass
+        with urlopen(encoding_url(name)) as response:
+            data = response.read()
+        if hashlib.sha256(data).hexdigest() != expected:
+            raise TokenizerError(f"Downloaded {name} does not match its published hash")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Download tokenizer files for use with SummarizeGPT --tokenizer-cache.')
+    parser.add_argument('directory', help='The tokenizer cache directory to fill')
+    parser.add_argument('encodings', nargs='*',
+                        help=f"Encodings to fetch (default: all of {', '.join(ENCODINGS)})")
+    args = parser.parse_args()
+    unknown = [name for name in args.encodings if name not in ENCODINGS]
+    if unknown:
+        parser.error(f"unknown encoding: {', '.join(unknown)}")
+    try:
+        for path in fetch_encodings(args.directory, args.encodings):
+            print(path)
+    except (OSError, TokenizerError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Filesystem change notification for ``--watch``.
+
+On Linux, changes are received through inotify (via ctypes, so there is
+nothing to install); elsewhere, or when inotify is unavailable or out of
+watches, the tree is polled. Both watchers report :class:`Change` records,
+and :func:`wait_for_changes` debounces them so a burst of editor writes
+results in a single regeneration.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from collections import namedtuple
+
+logger = logging.getLogger('SummarizeGPT')
+
+# Quiet period that ends a burst of events, and the longest a burst may delay
+# a regeneration
+DEBOUNCE_SECONDS = 0.2
+MAX_DELAY_SECONDS = 2.0
+POLL_INTERVAL_SECONDS = 1.0
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+STRUCTURAL_MASK = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                   | IN_DELETE_SELF | IN_MOVE_SELF | IN_Q_OVERFLOW)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+Change = namedtuple('Change', ['path', 'structural'])
+Change.__doc__ = """
+A changed path. ``structural`` changes (files or directories created,
+deleted or moved) change the tree; other changes only modify contents. A
+``path`` of None means anything may have changed.
+"""
+
+
+class WatchError(Exception):
+    """Raised when a watcher cannot be set up."""
+
+
+class InotifyWatcher:
+    """Watch a set of directories (not recursively) with Linux inotify."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise WatchError("inotify is only available on Linux")
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise WatchError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise WatchError(os.strerror(ctypes.get_errno()))
+        self._paths = {}  # watch descriptor -> directory
+        self._watches = {}  # directory -> watch descriptor
+
+    def watch_directories(self, directories):
+        """Make the watched set exactly ``directories``."""
+        directories = set(directories)
+        for directory in list(self._watches):
+            if directory not in directories:
+                wd = self._watches.pop(directory)
+                self._paths.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+        for directory in directories - set(self._watches):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise WatchError("inotify watch limit reached "
+                                     "(see /proc/sys/fs/inotify/max_user_watches)")
+                # The directory may already be gone again
+                logger.debug(f"Cannot watch {directory}: {os.strerror(err)}")
+                continue
+            self._watches[directory] = wd
+            self._paths[wd] = directory
+
+    def wait(self, timeout):
+        """Return the changes that arrive within ``timeout`` seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 64 * 1024)
+        changes = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].split(b'\0', 1)[0]
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changes.append(Change(None, True))
+                continue
+            if mask & IN_IGNORED:
+                directory = self._paths.pop(wd, None)
+                self._watches.pop(directory, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            changes.append(Change(path, bool(mask & STRUCTURAL_MASK)))
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    Detect changes by comparing snapshots of the tree.
+
+    Args:
+        snapshot (callable): Returns ``{path: signature}`` for every file
+            and directory; a changed signature is a modification, an added
+            or removed path a structural change
+        interval (float): Seconds between snapshots
+    """
+
+    def __init__(self, snapshot, interval=POLL_INTERVAL_SECONDS):
+        self._snapshot = snapshot
+        self.interval = interval
+        self._state = snapshot()
+        self._next_poll = time.monotonic() + interval
+
+    def watch_directories(self, directories):
+        """Nothing to do: every poll covers the whole tree."""
+
+    def wait(self, timeout):
+        """Return the changes found by a snapshot taken within ``timeout`` seconds."""
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        if delay > 0:
+            time.sleep(delay)
+        self._next_poll = time.monotonic() + self.interval
+        state = self._snapshot()
+        previous, self._state = self._state, state
+        changes = [Change(path, True) for path in state.keys() ^ previous.keys()]
+        changes.extend(Change(path, False) for path, signature in state.items()
+                       if path in previous and previous[path] != signature)
+        return changes
+
+    def close(self):
+        pass
+
+
+def create_watcher(directories, snapshot, poll_interval=POLL_INTERVAL_SECONDS, polling=False):
+    """
+    Return an inotify watcher for ``directories``, or a polling watcher if
+    ``polling`` is set or inotify cannot be used.
+    """
+    if not polling:
+        watcher = None
+        try:
+            watcher = InotifyWatcher()
+            watcher.watch_directories(directories)
+            return watcher
+        except (WatchError, AttributeError, OSError) as e:
+            if watcher is not None:
+                watcher.close()
+            logger.info(f"inotify unavailable ({e}); polling every {poll_interval}s")
+    return PollingWatcher(snapshot, poll_interval)
+
+
+def wait_for_changes(watcher, stop, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+    """
+    Block until a burst of changes is over and return it.
+
+    The burst ends once no change has arrived for ``debounce`` seconds, or
+    ``max_delay`` seconds after it started.
+
+    Args:
+        watcher: An :class:`InotifyWatcher` or :class:`PollingWatcher`
+        stop (threading.Event): Return early (possibly with no changes) once set
+        debounce (float): Quiet period that ends a burst
+        max_delay (float): Longest time to wait after the first change
+
+    Returns:
+        dict: Changed path (or None) -> whether any change to it was structural
+    """
+    changes = {}
+    started = None
+    while not stop.is_set():
+        batch = watcher.wait(debounce if changes else 0.5)
+        for change in batch:
+            changes[change.path] = changes.get(change.path, False) or change.structural
+        if changes and started is None:
+            started = time.monotonic()
+        if changes and (not batch or time.monotonic() - started >= max_delay):
+            break
+    return changes
@@ -0,0 +1,108 @@
+"""
+Tests for summarizing tar and zip archives without extracting them.
+"""
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT.archive import Archive, scan_archive
+from summarizeGPT.summarizeGPT import Summarizer, output_file, scan_directory
+
+
+@pytest.fixture
+def project(temp_test_directory):
+    """A small tree with a .gitignore, an ignored directory and a binary file."""
+    root = os.path.join(temp_test_directory, "proj")
+    files = {
+        ".gitignore": "build/\n*.log\n",
+        "main.py": "print('main')\n",
+        "notes.log": "noise\n",
+        "build/out.py": "generated = True\n",
+        "pkg/.gitignore": "secret.py\n",
+        "pkg/mod.py": "x = 1\r\ny = 2\n",
+        "pkg/secret.py": "token = 'x'\n",
+        "pkg/data.bin": "\x00\x01\x02",
+        "docs/readme.md": "# Docs\n",
+    }
+    for name, text in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", newline="") as f:
+            f.write(text)
+    return root
+
+
+def make_archives(root):
+    """Pack ``root`` as a .tar.gz and a .zip, members in the order the directory is walked."""
+    files = [e.path for e in scan_directory(root) if not e.is_dir]
+    base = os.path.dirname(root)
+    tar_path, zip_path = os.path.join(base, "proj.tar.gz"), os.path.join(base, "proj.zip")
+    with tarfile.open(tar_path, "w:gz") as tar:
+        for path in files:
+            tar.add(path, arcname=os.path.relpath(path, root))
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in files:
+            zf.write(path, os.path.relpath(path, root))
+    return tar_path, zip_path
+
+
+def test_archive_summary_matches_extracted_tree(project):
+    """Test that tar.gz and zip summaries equal the directory's, with the same ignore rules."""
+    summarizer = Summarizer(auto_gitignore=True, count_tokens=False)
+    expected = summarizer.summarize(project)
+    assert "notes.log" not in expected and "secret.py" not in expected
+    for archive in make_archives(project):
+        summary = summarizer.summarize(archive)
+        summary = summary.replace(archive.replace("\\", "/"), project.replace("\\", "/"))
+        assert summary.replace(os.path.basename(archive) + "/\n", "proj/\n", 1) == expected
+        assert "[Skipped: binary file" in summary
+
+    tar_path, _ = make_archives(project)
+    sampled = Summarizer(include_exts=["py"], head=1, count_tokens=False).summarize(tar_path)
+    assert "## " + tar_path.replace("\\", "/") + "/pkg/mod.py\n\n```\nx = 1\n[... truncated" in sampled
+    assert "readme.md\n\n" not in sampled
+
+
+def test_only_emitted_members_are_read(project):
+    """Test that filtered, ignored and oversized members are never decompressed, and others once."""
+    tar_path, _ = make_archives(project)
+    read = Archive._read_member
+    with patch.object(Archive, "_read_member", autospec=True, side_effect=read) as mock_read:
+        Summarizer(gitignore_file=os.path.join(project, ".gitignore"), include_exts=["py"],
+                   max_file_bytes=13, count_tokens=False, jobs=2).summarize(tar_path)
+    names = [call.args[1].name for call in mock_read.call_args_list]
+    # main.py is over --max-file-bytes, build/out.py is ignored, the rest is filtered
+    assert sorted(names) == ["pkg/mod.py", "pkg/secret.py"]
+
+
+def test_scan_skips_unsafe_members(temp_test_directory):
+    """Test that members escaping the root, links and implied directories are handled."""
+    path = os.path.join(temp_test_directory, "odd.tar")
+    with tarfile.open(path, "w") as tar:
+        for name in ("../evil.py", "/abs/a.py", "deep/er/b.py"):
+            info = tarfile.TarInfo(name)
+            info.size = 1
+            tar.addfile(info, io.BytesIO(b"x"))
+        link = tarfile.TarInfo("link.py")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "/etc/passwd"
+        tar.addfile(link)
+    entries = scan_archive(path)
+    rel = [(e.path[len(path) + 1:], e.depth, e.is_dir) for e in entries[1:]]
+    assert rel == [("abs", 2, True), ("abs/a.py", 2, False), ("deep", 2, True),
+                   ("deep/er", 3, True), ("deep/er/b.py", 3, False)]
+
+
+def test_cli_writes_output_next_to_archive(project):
+    """Test that the output file goes beside the archive and --watch is refused."""
+    from summarizeGPT.summarizeGPT import main
+    tar_path, _ = make_archives(project)
+    with patch("sys.argv", ["SummarizeGPT", tar_path, "--no-tokens", "--no-cache"]):
+        main()
+    with open(os.path.join(os.path.dirname(tar_path), output_file), encoding="utf-8") as f:
+        assert "print('main')" in f.read()
+    with patch("sys.argv", ["SummarizeGPT", tar_path, "--watch"]), pytest.raises(SystemExit):
+        main()
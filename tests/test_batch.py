@@ -0,0 +1,129 @@
+"""
+Tests for ``SummarizeGPT batch``: many roots in a process pool.
+"""
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT import batch
+from summarizeGPT.batch import batch_main, output_paths, read_manifest, summarize_root
+from summarizeGPT.summarizeGPT import Summarizer, TokenCache, output_file
+
+
+@pytest.fixture
+def roots(temp_test_directory):
+    """Two small service directories."""
+    paths = []
+    for name in ("alpha", "beta"):
+        root = os.path.join(temp_test_directory, name)
+        os.makedirs(root)
+        with open(os.path.join(root, "main.py"), "w") as f:
+            f.write(f"print('{name}')\n")
+        paths.append(root)
+    return paths
+
+
+def test_manifest_and_output_names(temp_test_directory):
+    """Test that manifests skip comments and that output names never collide."""
+    manifest = os.path.join(temp_test_directory, "roots.txt")
+    with open(manifest, "w") as f:
+        f.write("# nightly\nsvc/a\n\n  /abs/b  \n")
+    assert read_manifest(manifest) == [os.path.join(temp_test_directory, "svc/a"), "/abs/b"]
+    assert output_paths(["x/api", "y/api", "z/web/"], "out") == [
+        os.path.join("out", "api.md"), os.path.join("out", "api-2.md"),
+        os.path.join("out", "web.md")]
+    assert output_paths(["x/api"]) == [os.path.join("x/api", output_file)]
+
+
+def test_failures_are_isolated(roots, temp_test_directory):
+    """Test that a failing root is reported without affecting the others."""
+    missing = os.path.join(temp_test_directory, "missing")
+    with patch.object(batch, "_summarizer", Summarizer(count_tokens=False)):
+        good = summarize_root(roots[0], os.path.join(roots[0], output_file))
+        bad = summarize_root(missing, os.path.join(missing, output_file))
+    assert good["error"] is None and good["stats"]["lines"] > 0
+    assert bad["stats"] is None and "Not a directory" in bad["error"]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_revisions_bypass_the_file_index(temp_test_directory):
+    """Test that a revision is read from git, not from index rows of the working tree."""
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com",
+                        *args], cwd=root, check=True, stdout=subprocess.PIPE,
+                       stderr=subprocess.PIPE)
+
+    root = os.path.join(temp_test_directory, "repo")
+    os.makedirs(root)
+    git("init", "-q")
+    path = os.path.join(root, "main.py")
+    for version in ("v1 = 1\n", "v2 = 2\n"):
+        with open(path, "w") as f:
+            f.write(version)
+        git("add", "main.py")
+        git("commit", "-q", "-m", version)
+    # Old enough for the index to store, with the same size as v1
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    output = os.path.join(temp_test_directory, "out.md")
+
+    for options, expected in (({"revision": "HEAD~1"}, "v1 = 1"), ({"revision": "HEAD"}, "v2 = 2"),
+                              ({}, "v2 = 2"), ({"revision": "HEAD~1"}, "v1 = 1")):
+        summarizer = Summarizer(count_tokens=False, cache_dir=cache_dir, **options)
+        with patch.object(batch, "_summarizer", summarizer):
+            assert summarize_root(root, output)["error"] is None
+        with open(output, encoding="utf-8") as f:
+            assert expected in f.read()
+
+
+def test_workers_merge_their_token_counts(temp_test_directory):
+    """Test that each worker's save keeps the counts other workers saved meanwhile."""
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    encoding = type("WordEncoding", (), {"encode": lambda self, text, **kwargs: text.split()})()
+    with patch("summarizeGPT.summarizeGPT.load_encoding", return_value=encoding):
+        # Both workers start before either has saved
+        workers = [TokenCache("cl100k_base", cache_dir) for _ in range(2)]
+        workers[0].count("alpha section")
+        workers[1].count("beta section text")
+        for worker in workers:
+            worker.save()
+        cache = TokenCache("cl100k_base", cache_dir)
+        assert cache.count("alpha section") == 2 and cache.count("beta section text") == 3
+    assert cache.hits == 2 and cache.misses == 0
+
+
+def test_batch_runs_roots_in_worker_processes(roots, temp_test_directory, capsys):
+    """Test the CLI end to end: one output per root, a combined report, exit status 1."""
+    missing = os.path.join(temp_test_directory, "missing")
+    manifest = os.path.join(temp_test_directory, "roots.txt")
+    with open(manifest, "w") as f:
+        f.write(f"{roots[1]}\n{missing}\n")
+    report_path = os.path.join(temp_test_directory, "report.json")
+    out_dir = os.path.join(temp_test_directory, "out")
+
+    with pytest.raises(SystemExit) as exit_info:
+        batch_main([roots[0], "--manifest", manifest, "--workers", "2", "--no-tokens",
+                    "--no-cache", "--output-dir", out_dir, "--report", report_path])
+    assert exit_info.value.code == 1
+
+    for name in ("alpha", "beta"):
+        with open(os.path.join(out_dir, f"{name}.md"), encoding="utf-8") as f:
+            assert f"print('{name}')" in f.read()
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    assert [r["root"] for r in report["roots"]] == [roots[0], roots[1], missing]
+    assert report["totals"]["succeeded"] == 2 and report["totals"]["failed"] == 1
+    assert report["totals"]["lines"] == sum(r["stats"]["lines"] for r in report["roots"][:2])
+    assert "FAILED" in capsys.readouterr().out
+
+
+def test_console_script_dispatches_batch(roots):
+    """Test that ``SummarizeGPT batch ...`` reaches batch mode, not the single-root parser."""
+    from summarizeGPT.summarizeGPT import main
+    with patch("sys.argv", ["SummarizeGPT", "batch", *roots, "--no-cache"]), \
+            patch("summarizeGPT.batch.batch_main") as mock_batch:
+        main()
+    mock_batch.assert_called_once_with([*roots, "--no-cache"])
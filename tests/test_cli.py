@@ -1,32 +1,20 @@
 """
 Command-line interface tests for summarizeGPT.
 """
+import json
 import os
+import subprocess
 import sys
 import pytest
 from unittest.mock import patch, MagicMock
 
-from summarizeGPT.summarizeGPT import main, output_file
+from summarizeGPT.summarizeGPT import build_parser, main, output_file
 
 
 @pytest.fixture
 def mock_args():
-    """Mock command line arguments."""
-    return {
-        "directory": "/mock/dir",
-        "gitignore": None,
-        "auto_gitignore": False,
-        "include": None,
-        "exclude": None,
-        "show_docker": False,
-        "show_only_docker": False,
-        "max_lines": None,
-        "encoding": "cl100k_base",
-        "verbose": False,
-        "tree_depth": None,
-        "file_depth": None,
-        "max_depth": None
-    }
+    """Mock command line arguments, with the parser's defaults."""
+    return vars(build_parser().parse_args(["/mock/dir", "--no-cache"]))
 
 
 @patch('argparse.ArgumentParser.parse_args')
@@ -161,4 +149,159 @@ def test_basic_integration(mock_parse_args, mock_run, mock_args, temp_test_direc
         content = f.read()
         assert os.path.basename(temp_test_directory) in content
         assert "test.txt" in content
-        assert "test content" in content
\ No newline at end of file
+        assert "test content" in content
+
+@patch('argparse.ArgumentParser.parse_args')
+def test_stdout_option(mock_parse_args, mock_args, temp_test_directory, sample_file,
+                       silence_logging, capsys):
+    """Test that --stdout streams the summary instead of writing the output file."""
+    args = mock_args.copy()
+    args["directory"] = temp_test_directory
+    args["stdout"] = True
+
+    mock_args_obj = MagicMock()
+    for key, value in args.items():
+        setattr(mock_args_obj, key, value)
+
+    mock_parse_args.return_value = mock_args_obj
+
+    main()
+
+    captured = capsys.readouterr()
+    assert "test content" in captured.out
+    assert "Summary Statistics:" in captured.err
+    assert not os.path.exists(os.path.join(temp_test_directory, output_file))
+
+
+@patch('argparse.ArgumentParser.parse_args')
+def test_token_cache_and_breakdown(mock_parse_args, mock_args, temp_test_directory, sample_file,
+                                   silence_logging, capsys):
+    """Test that token counts are cached on disk and broken down per file."""
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    args = mock_args.copy()
+    args["directory"] = temp_test_directory
+    args["cache_dir"] = cache_dir
+    args["no_cache"] = False
+
+    mock_args_obj = MagicMock()
+    for key, value in args.items():
+        setattr(mock_args_obj, key, value)
+
+    mock_parse_args.return_value = mock_args_obj
+
+    fake_encoding = MagicMock()
+    fake_encoding.encode.side_effect = lambda text, **kwargs: text.split()
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=fake_encoding):
+        main()
+
+    captured = capsys.readouterr()
+    assert "Approximate Tokens (cl100k_base):" in captured.out
+    assert "Largest Files by Tokens:" in captured.out
+    assert "test.txt" in captured.out.split("Largest Files by Tokens:")[1]
+    assert os.path.exists(os.path.join(cache_dir, "tokens-cl100k_base.json"))
+
+
+@patch('argparse.ArgumentParser.parse_args')
+def test_stats_json_option(mock_parse_args, mock_args, temp_test_directory, sample_file,
+                           silence_logging, capsys):
+    """Test that --stats-json records phases, file counts and memory of the run."""
+    stats_path = os.path.join(temp_test_directory, "stats.json")
+    args = mock_args.copy()
+    args["directory"] = temp_test_directory
+    args["stdout"] = True
+    args["stats_json"] = stats_path
+
+    mock_args_obj = MagicMock()
+    for key, value in args.items():
+        setattr(mock_args_obj, key, value)
+
+    mock_parse_args.return_value = mock_args_obj
+
+    main()
+
+    with open(stats_path) as f:
+        report = json.load(f)
+    assert {"scan", "read", "render", "write"} <= set(report["phases"])
+    assert report["files"]["emitted"] == 1
+    assert report["bytes_read"] == len("test content")
+    assert report["memory"]["tracemalloc_peak_bytes"] > 0
+    assert report["top_files"]["by_bytes"][0][0].endswith("test.txt")
+    assert report["output"]["chars"] == len(capsys.readouterr().out)
+
+
+@patch('argparse.ArgumentParser.parse_args')
+def test_shard_tokens_option(mock_parse_args, mock_args, temp_test_directory, sample_file,
+                             silence_logging, capsys):
+    """Test that --shard-tokens writes numbered parts and rejects --no-tokens."""
+    args = mock_args.copy()
+    args["directory"] = temp_test_directory
+    args["shard_tokens"] = 1000
+
+    mock_args_obj = MagicMock()
+    for key, value in args.items():
+        setattr(mock_args_obj, key, value)
+    mock_parse_args.return_value = mock_args_obj
+
+    fake_encoding = MagicMock()
+    fake_encoding.encode.side_effect = lambda text, **kwargs: text.split()
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=fake_encoding):
+        main()
+
+    shard = os.path.join(temp_test_directory, "Context_for_ChatGPT.part-001.md")
+    assert capsys.readouterr().out.rstrip().endswith(shard)
+    with open(shard, encoding="utf-8") as f:
+        assert "test content" in f.read()
+    assert not os.path.exists(os.path.join(temp_test_directory, output_file))
+
+    mock_args_obj.no_tokens = True
+    with patch('sys.exit', side_effect=SystemExit(1)):
+        with pytest.raises(SystemExit):
+            main()
+
+
+@patch('argparse.ArgumentParser.parse_args')
+def test_watch_option(mock_parse_args, mock_args, temp_test_directory):
+    """Test that --watch hands over to watch_directory and rejects --stdout."""
+    args = mock_args.copy()
+    args["directory"] = temp_test_directory
+    args["watch"] = True
+    args["poll_interval"] = 0.5
+
+    mock_args_obj = MagicMock()
+    for key, value in args.items():
+        setattr(mock_args_obj, key, value)
+    mock_parse_args.return_value = mock_args_obj
+
+    with patch('summarizeGPT.summarizeGPT.watch_directory') as mock_watch:
+        mock_watch.side_effect = KeyboardInterrupt
+        main()
+    summarizer, directory, prompt_file = mock_watch.call_args.args
+    assert summarizer.encoding_name == "cl100k_base"
+    assert prompt_file == os.path.join(temp_test_directory, output_file)
+    assert mock_watch.call_args.kwargs["polling"] is True
+    assert mock_watch.call_args.kwargs["poll_interval"] == 0.5
+
+    mock_args_obj.stdout = True
+    with patch('summarizeGPT.summarizeGPT.watch_directory') as mock_watch:
+        with pytest.raises(SystemExit):
+            main()
+    mock_watch.assert_not_called()
+
+
+def test_no_tokens_never_imports_tokenizer(temp_test_directory, sample_file):
+    """Test that --no-tokens runs without importing tiktoken at all."""
+    script = (
+        "import sys\n"
+        "from summarizeGPT.summarizeGPT import main\n"
+        f"sys.argv = ['SummarizeGPT', {temp_test_directory!r}, '--no-tokens', '--no-cache']\n"
+        "main()\n"
+        "assert 'tiktoken' not in sys.modules, 'tiktoken was imported'\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True,
+                            text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert "Total Lines:" in result.stdout
+    assert "Approximate Tokens" not in result.stdout
+    with open(os.path.join(temp_test_directory, output_file), encoding="utf-8") as f:
+        assert "test content" in f.read()
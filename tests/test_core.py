@@ -9,11 +9,29 @@ from summarizeGPT.summarizeGPT import (
     summarize_directory,
     get_tree_view,
     get_file_contents,
+    scan_directory,
+    iter_summary,
+    iter_with_stats,
+    new_summary_stats,
+    iter_parallel,
+    pack_sections,
+    Section,
+    TokenCache,
+    FileIndex,
+    iter_summary_sections,
+    read_file_text,
     setup_logging,
     discover_gitignore,
     output_file,
-    logger
+    logger,
+    Summarizer,
+    write_shards,
+    shard_path,
+    find_duplicates,
 )
+from summarizeGPT import summarizeGPT as summarizeGPT_module
+from summarizeGPT.ignore import load_rules
+from summarizeGPT.instrument import Recorder
 
 
 def test_summarize_directory_basic(temp_test_directory, sample_file):
@@ -66,6 +84,26 @@ def test_tree_view_depth_limiting(nested_directory_structure):
     assert "level2.txt" in tree
 
 
+def test_tree_collapse_summarizes_large_directories(temp_test_directory):
+    """Test that crowded directories become one line with their aggregates, in sorted order."""
+    for path, text in [("src/b.py", "b"), ("src/a.py", "a"), ("data/x/1.json", "{}"),
+                       *[(f"data/{i}.json", "{}" * 10) for i in range(4)], ("data/notes", "n")]:
+        os.makedirs(os.path.join(temp_test_directory, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(temp_test_directory, path), "w") as f:
+            f.write(text)
+    base = os.path.basename(temp_test_directory)
+
+    assert get_tree_view(temp_test_directory, collapse=5) == (
+        f"{base}/\n"
+        "    data/ (6 files, 83 bytes: .json 83%, no extension 17%)\n"
+        "    src/\n"
+        "        a.py\n"
+        "        b.py\n")
+    tree = get_tree_view(temp_test_directory, collapse=6)
+    assert "    data/\n        0.json\n" in tree and "        x/\n            1.json\n" in tree
+    assert get_tree_view(temp_test_directory, collapse=0).count("\n") == 3
+
+
 def test_file_contents_depth_limiting(nested_directory_structure):
     """Test file contents depth limiting."""
     # Test with depth=1 (only root)
@@ -81,6 +119,397 @@ def test_file_contents_depth_limiting(nested_directory_structure):
     assert "level2 content" not in contents
 
 
+def test_scan_directory_records_ignore_decisions(nested_directory_structure, gitignore_in_root):
+    """Test that a single scan records entries, depths and gitignore decisions."""
+    os.makedirs(os.path.join(nested_directory_structure, "build"))
+    os.makedirs(os.path.join(nested_directory_structure, ".git"))
+    with open(os.path.join(nested_directory_structure, "debug.log"), "w") as f:
+        f.write("log")
+    with open(gitignore_in_root, "a") as f:
+        f.write("build/\n")
+
+    entries = scan_directory(nested_directory_structure, gitignore_in_root)
+    by_name = {entry.name: entry for entry in entries}
+
+    assert entries[0].path == nested_directory_structure
+    assert entries[0].depth == 1
+    assert by_name["root.txt"].depth == 1 and not by_name["root.txt"].ignored
+    assert by_name["level1"].is_dir and by_name["level1"].depth == 2
+    assert by_name["level2.txt"].depth == 3
+    assert by_name["debug.log"].ignored
+    assert by_name["build"].ignored
+    assert ".git" not in by_name
+    assert by_name["root.txt"].stat().st_size == len("root content")
+
+
+def test_summarize_directory_scans_once(nested_directory_structure):
+    """Test that the tree view and file contents share one traversal."""
+    with patch('os.scandir', wraps=os.scandir) as mock_scandir:
+        result = summarize_directory(nested_directory_structure)
+    assert mock_scandir.call_count == 3  # root, level1, level2
+    assert "level2.txt" in result
+    assert "level2 content" in result
+
+
+def test_iter_summary_matches_summarize_directory(nested_directory_structure):
+    """Test that the streamed fragments join to the full summary."""
+    fragments = list(iter_summary(nested_directory_structure))
+    assert len(fragments) > 1
+    assert "".join(fragments) == summarize_directory(nested_directory_structure)
+
+
+def test_iter_with_stats_counts_incrementally():
+    """Test that statistics are accumulated section by section."""
+    fake_encoding = MagicMock()
+    fake_encoding.encode.side_effect = lambda text, **kwargs: text.split()
+    stats = new_summary_stats("cl100k_base")
+    sections = [Section(None, "# Title\n\n"), Section("a.txt", "two words\n"), Section(None, "é\n")]
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=fake_encoding):
+        passed = list(iter_with_stats(sections, stats, TokenCache("cl100k_base")))
+
+    assert passed == sections
+    assert stats["lines"] == 4
+    assert stats["chars"] == 21
+    assert stats["bytes"] == 22
+    assert stats["tokens"] == 5
+    assert stats["file_tokens"] == {"a.txt": 2}
+
+
+def test_iter_with_stats_without_encoding():
+    """Test that a missing tokenizer leaves the token count unset."""
+    stats = new_summary_stats("cl100k_base")
+    with patch('summarizeGPT.summarizeGPT.load_encoding', side_effect=ValueError("offline")):
+        with patch('logging.Logger.error'):
+            list(iter_with_stats([Section(None, "text\n")], stats, TokenCache("cl100k_base")))
+    assert stats["tokens"] is None
+    assert stats["lines"] == 1
+
+
+def test_token_cache_persists_counts(temp_test_directory):
+    """Test that unchanged sections are counted from the on-disk cache."""
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    fake_encoding = MagicMock()
+    fake_encoding.encode.side_effect = lambda text, **kwargs: text.split()
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=fake_encoding):
+        cache = TokenCache("cl100k_base", cache_dir)
+        assert cache.count("one two three") == 3
+        assert cache.misses == 1
+        cache.save()
+
+        fake_encoding.encode.reset_mock()
+        cache = TokenCache("cl100k_base", cache_dir)
+        assert cache.count("one two three") == 3
+        assert cache.hits == 1 and cache.misses == 0
+        fake_encoding.encode.assert_not_called()
+
+    assert os.path.exists(os.path.join(cache_dir, "tokens-cl100k_base.json"))
+
+
+def test_file_index_reuses_unchanged_sections(temp_test_directory):
+    """Test that re-runs only re-read changed files and forget removed ones."""
+    source_dir = os.path.join(temp_test_directory, "src")
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    os.makedirs(source_dir)
+    for name in ("a.txt", "b.txt", "c.txt"):
+        path = os.path.join(source_dir, name)
+        with open(path, "w") as f:
+            f.write(f"{name} v1")
+        os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+
+    def run():
+        index = FileIndex(cache_dir, source_dir)
+        text = "".join(s.text for s in iter_summary_sections(source_dir, file_index=index))
+        index.close()
+        return index, text
+
+    first_index, first = run()
+    assert first_index.misses == 3 and first_index.hits == 0
+
+    b_path = os.path.join(source_dir, "b.txt")
+    with open(b_path, "w") as f:
+        f.write("b.txt v2 changed")
+    os.utime(b_path, ns=(2_000_000_000, 2_000_000_000))
+    os.remove(os.path.join(source_dir, "c.txt"))
+
+    with patch('summarizeGPT.summarizeGPT.read_file_text', wraps=read_file_text) as mock_read:
+        second_index, second = run()
+    assert second_index.hits == 1 and second_index.misses == 1
+    assert mock_read.call_count == 1
+    assert "a.txt v1" in second and "b.txt v2 changed" in second
+    assert "c.txt v1" not in second
+    assert second == summarize_directory(source_dir)
+
+
+def test_file_index_headings_follow_the_root_spelling(temp_test_directory, monkeypatch):
+    """Test that a relative and then an absolute root get their own headings from the index."""
+    source_dir = os.path.join(temp_test_directory, "proj")
+    cache_dir = os.path.join(temp_test_directory, "cache")
+    os.makedirs(source_dir)
+    path = os.path.join(source_dir, "a.py")
+    with open(path, "w") as f:
+        f.write("# note\nx = 1\n")
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    monkeypatch.chdir(source_dir)
+
+    texts = []
+    for root, hits in ((".", 0), (source_dir, 1)):
+        index = FileIndex(cache_dir, root)
+        summarizer = Summarizer(minify=True, count_tokens=False)
+        texts.append("".join(s.text for s in summarizer.iter_sections(root, file_index=index)))
+        index.close()
+        assert index.hits == hits
+    assert "## ./a.py\n" in texts[0]
+    assert f"## {source_dir}/a.py\n" in texts[1] and "./a.py" not in texts[1]
+    assert texts[1] == Summarizer(minify=True, count_tokens=False).summarize(source_dir)
+
+
+def test_parallel_file_contents_match_serial(temp_test_directory):
+    """Test that --jobs output is byte-for-byte identical to the serial walk."""
+    for i in range(25):
+        subdir = os.path.join(temp_test_directory, f"dir{i % 4}")
+        os.makedirs(subdir, exist_ok=True)
+        with open(os.path.join(subdir, f"file{i}.txt"), "w") as f:
+            f.write(f"content {i}\n" * (i + 1))
+
+    serial = get_file_contents(temp_test_directory)
+    assert get_file_contents(temp_test_directory, jobs=4) == serial
+    assert summarize_directory(temp_test_directory, jobs=3) == summarize_directory(temp_test_directory)
+
+
+def test_iter_parallel_preserves_order_with_small_budget(nested_directory_structure):
+    """Test that the in-flight byte cap does not reorder results."""
+    entries = [e for e in scan_directory(nested_directory_structure) if not e.is_dir]
+    results = list(iter_parallel(lambda e: e.name, entries, jobs=2, max_in_flight_bytes=1))
+    assert results == [e.name for e in entries]
+
+
+class CharEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per character."""
+
+    def encode(self, text, **kwargs):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def test_pack_sections_strategies():
+    """Test the walk-order, smallest-first and knapsack packing strategies."""
+    sizes = [50, 10, 30, 20]
+
+    kept, truncated = pack_sections(sizes, 60, "order")
+    assert kept == {0, 1}
+    assert truncated is None
+
+    kept, truncated = pack_sections(sizes, 60, "smallest")
+    assert kept == {1, 2, 3}
+
+    kept, truncated = pack_sections(sizes, 60, "knapsack", values=[10.0, 1.0, 1.0, 1.0])
+    assert kept == {0, 1}
+
+    kept, truncated = pack_sections([10, 200], 100, "order")
+    assert kept == {0}
+    assert truncated == (1, 90)
+
+    with pytest.raises(ValueError):
+        pack_sections(sizes, 60, "largest")
+
+
+def test_max_tokens_packs_files_and_lists_omitted(temp_test_directory):
+    """Test that --max-tokens keeps the summary within budget and lists dropped files."""
+    for name, size in [("a.txt", 40), ("b.txt", 400), ("c.txt", 30)]:
+        with open(os.path.join(temp_test_directory, name), "w") as f:
+            f.write(name[0] * size)
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=CharEncoding()):
+        full = summarize_directory(temp_test_directory, max_tokens=10000)
+        packed = summarize_directory(temp_test_directory, max_tokens=len(full) - 200,
+                                     pack_strategy="smallest")
+
+    assert "b" * 400 not in packed
+    assert "a" * 40 in packed and "c" * 30 in packed
+    assert "Truncated:" in packed
+    assert "b.txt (" in packed.split("Truncated:")[1]
+    assert len(packed) <= len(full) - 200
+    assert "## Omitted from" not in full
+
+
+def test_max_tokens_budget_covers_the_trailer(temp_test_directory):
+    """Test that the output, trailer included, fits the budget and the trailer is capped."""
+    for i in range(60):
+        with open(os.path.join(temp_test_directory, f"f{i:02}.py"), "w") as f:
+            f.write(f"# comment {i}\nvalue = {i}\n" * 20)
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=CharEncoding()):
+        for max_tokens in (1500, 3000, 9000):
+            packed = summarize_directory(temp_test_directory, max_tokens=max_tokens)
+            assert len(packed) <= max_tokens
+            assert "more files (" in packed or "- 60 files (" in packed
+            assert packed.count(".py (") <= 21
+        stats = new_summary_stats()
+        sections = Summarizer(max_tokens=3000, minify=True).iter_sections(temp_test_directory)
+        packed = "".join(s.text for s in iter_with_stats(sections, stats, TokenCache()))
+        assert len(packed) <= 3000 and "Truncated:" in packed
+        python = stats["minified"]["python"]
+        # Every file section, the truncated one included, minus the tree view
+        assert python["files"] == packed.count("\n```\n\n") - 1
+        assert python["bytes_after"] < python["bytes_before"]
+
+        with patch.object(logger, "warning") as mock_warning:
+            packed = summarize_directory(temp_test_directory, max_tokens=100)
+        assert "## f00.py" not in packed
+        assert "alone take" in mock_warning.call_args_list[0].args[0]
+
+
+def test_shards_pack_whole_files_within_budget(temp_test_directory):
+    """Test that --shard-tokens splits only oversized files and keeps every shard in budget."""
+    source = os.path.join(temp_test_directory, "src")
+    os.makedirs(source)
+    for name, text in [("a.txt", "a" * 60), ("b.txt", "b" * 60), ("c.txt", "c" * 60),
+                       ("d.txt", "".join(f"line {i:02d}\n" for i in range(60)))]:
+        with open(os.path.join(source, name), "w") as f:
+            f.write(text)
+    prompt_file = os.path.join(temp_test_directory, output_file)
+    stale = shard_path(prompt_file, 9)
+    open(stale, "w").close()
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=CharEncoding()):
+        token_cache = TokenCache()
+        shards = write_shards(prompt_file, iter_summary_sections(source), 250, token_cache,
+                              directory=source)
+
+    texts = []
+    for number, (path, tokens) in enumerate(shards, 1):
+        assert path == shard_path(prompt_file, number)
+        with open(path, encoding="utf-8") as f:
+            texts.append(f.read())
+        assert tokens == len(texts[-1]) <= 250
+    assert texts[0].startswith(f"# Summary of directory: {source}") and "d.txt" in texts[0]
+    assert texts[1].startswith(f"# Summary of directory: {source} (part 002)")
+    for letter in "abc":
+        assert sum(letter * 60 in text for text in texts) == 1
+    d_parts = [text for text in texts if "line 00" in text or "(continued)" in text]
+    assert len(d_parts) > 1
+    assert all(text.count("```") % 2 == 0 for text in texts)
+    assert all(f"line {i:02d}\n" in "".join(texts) for i in range(60))
+    assert not os.path.exists(stale)
+
+
+def test_dedup_emits_identical_files_once(temp_test_directory):
+    """Test that only same-size files are hashed and later copies become stubs."""
+    body = "def helper():\n    return 42\n" * 20
+    for path, text in [("a/util.py", body), ("b/util.py", body), ("c/util.py", body),
+                       ("c/other.py", body.replace("42", "43")), ("d/unique.py", "x = 1\n")]:
+        os.makedirs(os.path.join(temp_test_directory, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(temp_test_directory, path), "w") as f:
+            f.write(text)
+
+    entries = [e for e in scan_directory(temp_test_directory) if not e.is_dir]
+    with patch('summarizeGPT.summarizeGPT._content_hash',
+               wraps=summarizeGPT_module._content_hash) as mock_hash:
+        duplicates = find_duplicates(entries)
+    hashed = {os.path.basename(os.path.dirname(call.args[0].path)) + "/" + call.args[0].name
+              for call in mock_hash.call_args_list}
+    assert hashed == {"a/util.py", "b/util.py", "c/util.py", "c/other.py"}
+    copies = [e.path for e in entries if e.name == "util.py"]
+    original = copies[0].replace("\\", "/")
+    assert sorted(duplicates) == sorted(copies[1:])
+    assert set(duplicates.values()) == {original}
+
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=CharEncoding()):
+        stats = new_summary_stats()
+        sections = iter_summary_sections(temp_test_directory, dedup=True)
+        text = "".join(s.text for s in iter_with_stats(sections, stats, TokenCache()))
+    assert text.count("return 42") == 20
+    assert text.count(f"[Identical to {original}]") == 2
+    assert stats["duplicates"] == 2
+    assert len(body) < stats["duplicate_bytes_saved"] < 2 * len(body)
+    assert stats["duplicate_tokens_saved"] == stats["duplicate_bytes_saved"]
+    assert summarize_directory(temp_test_directory).count("return 42") == 60
+
+
+def test_binary_and_oversized_files_get_placeholders(temp_test_directory):
+    """Test that binary and oversized files are sniffed, not read, and still listed."""
+    files = {
+        "text.txt": b"plain text",
+        "weights.bin": b"\x00\x01\x02" * 1000,
+        "image.png": b"\x89PNG\r\n\x1a\n" + b"pixels" * 100,
+        "big.txt": b"x" * 5000,
+    }
+    for name, data in files.items():
+        with open(os.path.join(temp_test_directory, name), "wb") as f:
+            f.write(data)
+
+    with patch('summarizeGPT.summarizeGPT.read_file_text',
+               wraps=read_file_text) as mock_read:
+        result = get_file_contents(temp_test_directory, max_file_bytes=4096)
+
+    assert [call.args[0].name for call in mock_read.call_args_list] == ["text.txt"]
+    assert "plain text" in result
+    assert "weights.bin\n\n[Skipped: binary file, 2.9 KiB]" in result
+    assert "image.png\n\n[Skipped: binary file, 608 bytes]" in result
+    assert "big.txt\n\n[Skipped: larger than --max-file-bytes, 4.9 KiB]" in result
+    assert "x" * 5000 not in result
+    assert "x" * 5000 in get_file_contents(temp_test_directory)
+
+
+def test_recorder_hooks_receive_phases_and_files(temp_test_directory):
+    """Test the instrumentation hook API on the library functions."""
+    with open(os.path.join(temp_test_directory, ".gitignore"), "w") as f:
+        f.write("ignored/\n")
+    os.makedirs(os.path.join(temp_test_directory, "ignored"))
+    for name, data in [("a.py", b"print('a')\n"), ("blob.bin", b"\x00\x01"),
+                       ("notes.md", b"notes\n"), ("ignored/x.py", b"x\n")]:
+        with open(os.path.join(temp_test_directory, name), "wb") as f:
+            f.write(data)
+
+    events = []
+    recorder = Recorder(hooks=[lambda event, data: events.append((event, data))])
+    summarize_directory(temp_test_directory, os.path.join(temp_test_directory, ".gitignore"),
+                        include_exts=[".py", ".bin"], recorder=recorder)
+    report = recorder.finish()
+
+    files = {os.path.basename(data["path"]): data for event, data in events if event == "file"}
+    assert files["a.py"]["status"] == "emitted"
+    assert files["a.py"]["bytes_read"] == len("print('a')\n")
+    assert files["blob.bin"]["status"] == "skipped"
+    assert files["blob.bin"]["reason"] == "binary file"
+    assert {"scan", "ignore", "read", "render"} <= set(report["phases"])
+    assert report["files"]["pruned_dirs"] == 1
+    assert report["files"]["emitted"] == 1
+    assert report["files"]["skipped"] == 1
+    assert report["files"]["filtered"] == 2  # notes.md and .gitignore
+    assert events[-1] == ("finish", report)
+
+
+def test_summarizer_reuses_compiled_configuration(nested_directory_structure, gitignore_in_root):
+    """Test that a Summarizer matches the module functions and compiles its ignore file once."""
+    with open(os.path.join(nested_directory_structure, "skip.log"), "w") as f:
+        f.write("ignored")
+    summarizer = Summarizer(gitignore_file=gitignore_in_root, include_exts=["TXT", ".log"])
+    assert summarizer.include_exts == frozenset({".txt", ".log"})
+
+    expected = summarize_directory(nested_directory_structure, gitignore_in_root,
+                                   include_exts=[".txt", ".log"])
+    hits = load_rules.cache_info().hits
+    assert summarizer.summarize(nested_directory_structure) == expected
+    assert summarizer.summarize(nested_directory_structure) == expected
+    assert load_rules.cache_info().hits >= hits + 2
+    assert "skip.log" not in expected
+    assert "level2 content" in expected
+
+    level1 = os.path.join(nested_directory_structure, "level1")
+    assert "".join(summarizer.iter_summary(level1)) == summarize_directory(
+        level1, gitignore_in_root, include_exts=[".txt", ".log"])
+    stats = summarizer.stats(level1)
+    assert stats["chars"] == len(summarizer.summarize(level1))
+
+    with pytest.raises(ValueError):
+        Summarizer(show_docker=True, show_only_docker=True)
+
+
 def test_discover_gitignore_current_dir(gitignore_in_root):
     """Test discovering .gitignore in current directory."""
     temp_dir = os.path.dirname(gitignore_in_root)
@@ -0,0 +1,141 @@
+"""
+Tests for the compiled filter pipeline, its presets and its rejection counts.
+"""
+import os
+import time
+import pytest
+from collections import Counter
+from unittest.mock import patch
+
+from summarizeGPT.filters import FileFilter, parse_time
+from summarizeGPT.instrument import Recorder
+from summarizeGPT.summarizeGPT import Summarizer, scan_directory, select_files
+
+
+@pytest.fixture
+def project(temp_test_directory):
+    """A tree with sources, tests, docs, docker files and an old large file."""
+    files = {
+        "app.py": "print('app')\n",
+        "setup.py": "setup()\n",
+        "Dockerfile": "FROM python\n",
+        "requirements.txt": "requests\n",
+        "README.md": "# Readme\n",
+        "pkg/__init__.py": "",
+        "pkg/core.py": "x = 1\n",
+        "pkg/big.py": "y = 2\n" * 100,
+        "pkg/test_core.py": "def test(): pass\n",
+        "tests/helpers.py": "helper = True\n",
+        "docs/guide.rst": "Guide\n",
+    }
+    for name, text in files.items():
+        path = os.path.join(temp_test_directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+    old = time.time() - 30 * 86400
+    os.utime(os.path.join(temp_test_directory, "pkg/big.py"), (old, old))
+    return temp_test_directory
+
+
+def _selected(directory, **options):
+    summarizer = Summarizer(count_tokens=False, **options)
+    entries = scan_directory(directory)
+    root = len(entries[0].path) + 1
+    return sorted(entry.path[root:] for entry in select_files(entries,
+                                                              file_filter=summarizer.file_filter))
+
+
+def test_presets_replace_the_docker_flags(project):
+    """Test that the default, -d and -o behaviours are presets, and presets combine."""
+    assert _selected(project) == ["README.md", "app.py", "docs/guide.rst", "pkg/big.py",
+                                  "pkg/core.py", "pkg/test_core.py", "requirements.txt",
+                                  "tests/helpers.py"]
+    assert _selected(project, show_docker=True) == _selected(project, presets=["all"])
+    assert "Dockerfile" in _selected(project, presets=["all"])
+    assert _selected(project, show_only_docker=True) == ["Dockerfile", "requirements.txt"]
+    assert _selected(project, presets=["default", "no-tests"]) == [
+        "README.md", "app.py", "docs/guide.rst", "pkg/big.py", "pkg/core.py",
+        "requirements.txt"]
+    assert _selected(project, presets=["docs"]) == ["README.md", "docs/guide.rst",
+                                                    "requirements.txt"]
+    with pytest.raises(ValueError, match="Unknown preset"):
+        Summarizer(presets=["nope"])
+    with pytest.raises(ValueError):
+        Summarizer(show_docker=True, presets=["docs"])
+
+
+def test_path_size_and_time_rules(project):
+    """Test globs, regexes, size bounds and mtime windows, alone and together."""
+    assert _selected(project, include_globs=["pkg/"]) == [
+        "pkg/big.py", "pkg/core.py", "pkg/test_core.py"]
+    assert _selected(project, include_globs=["*.py"], exclude_globs=["tests/", "pkg/b*"]) == [
+        "app.py", "pkg/core.py", "pkg/test_core.py"]
+    assert _selected(project, include_regexes=[r"\.(md|rst)$"]) == ["README.md",
+                                                                    "docs/guide.rst"]
+    assert _selected(project, exclude_regexes=["^pkg/", "help"]) == [
+        "README.md", "app.py", "docs/guide.rst", "requirements.txt"]
+    assert _selected(project, include_exts=["py"], min_size=100) == ["pkg/big.py"]
+    assert _selected(project, include_exts=["py"], max_size=10) == ["pkg/core.py"]
+    assert _selected(project, include_exts=["py"], older_than=parse_time("7d")) == ["pkg/big.py"]
+    assert "pkg/big.py" not in _selected(project, newer_than=parse_time("1w"))
+    with pytest.raises(ValueError, match="Invalid --exclude-regex"):
+        Summarizer(exclude_regexes=["("])
+    # Global inline flags apply to their own rule once the rules are combined
+    assert _selected(project, include_regexes=["(?i)readme", r"\.RST$"]) == ["README.md"]
+    assert _selected(project, exclude_regexes=["(?i)^PKG/", "(?x) help  # comment",
+                                               "^docs"]) == ["README.md", "app.py",
+                                                             "requirements.txt"]
+    with pytest.raises(ValueError, match="Invalid --include-regex x\\|\\(\\?i\\)"):
+        Summarizer(include_regexes=["x|(?i)y"])
+
+
+class CountingStat:
+    """A dir entry recording which files were stat'ed."""
+
+    def __init__(self, dir_entry, stats):
+        self.dir_entry = dir_entry
+        self.stats = stats
+
+    def stat(self):
+        self.stats.append(self.dir_entry.name)
+        return self.dir_entry.stat()
+
+
+def test_cheap_rules_run_before_stat_and_rejections_are_counted(project):
+    """Test that files rejected by name are never stat'ed and every rule's rejections are counted."""
+    file_filter = FileFilter(include_exts=[".py"], exclude_globs=["**/test_*"], max_size=100)
+    stats = []
+    entries = [entry._replace(dir_entry=CountingStat(entry.dir_entry, stats))
+               for entry in scan_directory(project) if not entry.is_dir]
+    root = len(project.replace("\\", "/")) + 1
+    rejected = Counter()
+    accepted = [entry.name for entry in entries
+                if file_filter(entry, entry.path[root:], rejected)]
+    assert sorted(accepted) == ["__init__.py", "app.py", "core.py", "helpers.py", "setup.py"]
+    assert sorted(stats) == ["__init__.py", "app.py", "big.py", "core.py", "helpers.py",
+                             "setup.py"]
+    assert rejected == {"--include": 4, "--exclude-glob **/test_*": 1, "--max-size": 1}
+
+    recorder = Recorder()
+    summarizer = Summarizer(exclude_globs=["docs/"], count_tokens=False)
+    with patch("summarizeGPT.summarizeGPT.logger") as mock_logger:
+        list(summarizer.iter_sections(project, recorder=recorder))
+    assert recorder.finish()["files"]["filtered"] == 4
+    assert recorder.finish()["files"]["filters"] == {"preset default": 3, "--exclude-glob docs/": 1}
+    messages = [call.args[0] for call in mock_logger.info.call_args_list]
+    assert "Filtered out 4 files: preset default: 3, --exclude-glob docs/: 1" in messages
+
+
+def test_parse_time():
+    """Test durations and dates for --newer-than and --older-than."""
+    assert parse_time("2h", now=10_000) == 10_000 - 7200
+    assert parse_time("1.5d", now=200_000) == 200_000 - 129_600
+    assert parse_time("2024-05-01") == parse_time("2024-05-01T00:00:00")
+    with pytest.raises(ValueError, match="Invalid time"):
+        parse_time("yesterday")
+
+    from summarizeGPT.summarizeGPT import main
+    with patch("sys.argv", ["SummarizeGPT", ".", "--newer-than", "soon"]), \
+            pytest.raises(SystemExit):
+        main()
@@ -0,0 +1,111 @@
+"""
+Tests for git-index-backed file enumeration.
+"""
+import os
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT.gitindex import (
+    find_git_dir,
+    read_git_index,
+    git_ls_files,
+    list_tracked_files,
+    GitIndexError
+)
+from summarizeGPT.summarizeGPT import summarize_directory, scan_git_tracked
+
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", *args], cwd=repo, check=True,
+                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+@pytest.fixture
+def git_repo(temp_test_directory):
+    """Create a git repository with tracked, untracked and ignored files."""
+    repo = temp_test_directory
+    _git(repo, "init", "-q")
+    os.makedirs(os.path.join(repo, "src", "pkg"))
+    os.makedirs(os.path.join(repo, "node_modules", "dep"))
+    files = {
+        "README.md": "readme content",
+        "src/main.py": "main content",
+        "src/pkg/util.py": "util content",
+        "node_modules/dep/index.js": "dependency content",
+        ".gitignore": "node_modules/\n",
+    }
+    for path, content in files.items():
+        with open(os.path.join(repo, path), "w") as f:
+            f.write(content)
+    _git(repo, "add", "README.md", "src", ".gitignore")
+    with open(os.path.join(repo, "untracked.txt"), "w") as f:
+        f.write("untracked content")
+    return repo
+
+
+@pytest.mark.parametrize("version", [2, 3, 4])
+def test_read_git_index_versions(git_repo, version):
+    """Test that every supported index version parses like git ls-files."""
+    _git(git_repo, "update-index", "--index-version", str(version))
+    paths = read_git_index(os.path.join(git_repo, ".git", "index"))
+    assert paths == git_ls_files(git_repo)
+    assert paths == [".gitignore", "README.md", "src/main.py", "src/pkg/util.py"]
+
+
+def test_read_git_index_rejects_other_files(temp_test_directory):
+    """Test that a file without the index signature is rejected."""
+    path = os.path.join(temp_test_directory, "index")
+    with open(path, "wb") as f:
+        f.write(b"not an index")
+    with pytest.raises(GitIndexError):
+        read_git_index(path)
+
+
+def test_split_index_falls_back_to_ls_files(git_repo):
+    """Test that a split index, whose entries are only a delta, is not parsed."""
+    _git(git_repo, "update-index", "--split-index")
+    with open(os.path.join(git_repo, "new.txt"), "w") as f:
+        f.write("new content")
+    _git(git_repo, "add", "new.txt")
+    with pytest.raises(GitIndexError, match="Split"):
+        read_git_index(os.path.join(git_repo, ".git", "index"))
+    assert list_tracked_files(git_repo) == [".gitignore", "README.md", "new.txt", "src/main.py",
+                                            "src/pkg/util.py"]
+
+
+def test_list_tracked_files_in_subdirectory(git_repo):
+    """Test that paths are made relative to the summarized subdirectory."""
+    assert find_git_dir(os.path.join(git_repo, "src"))[1] == os.path.abspath(git_repo)
+    assert list_tracked_files(os.path.join(git_repo, "src")) == ["main.py", "pkg/util.py"]
+
+
+def test_list_tracked_files_falls_back_to_ls_files(git_repo):
+    """Test the git ls-files fallback when the index cannot be parsed."""
+    with patch('summarizeGPT.gitindex.read_git_index', side_effect=GitIndexError("sparse")):
+        assert list_tracked_files(git_repo) == git_ls_files(git_repo)
+
+
+def test_git_tracked_summary_never_walks_untracked(git_repo):
+    """Test that --git-tracked feeds only tracked files to tree and contents."""
+    with patch('os.scandir') as mock_scandir:
+        result = summarize_directory(git_repo, git_tracked=True)
+    mock_scandir.assert_not_called()
+
+    assert "main content" in result
+    assert "util content" in result
+    assert "    pkg/" in result
+    assert "untracked" not in result
+    assert "node_modules" not in result.split("```")[1]
+    assert "dependency content" not in result
+
+
+def test_git_tracked_outside_repository(nested_directory_structure):
+    """Test that a directory outside git falls back to a normal walk."""
+    with patch('summarizeGPT.gitindex.find_git_dir', return_value=None):
+        entries = scan_git_tracked(nested_directory_structure)
+    assert any(entry.name == "level2.txt" for entry in entries)
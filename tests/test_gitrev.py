@@ -0,0 +1,123 @@
+"""
+Tests for revision and diff summaries read through ``git cat-file --batch``.
+"""
+import os
+import shutil
+import subprocess
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT.gitrev import CatFile, GitError, parse_diff_range
+from summarizeGPT.summarizeGPT import Summarizer
+
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+                   cwd=repo, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def _write(repo, path, content):
+    path = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def history(temp_test_directory):
+    """A repository with two commits and uncommitted edits on top."""
+    repo = temp_test_directory
+    _git(repo, "init", "-q")
+    _write(repo, "src/app.py", "".join(f"line {i}\n" for i in range(1, 11)))
+    _write(repo, "src/old.py", "removed later\n")
+    _write(repo, "README.md", "readme\n")
+    _write(repo, ".gitignore", "*.log\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "first")
+    _write(repo, "src/app.py", "".join(f"line {i}\n" for i in range(1, 11)).replace("5", "five"))
+    _write(repo, "src/new.py", "added\n")
+    _write(repo, "debug.log", "tracked despite the ignore rule\n")
+    os.remove(os.path.join(repo, "src/old.py"))
+    _git(repo, "add", "-A", "-f")
+    _git(repo, "commit", "-q", "-m", "second")
+    _write(repo, "README.md", "uncommitted edit\n")
+    return repo
+
+
+def test_rev_summarizes_the_commit_not_the_working_tree(history):
+    """Test that --rev lists and reads the files of the commit."""
+    summary = Summarizer(revision="HEAD~1", count_tokens=False).summarize(history)
+    assert "src/old.py" in summary and "src/new.py" not in summary
+    assert "line 5\n" in summary and "uncommitted" not in summary
+    assert "readme" in summary
+
+    # Ignore rules come from the revision's own .gitignore
+    ignored = Summarizer(revision="HEAD", auto_gitignore=True, count_tokens=False)
+    assert "debug.log" not in ignored.summarize(history)
+
+
+def test_diff_emits_changed_files_and_marks_the_tree(history):
+    """Test that --diff keeps the full tree view but only changed files' sections."""
+    summary = Summarizer(diff="HEAD~1..HEAD", count_tokens=False).summarize(history)
+    tree, _, files = summary.partition("\n```\n\n")
+    assert "    README.md\n" in tree
+    assert "app.py [M]" in tree and "new.py [A]" in tree and "old.py [D]" in tree
+    headings = [line[3:] for line in files.splitlines() if line.startswith("## ")]
+    assert headings == [f"{history}/debug.log", f"{history}/src/app.py", f"{history}/src/new.py"]
+    assert "line five\n" in files
+
+    hunks = Summarizer(diff="HEAD~1..", diff_context=1, count_tokens=False).summarize(
+        os.path.join(history, "src"))
+    assert "--- a/src/app.py\n+++ b/src/app.py\n@@ -4,3 +4,3 @@\n line 4\n-line 5\n+line five\n" in hunks
+    assert "--- a/src/old.py\n+++ /dev/null\n@@ -1 +0,0 @@\n-removed later" in hunks
+    assert "debug.log" not in hunks
+
+
+def test_blobs_are_read_through_one_cat_file_process(history):
+    """Test that a summary starts a single cat-file process however many files it reads."""
+    with patch("summarizeGPT.gitrev.CatFile", wraps=CatFile) as mock_cat_file:
+        Summarizer(revision="HEAD", jobs=4, count_tokens=False).summarize(history)
+    assert mock_cat_file.call_count == 1
+
+
+def test_each_blob_is_fetched_once(history):
+    """Test that the binary sniff, the read and --dedup share one fetch per blob."""
+    _write(history, "copy.py", "added\n")
+    _git(history, "add", "copy.py")
+    _git(history, "commit", "-q", "-m", "third")
+    fetched = []
+    fetch = CatFile._fetch
+
+    def counting_fetch(self, object_id):
+        fetched.append(object_id)
+        return fetch(self, object_id)
+
+    with patch.object(CatFile, "_fetch", counting_fetch):
+        summary = Summarizer(revision="HEAD", dedup=True, count_tokens=False).summarize(history)
+    assert "readme" in summary and "line five" in summary
+    assert sorted(fetched) == sorted(set(fetched))
+    assert len(fetched) == 4  # copy.py is a duplicate of src/new.py and never read
+
+
+def test_bad_revisions_are_reported(history):
+    """Test range parsing and the errors for unknown revisions."""
+    assert parse_diff_range("main..topic") == ("main", "topic", False)
+    assert parse_diff_range("main...") == ("main", "HEAD", True)
+    assert parse_diff_range("v1") == ("v1", "HEAD", False)
+    with pytest.raises(GitError, match="does not name a commit"):
+        Summarizer(revision="no-such-branch").summarize(history)
+    with pytest.raises(ValueError):
+        Summarizer(revision="HEAD", diff="HEAD~1..HEAD")
+
+    from summarizeGPT.summarizeGPT import main
+    with patch("sys.argv", ["SummarizeGPT", history, "--diff-context", "3"]), \
+            pytest.raises(SystemExit):
+        main()
+    # Blobs have no mtime for the time rules to compare
+    with patch("sys.argv", ["SummarizeGPT", history, "--rev", "HEAD", "--newer-than", "1d"]), \
+            patch("summarizeGPT.summarizeGPT.logger") as mock_logger, pytest.raises(SystemExit):
+        main()
+    assert "files read from git have no modification time" in mock_logger.error.call_args.args[0]
@@ -0,0 +1,111 @@
+"""
+Tests for the compiled hierarchical gitignore matcher.
+"""
+import os
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT.ignore import IgnoreMatcher, IgnoreRules, build_ignore_matcher
+from summarizeGPT.summarizeGPT import scan_directory, summarize_directory
+
+
+@pytest.mark.parametrize("patterns, path, is_dir, expected", [
+    (["*.log"], "a.log", False, True),
+    (["*.log"], "deep/dir/a.log", False, True),
+    (["*.log", "!keep.log"], "keep.log", False, False),
+    (["build/"], "build", True, True),
+    (["build/"], "build", False, None),
+    (["/root.txt"], "root.txt", False, True),
+    (["/root.txt"], "sub/root.txt", False, None),
+    (["docs/**/*.md"], "docs/a/b/c.md", False, True),
+    (["docs/**/*.md"], "docs/c.md", False, True),
+    (["**/tmp"], "x/y/tmp", True, True),
+    (["a/**"], "a/b/c", False, True),
+    (["foo?.txt"], "fooa.txt", False, True),
+    (["foo?.txt"], "foo.txt", False, None),
+    (["[abc].c"], "b.c", False, True),
+    (["[!abc].c"], "b.c", False, None),
+    (["\\#hash"], "#hash", False, True),
+    (["# comment", ""], "# comment", False, None),
+    (["trailing.txt   "], "trailing.txt", False, True),
+])
+def test_ignore_rules_patterns(patterns, path, is_dir, expected):
+    """Test gitignore glob semantics of a single compiled file."""
+    assert IgnoreRules(patterns).match(path, is_dir) is expected
+
+
+def test_nested_gitignore_precedence(temp_test_directory):
+    """Test that deeper ignore files override shallower ones."""
+    os.makedirs(os.path.join(temp_test_directory, "pkg", "sub"))
+    with open(os.path.join(temp_test_directory, ".gitignore"), "w") as f:
+        f.write("*.gen\n")
+    with open(os.path.join(temp_test_directory, "pkg", ".gitignore"), "w") as f:
+        f.write("!keep.gen\n")
+
+    matcher = IgnoreMatcher(temp_test_directory)
+    matcher.add_directory(temp_test_directory)
+    matcher.add_directory(os.path.join(temp_test_directory, "pkg"))
+
+    assert matcher(os.path.join(temp_test_directory, "a.gen"))
+    assert matcher(os.path.join(temp_test_directory, "pkg", "sub", "a.gen"))
+    assert not matcher(os.path.join(temp_test_directory, "pkg", "sub", "keep.gen"))
+    assert not matcher(os.path.join(temp_test_directory, "keep.txt"))
+
+
+def test_ignored_parent_directory_is_cached(temp_test_directory):
+    """Test that paths below an ignored directory are rejected via the prefix cache."""
+    with open(os.path.join(temp_test_directory, ".gitignore"), "w") as f:
+        f.write("vendor/\n")
+    matcher = build_ignore_matcher(temp_test_directory, os.path.join(temp_test_directory, ".gitignore"))
+
+    with patch.object(matcher, '_match', wraps=matcher._match) as mock_match:
+        for i in range(10):
+            assert matcher(os.path.join(temp_test_directory, "vendor", "lib", f"f{i}.py"))
+    # Only vendor/ itself is matched; everything below it hits the cache
+    assert mock_match.call_count == 1
+
+
+def test_scan_directory_applies_nested_gitignores(temp_test_directory):
+    """Test that -ig honours nested .gitignore files and prunes ignored directories."""
+    os.makedirs(os.path.join(temp_test_directory, "app", "node_modules", "dep"))
+    os.makedirs(os.path.join(temp_test_directory, "app", "src"))
+    with open(os.path.join(temp_test_directory, ".gitignore"), "w") as f:
+        f.write("*.log\n")
+    with open(os.path.join(temp_test_directory, "app", ".gitignore"), "w") as f:
+        f.write("node_modules/\n")
+    for path in ["app/src/main.js", "app/debug.log", "app/node_modules/dep/index.js"]:
+        with open(os.path.join(temp_test_directory, path), "w") as f:
+            f.write(f"{path} content")
+
+    scanned = []
+    real_scandir = os.scandir
+
+    def recording_scandir(path):
+        scanned.append(os.path.basename(path))
+        return real_scandir(path)
+
+    with patch('os.scandir', side_effect=recording_scandir):
+        entries = scan_directory(temp_test_directory, auto_gitignore=True)
+
+    assert "node_modules" not in scanned
+    visible = {entry.name for entry in entries if not entry.ignored}
+    assert "main.js" in visible
+    assert "debug.log" not in visible
+    assert "node_modules" not in visible
+
+    result = summarize_directory(temp_test_directory, auto_gitignore=True)
+    assert "app/src/main.js content" in result
+    assert "debug.log" not in result
+
+
+def test_scan_root_is_never_ignored(temp_test_directory):
+    """Test that an explicitly summarized ignored directory is still listed."""
+    build_dir = os.path.join(temp_test_directory, "build")
+    os.makedirs(build_dir)
+    with open(os.path.join(temp_test_directory, ".gitignore"), "w") as f:
+        f.write("build/\n")
+    with open(os.path.join(build_dir, "out.txt"), "w") as f:
+        f.write("output")
+
+    entries = scan_directory(build_dir, os.path.join(temp_test_directory, ".gitignore"))
+    assert [entry.name for entry in entries if not entry.ignored] == ["build", "out.txt"]
@@ -0,0 +1,124 @@
+"""
+Tests for the per-language minifiers behind --minify and their statistics.
+"""
+import ast
+import os
+from unittest.mock import patch
+
+from summarizeGPT.minify import language_for, minify
+from summarizeGPT.summarizeGPT import (
+    FileIndex, Summarizer, TokenCache, iter_with_stats, new_summary_stats, print_statistics,
+)
+
+
+class CharEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per character."""
+
+    def encode(self, text, **kwargs):
+        return list(text)
+
+
+PYTHON = '''#!/usr/bin/env python
+"""Module docstring."""
+import os  # comment after code
+# comment line
+
+
+class Empty:
+    """Only a docstring."""
+
+
+def f(x):
+    """
+    Several lines.
+    """
+    s = "# not a comment"
+    return x + 1  # trailing
+'''
+
+
+def test_python_drops_comments_and_docstrings_and_still_parses():
+    """Test that Python keeps its code, strings and shebang, and an emptied block gets pass."""
+    result = minify(PYTHON, "python")
+    assert result == ('#!/usr/bin/env python\nimport os\n\n\nclass Empty:\n    pass\n\n\n'
+                      'def f(x):\n    s = "# not a comment"\n    return x + 1\n')
+    ast.parse(result)
+    # Sampled pieces are minified on either side of the truncation marker
+    sampled = PYTHON.replace("    s = ", "[... truncated: 2 lines, 40 bytes omitted ...]\n    s = ")
+    assert "[... truncated: 2 lines, 40 bytes omitted ...]\n    s =" in minify(sampled, "python")
+    assert "# trailing" not in minify(sampled, "python")
+    # Text that only parses with its strings kept is returned unchanged
+    assert minify("x = 1 if y else \\\n  'a'\n", "python") == "x = 1 if y else \\\n  'a'\n"
+
+
+def test_c_family_comments_and_literals():
+    """Test that comments go while strings, regexes and build directives stay."""
+    js = ('/* License\n * MIT */\nconst re = /\\/\\*x/g; // note\n'
+          'const u = "http://x", t = `a // b`;\n'
+          'function h() { return /[/]*/.test(u) /* why */ && 4 / 2 / 1; }\n')
+    assert minify(js, "javascript") == (
+        '\n\nconst re = /\\/\\*x/g;\nconst u = "http://x", t = `a // b`;\n'
+        'function h() { return /[/]*/.test(u)   && 4 / 2 / 1; }\n')
+    go = ('//go:build linux\n\npackage main\n\n/*\n#include <stdio.h>\n*/\nimport "C"\n\n'
+          '// Doc comment.\nfunc main() { s := `//raw` /* a\nb */ }\n')
+    assert minify(go, "go") == ('//go:build linux\n\npackage main\n\n/*\n#include <stdio.h>\n*/\n'
+                                'import "C"\n\n\nfunc main() { s := `//raw`\n }\n')
+    assert minify("char c = '/'; // x\nint d = 1; /* y */\n", "c") == "char c = '/';\nint d = 1;\n"
+    assert language_for("main.TSX") == "typescript" and language_for("Makefile") is None
+
+
+def test_json_and_yaml_whitespace():
+    """Test JSON collapsing (keeping comment line ends) and YAML compaction."""
+    assert minify('{\n  "a": [1, 2],\n  "b": "x  y"\n}\n', "json") == '{"a":[1,2],"b":"x  y"}'
+    assert minify('{\n  // c\n  "a": 1\n}', "json") == '{\n//c\n"a":1\n}'
+    yaml = ('# top\nkey:     value   # note\nurl: "a # b"\nrun: |\n  # kept\n  echo   hi\n'
+            'name: it\'s   # gone\n')
+    assert minify(yaml, "yaml") == ('key: value\nurl: "a # b"\nrun: |\n  # kept\n  echo   hi\n'
+                                    "name: it's\n")
+
+
+def test_minify_reports_savings_per_language(temp_test_directory):
+    """Test that statistics count bytes and tokens before and after, also from the file index."""
+    with open(os.path.join(temp_test_directory, "app.py"), "w") as f:
+        f.write(PYTHON)
+    with open(os.path.join(temp_test_directory, "data.json"), "w") as f:
+        f.write('{\n    "key": "value"\n}\n')
+    with open(os.path.join(temp_test_directory, "notes.txt"), "w") as f:
+        f.write("# kept as is\n")
+    for name in ("app.py", "data.json", "notes.txt"):
+        # Old enough for the file index to store
+        os.utime(os.path.join(temp_test_directory, name), (1_000_000_000, 1_000_000_000))
+    cache_dir = os.path.join(temp_test_directory, ".cache")
+
+    summarizer = Summarizer(minify=True)
+    results = []
+    with patch('summarizeGPT.summarizeGPT.load_encoding', return_value=CharEncoding()):
+        for hits in (0, 3):
+            index = FileIndex(cache_dir, temp_test_directory)
+            stats = new_summary_stats()
+            sections = summarizer.iter_sections(temp_test_directory, file_index=index)
+            text = "".join(s.text for s in iter_with_stats(sections, stats, TokenCache()))
+            assert index.hits == hits
+            index.close()
+            results.append((text, stats["minified"]))
+    assert results[0] == results[1]
+    text, minified = results[0]
+    assert "Module docstring" not in text and "# kept as is" in text
+    assert '{"key":"value"}' in text
+    assert set(minified) == {"python", "json"}
+    python = minified["python"]
+    assert python["files"] == 1
+    assert python["tokens_after"] == python["bytes_after"] < python["tokens_before"]
+
+    plain = Summarizer(count_tokens=False).summarize(temp_test_directory)
+    assert "Module docstring" in plain
+
+    stats = new_summary_stats()
+    for _ in iter_with_stats(Summarizer(minify=True).iter_sections(temp_test_directory), stats):
+        pass
+    assert stats["minified"]["json"]["tokens_before"] is None
+    with patch("builtins.print") as mock_print:
+        print_statistics(stats)
+    lines = [call.args[0] for call in mock_print.call_args_list if call.args]
+    assert any(line.startswith("  json: 1 files, ") and line.endswith("63 -> 56 bytes (11.1% saved)")
+               for line in lines)
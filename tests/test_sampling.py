@@ -0,0 +1,87 @@
+"""
+Tests for head/tail sampling of large files.
+"""
+import os
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT.sampling import read_sampled_text
+from summarizeGPT.summarizeGPT import get_file_contents
+
+
+class CharEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per character."""
+
+    def encode(self, text, **kwargs):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+@pytest.fixture
+def numbered_file(temp_test_directory):
+    """A 1000-line file whose middle is not valid UTF-8, so decoding it would fail."""
+    path = os.path.join(temp_test_directory, "big.log")
+    with open(path, "wb") as f:
+        for i in range(1000):
+            if 100 <= i < 900:
+                f.write(b"\xff\xfe garbage\n")
+            else:
+                f.write(f"line {i}\n".encode())
+    return path
+
+
+def test_head_reads_only_leading_lines(numbered_file):
+    """Test that the head is read without decoding the rest of the file."""
+    text = read_sampled_text(numbered_file, head=3)
+    assert text.startswith("line 0\nline 1\nline 2\n[... truncated: 997 lines, ")
+    assert "line 3\n" not in text
+
+
+def test_head_and_tail(numbered_file):
+    """Test that the tail is found by seeking from the end of the file."""
+    text = read_sampled_text(numbered_file, head=2, tail=2)
+    lines = text.splitlines()
+    assert lines[:2] == ["line 0", "line 1"]
+    assert lines[2].startswith("[... truncated: 996 lines, ")
+    assert lines[3:] == ["line 998", "line 999"]
+    size = os.path.getsize(numbered_file)
+    kept = len("line 0\nline 1\nline 998\nline 999\n")
+    assert f"{size - kept} bytes omitted" in lines[2]
+
+
+def test_tail_only_and_whole_file(temp_test_directory):
+    """Test tail-only sampling and that no marker is added when nothing is omitted."""
+    path = os.path.join(temp_test_directory, "small.txt")
+    with open(path, "w") as f:
+        f.write("a\nb\nc")
+    assert read_sampled_text(path, tail=1) == "[... truncated: 2 lines, 4 bytes omitted ...]\nc"
+    assert read_sampled_text(path, head=2, tail=2) == "a\nb\nc"
+    assert read_sampled_text(path, head=10) == "a\nb\nc"
+
+
+def test_large_gaps_are_not_scanned_for_lines(numbered_file):
+    """Test that only the byte count is reported for omitted regions too large to count."""
+    with patch('summarizeGPT.sampling.LINE_COUNT_SCAN_BYTES', 100):
+        text = read_sampled_text(numbered_file, head=1, tail=1)
+    assert "[... truncated: " in text
+    assert " lines, " not in text
+
+
+def test_max_tokens_keeps_beginning_and_end(numbered_file):
+    """Test that the per-file token cap samples both ends of the file."""
+    text = read_sampled_text(numbered_file, max_tokens=14, encoding=CharEncoding())
+    size = os.path.getsize(numbered_file)
+    assert text == f"line 0\n[... truncated: 998 lines, {size - 14} bytes omitted ...]\nne 999\n"
+
+
+def test_max_lines_marks_truncation(temp_test_directory):
+    """Test that --max-lines marks the omitted lines in the summary."""
+    with open(os.path.join(temp_test_directory, "long.txt"), "w") as f:
+        f.write("".join(f"row {i}\n" for i in range(50)))
+    result = get_file_contents(temp_test_directory, max_lines=5)
+    assert "row 4\n[... truncated: 45 lines, " in result
+    assert "row 5" not in result
+    tail = get_file_contents(temp_test_directory, head=1, tail=1)
+    assert "row 0\n[... truncated: 48 lines, " in tail and "row 49" in tail
@@ -0,0 +1,158 @@
+"""
+Tests for ``SummarizeGPT serve``: the request protocol and the stat-validated caches.
+"""
+import asyncio
+import json
+import os
+import pytest
+import threading
+from unittest.mock import patch
+
+from summarizeGPT import summarizeGPT
+from summarizeGPT.server import RequestError, SectionCache, SummaryServer, start_server
+from summarizeGPT.summarizeGPT import Summarizer, scan_directory
+
+
+def backdate(path, seconds=10):
+    """Move a file's mtime out of the racy window, so its section may be cached."""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds * 1_000_000_000))
+
+
+async def http(port, method, path, body=None):
+    """Send one request; return the status, lower-cased headers and de-chunked body."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = b"" if body is None else json.dumps(body).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:])
+    if headers.get("transfer-encoding") == "chunked":
+        chunks = []
+        while True:
+            size, _, payload = payload.partition(b"\r\n")
+            size = int(size, 16)
+            if size == 0:
+                break
+            chunks.append(payload[:size])
+            payload = payload[size + 2:]
+        payload = b"".join(chunks)
+    return int(lines[0].split()[1]), headers, payload.decode()
+
+
+def run_with_server(server, scenario):
+    async def main():
+        listener = await start_server(server, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def repo(temp_test_directory):
+    for name in ("a.py", "b.py"):
+        path = os.path.join(temp_test_directory, name)
+        with open(path, "w") as f:
+            f.write(f"# {name}\n")
+        backdate(path)
+    backdate(temp_test_directory)
+    return temp_test_directory
+
+
+def test_repeated_requests_are_served_from_cache(repo):
+    """Test that only changed files are re-read and new files show up."""
+    server = SummaryServer()
+    args = {"args": [repo, "--include", "py"]}
+    read = summarizeGPT.read_file_text
+    expected = Summarizer(include_exts=["py"]).summarize(repo)
+
+    async def scenario(port):
+        with patch("summarizeGPT.summarizeGPT.read_file_text", side_effect=read) as mock_read:
+            status, headers, first = await http(port, "POST", "/summarize", args)
+            assert status == 200 and headers["content-type"].startswith("text/markdown")
+            assert first == expected
+            assert mock_read.call_count == 2
+
+            assert (await http(port, "POST", "/summarize", args))[2] == first
+            assert mock_read.call_count == 2
+
+            with open(os.path.join(repo, "a.py"), "w") as f:
+                f.write("# a.py, edited\n")
+            backdate(os.path.join(repo, "a.py"), 5)
+            with open(os.path.join(repo, "c.py"), "w") as f:
+                f.write("# c.py\n")
+            _, _, third = await http(port, "POST", "/summarize", args)
+            reread = {os.path.basename(call.args[0].path) for call in mock_read.call_args_list[2:]}
+            assert reread == {"a.py", "c.py"}
+            assert "# a.py, edited" in third and "# c.py" in third
+        return (await http(port, "GET", "/stats"))[2]
+
+    stats = json.loads(run_with_server(server, scenario))
+    assert stats["trees"] == {"trees": 1, "max_trees": 64, "hits": 1, "misses": 2}
+    assert stats["sections"]["hits"] == 3
+
+
+def test_bad_requests_get_error_status(repo):
+    """Test that argument errors are reported as JSON with a 4xx status."""
+    async def scenario(port):
+        results = [await http(port, "POST", "/summarize", {"args": [repo, "--bogus"]}),
+                   await http(port, "POST", "/summarize", {"args": [repo, "-d", "-o"]}),
+                   await http(port, "POST", "/summarize", {"args": [os.path.join(repo, "x")]}),
+                   await http(port, "POST", "/summarize", {"directory": repo}),
+                   await http(port, "GET", "/summarize"),
+                   await http(port, "GET", "/nothing")]
+        return [(status, json.loads(body)["error"]) for status, _, body in results]
+
+    errors = run_with_server(SummaryServer(), scenario)
+    assert [status for status, _ in errors] == [400, 400, 404, 400, 405, 404]
+    assert "--bogus" in errors[0][1]
+    assert "show_docker" in errors[1][1]
+
+
+def test_slow_requests_do_not_block_other_connections(repo):
+    """Test that a request that is slow to prepare is prepared off the event loop."""
+    released = threading.Event()
+    timed_out = []
+
+    def slow_summarizer_for(*args):
+        timed_out.append(not released.wait(5))
+        raise RequestError(400, "no such encoding")
+
+    async def scenario(port):
+        slow = asyncio.ensure_future(http(port, "POST", "/summarize", {"args": [repo]}))
+        status, _, _ = await http(port, "GET", "/stats")
+        released.set()
+        return status, await slow
+
+    with patch.object(SummaryServer, "summarizer_for", side_effect=slow_summarizer_for):
+        status, (slow_status, _, body) = run_with_server(SummaryServer(), scenario)
+    assert status == 200
+    assert slow_status == 400 and "no such encoding" in body
+    assert timed_out == [False]
+
+
+def test_section_cache_evicts_least_recently_used(temp_test_directory):
+    """Test that the section cache stays within its byte budget."""
+    for name in ("a.txt", "b.txt", "c.txt"):
+        path = os.path.join(temp_test_directory, name)
+        with open(path, "w") as f:
+            f.write(name)
+        backdate(path)
+    entries = {e.name: e for e in scan_directory(temp_test_directory) if not e.is_dir}
+    section = summarizeGPT.Section("x", "x" * 100)
+    cache = SectionCache(max_bytes=700)
+    for name in ("a.txt", "b.txt"):
+        cache.store(entries[name], "opts", None, section)
+    assert cache.lookup(entries["a.txt"], "opts") == (True, section)
+    cache.store(entries["c.txt"], "opts", None, section)
+    assert cache.lookup(entries["b.txt"], "opts") == (False, None)
+    assert cache.lookup(entries["a.txt"], "opts")[0] and cache.lookup(entries["c.txt"], "opts")[0]
+    assert cache.bytes <= 700
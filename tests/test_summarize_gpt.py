@@ -1,3 +1,4 @@
+import argparse
 import unittest
 import os
 import sys
@@ -11,6 +12,7 @@ from summarizeGPT.summarizeGPT import (
     setup_logging,
     discover_gitignore,
     main,
+    build_parser,
     logger,
     output_file
 )
@@ -26,6 +28,13 @@ class TestSummarizeGPT(unittest.TestCase):
         # Reset logging before each test
         logger.handlers = []
 
+        # Parsed here, since the tests patch ArgumentParser.parse_args
+        self.default_args = vars(build_parser().parse_args([self.test_dir, '--no-cache']))
+
+    def _make_args(self, **overrides):
+        """Build a parsed-arguments object with the CLI defaults"""
+        return argparse.Namespace(**{**self.default_args, **overrides})
+
     def tearDown(self):
         # Clean up temporary files
         for root, dirs, files in os.walk(self.test_dir, topdown=False):
@@ -74,21 +83,7 @@ class TestSummarizeGPT(unittest.TestCase):
     @patch('sys.exit')
     def test_docker_flags_conflict(self, mock_exit, mock_args):
         """Test handling of conflicting docker flags"""
-        mock_args.return_value = type('Args', (), {
-            'directory': self.test_dir,
-            'gitignore': None,
-            'auto_gitignore': False,
-            'include': None,
-            'exclude': None,
-            'show_docker': True,
-            'show_only_docker': True,
-            'max_lines': None,
-            'encoding': 'cl100k_base',
-            'verbose': False,
-            'tree_depth': None,
-            'file_depth': None,
-            'max_depth': None  # Added missing attribute
-        })()
+        mock_args.return_value = self._make_args(show_docker=True, show_only_docker=True)
         
         with patch('logging.Logger.error') as mock_logger:
             main()
@@ -101,21 +96,7 @@ class TestSummarizeGPT(unittest.TestCase):
     @patch('sys.exit')
     def test_file_write_error(self, mock_exit, mock_args):
         """Test handling of file write errors"""
-        mock_args.return_value = type('Args', (), {
-            'directory': self.test_dir,
-            'gitignore': None,
-            'auto_gitignore': False,
-            'include': None,
-            'exclude': None,
-            'show_docker': False,
-            'show_only_docker': False,
-            'max_lines': None,
-            'encoding': 'cl100k_base',
-            'verbose': False,
-            'tree_depth': None,
-            'file_depth': None,
-            'max_depth': None  # Added missing attribute
-        })()
+        mock_args.return_value = self._make_args()
 
         original_open = open
         def mock_open_wrapper(*args, **kwargs):
@@ -260,21 +241,7 @@ class TestSummarizeGPT(unittest.TestCase):
     @patch('summarizeGPT.summarizeGPT.discover_gitignore')
     def test_auto_gitignore_option(self, mock_discover, mock_args):
         """Test the -ig flag for auto-discovering gitignore files"""
-        mock_args.return_value = type('Args', (), {
-            'directory': self.test_dir,
-            'gitignore': None,
-            'auto_gitignore': True,
-            'include': None,
-            'exclude': None,
-            'show_docker': False,
-            'show_only_docker': False,
-            'max_lines': None,
-            'encoding': 'cl100k_base',
-            'verbose': False,
-            'tree_depth': None,
-            'file_depth': None,
-            'max_depth': None
-        })()
+        mock_args.return_value = self._make_args(auto_gitignore=True)
         
         # Set up mock to return a fake gitignore path
         mock_discover.return_value = '/mock/path/.gitignore'
@@ -289,21 +256,7 @@ class TestSummarizeGPT(unittest.TestCase):
     @patch('argparse.ArgumentParser.parse_args')
     def test_explicit_gitignore_precedence(self, mock_args):
         """Test that explicit gitignore takes precedence over auto-discovery"""
-        mock_args.return_value = type('Args', (), {
-            'directory': self.test_dir,
-            'gitignore': '/explicit/path/.gitignore',
-            'auto_gitignore': True,
-            'include': None,
-            'exclude': None,
-            'show_docker': False,
-            'show_only_docker': False,
-            'max_lines': None,
-            'encoding': 'cl100k_base',
-            'verbose': False,
-            'tree_depth': None,
-            'file_depth': None,
-            'max_depth': None
-        })()
+        mock_args.return_value = self._make_args(gitignore='/explicit/path/.gitignore', auto_gitignore=True)
         
         with patch('builtins.open', create=True) as mock_open:
             mock_open.return_value.__enter__.return_value.write = lambda x: None
@@ -0,0 +1,116 @@
+"""
+Tests for loading encodings from an offline tokenizer cache.
+"""
+import base64
+import hashlib
+import os
+import pytest
+import threading
+from unittest.mock import patch
+
+import tiktoken_ext.openai_public as openai_public
+
+from summarizeGPT import tokenizer
+from summarizeGPT.summarizeGPT import Summarizer
+from summarizeGPT.tokenizer import ENCODINGS, TokenizerError, get_encoding
+
+
+@pytest.fixture(autouse=True)
+def fresh_encodings(monkeypatch):
+    """Start every test without process-wide encodings or remembered failures."""
+    monkeypatch.setattr(tokenizer, "_encodings", {})
+    monkeypatch.setattr(tokenizer, "_failures", {})
+    monkeypatch.delenv(tokenizer.TOKENIZER_CACHE_ENV, raising=False)
+
+
+@pytest.fixture
+def tiny_encoding(monkeypatch, temp_test_directory):
+    """A byte-level encoding with one merge ("ab"), stored in a tokenizer cache."""
+    tokens = [bytes([b]) for b in range(256)] + [b"ab"]
+    data = b"".join(base64.b64encode(token) + b" %d\n" % rank for rank, token in enumerate(tokens))
+    with open(os.path.join(temp_test_directory, "tiny_base.tiktoken"), "wb") as f:
+        f.write(data)
+    monkeypatch.setitem(ENCODINGS, "tiny_base", {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "pat_str": r"\S+|\s+",
+        "special_tokens": {},
+        "explicit_n_vocab": None,
+    })
+    return temp_test_directory
+
+
+def test_encoding_parameters_match_tiktoken():
+    """Test that the offline parameters are those of tiktoken's own constructors."""
+    with patch.object(openai_public, "load_tiktoken_bpe", return_value={}):
+        for name, params in ENCODINGS.items():
+            reference = getattr(openai_public, name)()
+            assert reference["pat_str"] == params["pat_str"]
+            assert reference["special_tokens"] == params["special_tokens"]
+            assert reference.get("explicit_n_vocab") == params["explicit_n_vocab"]
+
+
+def test_encoding_is_loaded_from_cache_once(tiny_encoding):
+    """Test that a cached encoding is built locally and shared process-wide."""
+    with patch("tiktoken.get_encoding") as mock_download, \
+            patch.object(tokenizer, "parse_bpe_ranks", wraps=tokenizer.parse_bpe_ranks) as mock_parse:
+        encoding = get_encoding("tiny_base", tiny_encoding)
+        assert encoding.encode("ab abc") == [256, 32, 256, 99]
+        assert get_encoding("tiny_base", tiny_encoding) is encoding
+    mock_download.assert_not_called()
+    assert mock_parse.call_count == 1
+
+
+def test_cache_directory_from_environment(monkeypatch, tiny_encoding):
+    """Test that $SUMMARIZEGPT_TOKENIZER_CACHE is used by the library and the CLI paths."""
+    monkeypatch.setenv(tokenizer.TOKENIZER_CACHE_ENV, tiny_encoding)
+    stats = Summarizer(encoding_name="tiny_base").stats(tiny_encoding)
+    assert stats["tokens"] > 0
+
+
+def test_missing_or_corrupt_file_never_downloads(tiny_encoding):
+    """Test that cache problems are reported instead of falling back to the network."""
+    with patch("tiktoken.get_encoding") as mock_download:
+        with pytest.raises(TokenizerError, match="python -m summarizeGPT.tokenizer"):
+            get_encoding("cl100k_base", tiny_encoding)
+        with open(os.path.join(tiny_encoding, "tiny_base.tiktoken"), "ab") as f:
+            f.write(b"Zm9v 999\n")
+        with pytest.raises(TokenizerError, match="does not match"):
+            get_encoding("tiny_base", tiny_encoding)
+    mock_download.assert_not_called()
+
+
+def test_failures_are_remembered():
+    """Test that a failed download is not retried for every summary."""
+    with patch("tiktoken.get_encoding", side_effect=ConnectionError("offline")) as mock_download:
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                get_encoding("cl100k_base")
+        assert mock_download.call_count == 1
+        with patch.object(tokenizer, "FAILURE_RETRY_SECONDS", 0):
+            with pytest.raises(ConnectionError):
+                get_encoding("cl100k_base")
+        assert mock_download.call_count == 2
+
+
+def test_a_slow_load_does_not_block_other_encodings(tiny_encoding):
+    """Test that threads needing another encoding do not wait for a download."""
+    started, released = threading.Event(), threading.Event()
+    timed_out = []
+
+    def slow_download(name):
+        started.set()
+        timed_out.append(not released.wait(5))
+        raise ConnectionError("offline")
+
+    get_encoding("tiny_base", tiny_encoding)
+    with patch("tiktoken.get_encoding", side_effect=slow_download):
+        thread = threading.Thread(target=pytest.raises, args=(ConnectionError, get_encoding,
+                                                              "cl100k_base"))
+        thread.start()
+        assert started.wait(5)
+        try:
+            assert get_encoding("tiny_base", tiny_encoding).encode("ab") == [256]
+        finally:
+            released.set()
+            thread.join(5)
+    assert timed_out == [False]
@@ -0,0 +1,235 @@
+"""
+Tests for --watch: change notification, debouncing and incremental regeneration.
+"""
+import os
+import sys
+import threading
+import time
+import pytest
+from unittest.mock import patch
+
+from summarizeGPT import summarizeGPT
+from summarizeGPT.ignore import build_ignore_matcher
+from summarizeGPT.summarizeGPT import (
+    Summarizer, output_file, rescan_directories, scan_directory, watch_directory,
+)
+from summarizeGPT.watch import (
+    Change, InotifyWatcher, PollingWatcher, WatchError, wait_for_changes,
+)
+
+
+class ScriptedWatcher:
+    """Watcher returning a fixed series of batches, then nothing."""
+
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.calls = 0
+
+    def wait(self, timeout):
+        self.calls += 1
+        return self.batches.pop(0) if self.batches else []
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def read_output(directory):
+    try:
+        with open(os.path.join(directory, output_file), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def test_burst_of_changes_is_debounced():
+    """Test that a burst of events is returned as one set of changes."""
+    a, b = "/tree/a.py", "/tree/b.py"
+    watcher = ScriptedWatcher([[], [Change(a, False)], [Change(a, False), Change(b, True)],
+                               [Change(a, False)], []])
+    changes = wait_for_changes(watcher, threading.Event(), debounce=0)
+    assert changes == {a: False, b: True}
+    assert watcher.calls == 5
+
+
+def test_polling_watcher_reports_modified_and_structural_changes():
+    """Test that snapshots are compared by signature and by key."""
+    state = {"a": (1, 1), "b": (1, 1)}
+    watcher = PollingWatcher(lambda: dict(state), interval=0)
+    state["a"] = (2, 2)
+    del state["b"]
+    state["c"] = (1, 1)
+    assert sorted(watcher.wait(1)) == [Change("a", False), Change("b", True), Change("c", True)]
+    assert watcher.wait(1) == []
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher_reports_writes_and_creations(temp_test_directory, sample_file):
+    """Test that inotify events are translated into changes."""
+    watcher = InotifyWatcher()
+    try:
+        watcher.watch_directories([temp_test_directory])
+        with open(sample_file, "a") as f:
+            f.write("more")
+        open(os.path.join(temp_test_directory, "new.txt"), "w").close()
+        changes = wait_for_changes(watcher, threading.Event(), debounce=0.1)
+    finally:
+        watcher.close()
+    assert changes[sample_file] is False
+    assert changes[os.path.join(temp_test_directory, "new.txt")] is True
+
+
+@pytest.mark.parametrize("polling", [True, False])
+def test_watch_regenerates_only_changed_files(temp_test_directory, sample_file, polling):
+    """Test that edits and new files show up, rereading only what changed."""
+    if not polling and not sys.platform.startswith("linux"):
+        pytest.skip("inotify is Linux-only")
+    other = os.path.join(temp_test_directory, "other.txt")
+    with open(other, "w") as f:
+        f.write("other content")
+
+    stop = threading.Event()
+    read = summarizeGPT.read_file_text
+    with patch("summarizeGPT.summarizeGPT.read_file_text", side_effect=read) as mock_read:
+        thread = threading.Thread(target=watch_directory, daemon=True, kwargs={
+            "summarizer": Summarizer(), "directory": temp_test_directory,
+            "prompt_file": os.path.join(temp_test_directory, output_file),
+            "polling": polling, "poll_interval": 0.05, "debounce": 0.05, "stop": stop})
+        thread.start()
+        try:
+            assert wait_until(lambda: "other content" in read_output(temp_test_directory))
+            assert mock_read.call_count == 2
+
+            with open(sample_file, "w") as f:
+                f.write("edited content")
+            assert wait_until(lambda: "edited content" in read_output(temp_test_directory))
+            reread = {call.args[0].path for call in mock_read.call_args_list[2:]}
+            assert reread == {sample_file}
+            edits = mock_read.call_count
+
+            with open(os.path.join(temp_test_directory, "added.txt"), "w") as f:
+                f.write("added content")
+            assert wait_until(lambda: "added content" in read_output(temp_test_directory))
+            reread = {call.args[0].path for call in mock_read.call_args_list[edits:]}
+            assert reread == {os.path.join(temp_test_directory, "added.txt")}
+        finally:
+            stop.set()
+            thread.join(5)
+    assert not thread.is_alive()
+    summary = read_output(temp_test_directory)
+    assert "    added.txt\n" in summary
+    assert "other content" in summary
+    assert not [name for name in os.listdir(temp_test_directory) if name.endswith(".tmp")]
+
+
+def test_rescan_directories_matches_a_full_scan(temp_test_directory):
+    """Test that relisting changed directories gives the entries of a fresh scan."""
+    root = temp_test_directory
+    for path in ("a.py", "keep/b.py", "keep/deep/c.py", "old/d.py", "gone/e.py", "logs/x.log"):
+        os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+        with open(os.path.join(root, path), "w") as f:
+            f.write(path)
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("*.log\nbuild/\n")
+
+    def listing(entries):
+        return [(e.path, e.name, e.depth, e.is_dir, e.ignored) for e in entries]
+
+    matcher = build_ignore_matcher(root, hierarchical=True)
+    entries = scan_directory(root, auto_gitignore=True)
+    os.replace(os.path.join(root, "a.py"), os.path.join(root, "a2.py"))
+    os.rename(os.path.join(root, "old"), os.path.join(root, "renamed"))
+    os.remove(os.path.join(root, "gone/e.py"))
+    os.rmdir(os.path.join(root, "gone"))
+    os.makedirs(os.path.join(root, "new/sub"))
+    for path in ("new/sub/f.py", "new/.gitignore", "new/skip.tmp", "keep/deep/g.log"):
+        with open(os.path.join(root, path), "w") as f:
+            f.write("*.tmp\n" if path.endswith(".gitignore") else path)
+    os.makedirs(os.path.join(root, "build"))
+
+    updated = rescan_directories(entries, {root, os.path.join(root, "keep", "deep")}, matcher,
+                                 auto_gitignore=True)
+    expected = scan_directory(root, auto_gitignore=True)
+    assert listing(updated) == listing(expected)
+    assert [e for e in updated if e.name == "skip.tmp"][0].ignored
+    # Unchanged subtrees are kept, not listed again
+    kept = [e for e in entries if e.name == "b.py"][0]
+    assert [e for e in updated if e.name == "b.py"][0] is kept
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_watch_applies_renames_without_rescanning(temp_test_directory, sample_file):
+    """Test that an atomic save and a new directory update the tree without a full scan."""
+    summarizer = Summarizer()
+    stop = threading.Event()
+    with patch.object(summarizer, "scan", wraps=summarizer.scan) as mock_scan:
+        thread = threading.Thread(target=watch_directory, daemon=True, kwargs={
+            "summarizer": summarizer, "directory": temp_test_directory,
+            "prompt_file": os.path.join(temp_test_directory, output_file),
+            "debounce": 0.05, "stop": stop})
+        thread.start()
+        try:
+            assert wait_until(lambda: "test content" in read_output(temp_test_directory))
+            # An editor's save: write a temporary file, then rename it over the original
+            temporary = sample_file + ".swp"
+            with open(temporary, "w") as f:
+                f.write("saved content")
+            os.replace(temporary, sample_file)
+            assert wait_until(lambda: "saved content" in read_output(temp_test_directory))
+
+            os.makedirs(os.path.join(temp_test_directory, "pkg"))
+            with open(os.path.join(temp_test_directory, "pkg", "mod.py"), "w") as f:
+                f.write("module content")
+            assert wait_until(lambda: "module content" in read_output(temp_test_directory))
+        finally:
+            stop.set()
+            thread.join(5)
+    assert mock_scan.call_count == 1
+    summary = read_output(temp_test_directory)
+    assert ".swp" not in summary
+    assert summary == Summarizer().summarize(temp_test_directory)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_watch_falls_back_to_polling_when_watches_run_out(temp_test_directory, sample_file):
+    """Test that running out of inotify watches after startup switches to polling."""
+    watch_directories = InotifyWatcher.watch_directories
+    calls = []
+
+    def limited_watch_directories(self, directories):
+        calls.append(directories)
+        if len(calls) > 1:
+            # What inotify_add_watch failing with ENOSPC is reported as
+            raise WatchError("inotify watch limit reached")
+        watch_directories(self, directories)
+
+    stop = threading.Event()
+    with patch.object(InotifyWatcher, "watch_directories", limited_watch_directories), \
+            patch.object(InotifyWatcher, "close", autospec=True,
+                         side_effect=InotifyWatcher.close) as mock_close:
+        thread = threading.Thread(target=watch_directory, daemon=True, kwargs={
+            "summarizer": Summarizer(), "directory": temp_test_directory,
+            "prompt_file": os.path.join(temp_test_directory, output_file),
+            "poll_interval": 0.05, "debounce": 0.05, "stop": stop})
+        thread.start()
+        try:
+            assert wait_until(lambda: "test content" in read_output(temp_test_directory))
+            os.makedirs(os.path.join(temp_test_directory, "pkg"))
+            with open(os.path.join(temp_test_directory, "pkg", "mod.py"), "w") as f:
+                f.write("module content")
+            assert wait_until(lambda: "module content" in read_output(temp_test_directory))
+            assert mock_close.call_count == 1
+            # Later edits are found by polling
+            with open(sample_file, "w") as f:
+                f.write("edited content")
+            assert wait_until(lambda: "edited content" in read_output(temp_test_directory))
+        finally:
+            stop.set()
+            thread.join(5)
+    assert not thread.is_alive()
+    assert len(calls) == 2